@@ -0,0 +1,21 @@
+"""Проверка доступа к служебным endpoint по токену администратора."""
+
+import hmac
+
+from fastapi import Header, HTTPException
+
+from app.settings import settings
+
+
+async def require_admin_token(x_admin_token: str | None = Header(default=None)) -> None:
+    """
+    Пропустить запрос только с верным заголовком X-Admin-Token.
+
+    Raises:
+        HTTPException: 404, если ADMIN_TOKEN не задан (endpoint выключены); 403 при неверном токене
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
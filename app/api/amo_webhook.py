@@ -6,38 +6,194 @@ from urllib.parse import parse_qs, unquote_plus
 
 from fastapi import APIRouter, HTTPException, Request
 
+from app.services.admission import AdmissionRejectedError, admission_controller
+from app.services.coalescer import event_coalescer
+from app.services.deadline import Deadline, DeadlineExceededError
+from app.services.fast_filter import extract_catalog_element_id, extract_lead_id, fast_reject_reason
+from app.services.partition import partition_router
+from app.services.payment_journal import payment_journal
+from app.services.prefetcher import lead_prefetcher
+from app.services.profiling import request_profiler
+from app.services.retry_queue import retry_queue
+from app.services.runtime import runtime_stats
+from app.services.shutdown import shutdown_coordinator
+from app.services.tenants import TenantNotFoundError, current_tenant, tenant_registry
+from app.services.webhook_capture import webhook_capture
 from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/amo", tags=["amoCRM Webhooks"])
 
 
+def _needs_owner(from_peer: bool, reject_reason: str | None) -> bool:
+    """Нужно ли пересылать webhook узлу-владельцу сделки (пересланный другим узлом уже у владельца)."""
+    if not partition_router.enabled or from_peer:
+        return False
+
+    # Неоплаченный счет нужен владельцу для предзагрузки и для отмены ожидающей склейки
+    return reject_reason is None or (
+        reject_reason == "not_paid" and (settings.LEAD_PREFETCH_ENABLED or event_coalescer.enabled)
+    )
+
+
+def _cancel_coalesced(raw_body: bytes) -> None:
+    """Отменить ожидающую в окне склейки оплату счета, если пришло его новое, необрабатываемое состояние."""
+    if not event_coalescer.enabled:
+        return
+
+    catalog_element_id = extract_catalog_element_id(raw_body)
+    if catalog_element_id is not None:
+        event_coalescer.cancel(catalog_element_id, tenant=current_tenant())
+
+
+def _prefetch_lead(raw_body: bytes) -> None:
+    """Запланировать предзагрузку сделки неоплаченного счета, если включен LEAD_PREFETCH_ENABLED."""
+    if not settings.LEAD_PREFETCH_ENABLED:
+        return
+
+    lead_id = extract_lead_id(raw_body)
+    if lead_id is not None:
+        lead_prefetcher.schedule(lead_id)
+
+
 @router.post("/webhook/handle")
 async def handle_amo_webhook(request: Request) -> dict[str, Any]:
     """
     Обрабатывает webhook от amoCRM о добавлении/изменении элемента каталога 'Счета/покупки'.
 
+    Возвращает:
+        dict: Статус обработки webhook
+    """
+    with runtime_stats.track_webhook():
+        # Выбранные запросы (POST /debug/profile или X-Profile-Token) обрабатываются под профилировщиком
+        if request_profiler.should_profile(request.headers):
+            async with request_profiler.profile("webhook"):
+                return await _handle_webhook(request)
+
+        return await _handle_webhook(request)
+
+
+@router.post("/{tenant}/webhook/handle")
+async def handle_tenant_webhook(tenant: str, request: Request) -> dict[str, Any]:
+    """
+    Обрабатывает webhook дополнительного аккаунта amoCRM с его настройками (TENANTS_DIR/<tenant>.env).
+
     Возвращает:
         dict: Статус обработки webhook
     """
     try:
-        # Парсим тело запроса
+        tenant_registry.get(tenant)
+    except TenantNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Unknown tenant") from e
+
+    with tenant_registry.activate(tenant):
+        return await handle_amo_webhook(request)
+
+
+async def _handle_webhook(request: Request) -> dict[str, Any]:
+    """Обработка webhook (см. handle_amo_webhook)."""
+    deadline = Deadline(settings.WEBHOOK_DEADLINE_SECONDS)
+
+    try:
+        # При остановке новые webhook не принимаем: amoCRM повторит их на другом узле или после запуска
+        if shutdown_coordinator.draining:
+            raise AdmissionRejectedError("shutting_down", settings.WEBHOOK_RETRY_AFTER_SECONDS)
+
         raw_body = await request.body()
-        text_body = raw_body.decode("utf-8", errors="ignore")
 
         logger.info("Получен webhook от amoCRM")
 
+        # Пересланный другим узлом webhook уже записан там; заголовку пересылки верим только с подписью кластера
+        from_peer = partition_router.enabled and partition_router.is_forwarded(request.headers, raw_body)
+        if settings.CAPTURE_ENABLED and not from_peer:
+            webhook_capture.capture(raw_body, request.headers, path=request.url.path)
+
+        # Большинство webhook - неоплаченные счета: отсекаем их без полного парсинга
+        reject_reason = fast_reject_reason(raw_body)
+
+        # Сделку обрабатывает узел-владелец: пересылаем ему все, что дойдет до amoCRM
+        if _needs_owner(from_peer, reject_reason):
+            lead_id = extract_lead_id(raw_body)
+            if lead_id is not None:
+                forwarded = await partition_router.forward(raw_body, lead_id, deadline=deadline, path=request.url.path)
+                if forwarded is not None:
+                    return forwarded
+
+        if reject_reason is not None:
+            logger.info("Webhook проигнорирован без парсинга: %s", reject_reason)
+            payment_journal.record(
+                "ignored",
+                reason=reject_reason,
+                catalog_element_id=extract_catalog_element_id(raw_body),
+                lead_id=extract_lead_id(raw_body),
+            )
+            if reject_reason == "not_paid":
+                _cancel_coalesced(raw_body)
+                _prefetch_lead(raw_body)
+            return {"status": "ignored", "reason": reject_reason}
+
+        # Парсим тело запроса
+        text_body = raw_body.decode("utf-8", errors="ignore")
         decoded = unquote_plus(text_body)
         parsed_data = parse_qs(decoded)
 
         processor = CatalogWebhookProcessor()
-        result = await processor.process_catalog_webhook(parsed_data)
+
+        # Игнорируемые события не занимают слоты и никогда не ждут в очереди
+        event_type, ignored = processor.classify(parsed_data)
+        if ignored is not None:
+            payment_journal.record(
+                "ignored",
+                reason=ignored["reason"],
+                catalog_element_id=extract_catalog_element_id(raw_body),
+                lead_id=extract_lead_id(raw_body),
+            )
+            _cancel_coalesced(raw_body)
+            if ignored["reason"] == "not_paid":
+                _prefetch_lead(raw_body)
+            return ignored
+
+        event = processor.extract_payment_event(parsed_data, event_type)
+
+        # Серии правок одного счета склеиваем: обработается только последнее состояние
+        if event_coalescer.submit(event):
+            payment_journal.record("accepted", reason="coalesced", event=event)
+            return {
+                "status": "accepted",
+                "reason": "coalesced",
+                "catalog_element_id": str(event.catalog_element_id),
+                "lead_id": str(event.lead_id),
+            }
+
+        try:
+            async with admission_controller.slot(current_tenant()):
+                result = await processor.process_payment_event(event, deadline=deadline)
+        except DeadlineExceededError as e:
+            # Не держим соединение amoCRM: дообработаем платеж в фоне
+            logger.warning("Платеж lead_id=%s не уложился в deadline: %s", event.lead_id, e)
+            retry_queue.enqueue(event)
+            payment_journal.record("accepted", reason="deferred", event=event)
+            return {
+                "status": "accepted",
+                "reason": "deferred",
+                "catalog_element_id": str(event.catalog_element_id),
+                "lead_id": str(event.lead_id),
+            }
 
         return result
 
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Service overloaded",
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+
     except ValueError as e:
         logger.error("Ошибка валидации webhook: %s", e)
+        payment_journal.record("failed", reason="invalid", error=str(e))
         return {"status": "error", "error": str(e)}
 
     except Exception as e:
@@ -0,0 +1,24 @@
+"""Endpoint состояния кластера: живые узлы и владелец сделки."""
+
+from typing import Any
+
+from fastapi import APIRouter
+
+from app.services.partition import partition_router
+
+router = APIRouter(tags=["Cluster"])
+
+
+@router.get("/cluster")
+async def cluster_state(lead_id: int | None = None) -> dict[str, Any]:
+    """
+    Состояние кластера.
+
+    Возвращает:
+        dict: Этот узел, живые узлы кольца и (если передан lead_id) узел-владелец сделки
+    """
+    state = partition_router.snapshot()
+    if lead_id is not None:
+        state["owner"] = partition_router.owner(lead_id)
+
+    return state
@@ -0,0 +1,105 @@
+"""Служебные endpoint диагностики (доступны с X-Admin-Token)."""
+
+import asyncio
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from app.api.admin_auth import require_admin_token
+from app.services.memory_diagnostics import format_differences, memory_diagnostics
+from app.services.metrics import metrics
+from app.services.profiling import request_profiler
+from app.services.runtime import runtime_stats
+
+router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(require_admin_token)])
+
+
+@router.post("/profile")
+async def arm_profiler(count: int = Query(default=1, ge=0, le=1000)) -> dict[str, Any]:
+    """
+    Профилировать следующие count webhook (0 - отменить).
+
+    Возвращает:
+        dict: Сколько запросов будет профилировано и каталог отчетов
+    """
+    return {"armed": request_profiler.arm(count), "directory": str(request_profiler.directory)}
+
+
+@router.get("/memory")
+async def memory_status() -> dict[str, Any]:
+    """
+    Состояние трассировки памяти.
+
+    Возвращает:
+        dict: Включена ли трассировка, объем памяти, имена снимков и размеры кэшей и очередей
+    """
+    return memory_diagnostics.status()
+
+
+@router.post("/memory/start")
+async def start_memory_tracing() -> dict[str, Any]:
+    """Включить трассировку выделений памяти (tracemalloc)."""
+    memory_diagnostics.start()
+    return memory_diagnostics.status()
+
+
+@router.post("/memory/stop")
+async def stop_memory_tracing() -> dict[str, Any]:
+    """Выключить трассировку и удалить снимки."""
+    memory_diagnostics.stop()
+    return memory_diagnostics.status()
+
+
+@router.post("/memory/snapshots/{name}")
+async def take_memory_snapshot(name: str) -> dict[str, Any]:
+    """
+    Снять именованный снимок памяти.
+
+    Возвращает:
+        dict: Имя снимка, объем и количество отслеживаемых выделений
+    """
+    try:
+        return await asyncio.to_thread(memory_diagnostics.take_snapshot, name)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+
+@router.get("/memory/diff", response_model=None)
+async def memory_diff(
+    base: str,
+    target: str | None = Query(default=None, description="Снимок для сравнения; по умолчанию - текущее состояние"),
+    group_by: Literal["filename", "lineno"] = "lineno",
+    limit: int = Query(default=20, ge=1, le=500),
+    output: Literal["json", "text"] = "json",
+) -> Response | dict[str, Any]:
+    """
+    Наибольшие изменения памяти между снимками по модулям (filename) или строкам (lineno).
+
+    Возвращает:
+        dict | text: Изменения памяти и размеры кэшей и очередей
+    """
+    try:
+        differences = await asyncio.to_thread(memory_diagnostics.compare, base, target, group_by, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Снимок не найден: {e.args[0]}") from e
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    sizes = metrics.sizes()
+    if output == "text":
+        return PlainTextResponse(format_differences(differences, sizes))
+
+    return {"base": base, "target": target, "group_by": group_by, "differences": differences, "sizes": sizes}
+
+
+@router.get("/runtime")
+async def runtime_state() -> dict[str, Any]:
+    """
+    Внутреннее состояние процесса.
+
+    Возвращает:
+        dict: Время работы, RSS, webhook в обработке, задачи asyncio, пулы соединений,
+            повторы за последние окна, версия и размеры таблиц маппинга, размеры кэшей и очередей
+    """
+    return runtime_stats.snapshot()
@@ -1,6 +1,10 @@
 """Health check endpoint для мониторинга состояния сервиса."""
 
-from fastapi import APIRouter
+from typing import Any
+
+from fastapi import APIRouter, Response
+
+from app.services.readiness import readiness_probe
 
 router = APIRouter(tags=["Health"])
 
@@ -10,7 +14,27 @@ async def health_check() -> dict[str, str]:
     """
     Проверка состояния сервиса.
 
+    Сбой amoCRM или платформы не делает сервис неживым: он отражается
+    только в поле upstream ("ok", "degraded" или "unknown").
+
     Возвращает:
-        dict: Статус сервиса
+        dict: Статус сервиса и состояние внешних сервисов
+    """
+    return {"status": "ok", "upstream": readiness_probe.upstream_status()}
+
+
+@router.get("/ready")
+async def readiness_check(response: Response) -> dict[str, Any]:
     """
-    return {"status": "ok"}
+    Проверка готовности сервиса принимать трафик.
+
+    Отдает закэшированный результат фоновой проверки: DNS, прогретые
+    соединения к amoCRM и платформе, таблицы маппинга и токен amoCRM.
+
+    Возвращает:
+        dict: Статус готовности и результаты отдельных проверок (503, если не готов)
+    """
+    if not readiness_probe.is_ready:
+        response.status_code = 503
+
+    return readiness_probe.snapshot()
@@ -0,0 +1,19 @@
+"""Endpoint метрик сервиса в формате Prometheus."""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.metrics import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """
+    Метрики сервиса.
+
+    Возвращает:
+        str: Счетчики, гистограммы задержек и вычисляемые показатели в текстовом формате Prometheus
+    """
+    return metrics.render()
@@ -0,0 +1,60 @@
+"""Endpoint поиска платежей в журнале исходов webhook."""
+
+import time
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.api.admin_auth import require_admin_token
+from app.services.payment_journal import payment_journal
+from app.services.tenants import TenantNotFoundError, tenant_registry
+
+router = APIRouter(prefix="/amo", tags=["Payments"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/payments/{catalog_element_id}")
+async def payment_status(
+    catalog_element_id: int,
+    tenant: str | None = Query(default=None, description="Аккаунт amoCRM (по умолчанию - основной)"),
+) -> dict[str, Any]:
+    """
+    Статус платежа по ID элемента каталога в аккаунте amoCRM.
+
+    Возвращает:
+        dict: Последний исход ("status") и вся история обработки счета, от новых записей к старым
+    """
+    try:
+        with tenant_registry.activate_optional(tenant):
+            history = await payment_journal.by_catalog_element(catalog_element_id)
+    except TenantNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Unknown tenant") from e
+
+    return {
+        "catalog_element_id": catalog_element_id,
+        "status": history[0]["outcome"] if history else "unknown",
+        "history": history,
+    }
+
+
+@router.get("/payments")
+async def search_payments(
+    since: float | None = Query(default=None, description="Начало интервала (unix time), по умолчанию - сутки назад"),
+    until: float | None = Query(default=None, description="Конец интервала (unix time), по умолчанию - сейчас"),
+    lead_id: int | None = None,
+    email: str | None = None,
+    outcome: str | None = None,
+    tenant: str | None = Query(default=None, description="Аккаунт amoCRM (по умолчанию - все)"),
+    limit: int = Query(default=100, ge=1, le=1000),
+) -> dict[str, Any]:
+    """
+    Исходы webhook за интервал времени с фильтрами по сделке, email клиента, исходу и аккаунту.
+
+    Возвращает:
+        dict: Найденные записи журнала, от новых к старым
+    """
+    until = until if until is not None else time.time()
+    since = since if since is not None else until - 86400
+    records = await payment_journal.search(
+        since, until, lead_id=lead_id, email=email, outcome=outcome, tenant=tenant, limit=limit
+    )
+    return {"since": since, "until": until, "count": len(records), "records": records}
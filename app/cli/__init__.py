@@ -0,0 +1 @@
+"""Консольные утилиты сервиса."""
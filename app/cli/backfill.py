@@ -0,0 +1,252 @@
+"""
+Догрузка оплаченных счетов из каталога 'Счета/покупки' через API amoCRM.
+
+Нужна, когда сервис лежал или webhook потерялись: проходит по элементам
+каталога, отбирает оплаченные счета, измененные в заданном интервале, и
+отправляет их через тот же конвейер, что и webhook (_process_payment).
+
+Счета, доставка которых уже записана в журнал доставок, пропускаются.
+Прогресс сохраняется в чекпоинт после каждой страницы, поэтому прерванный
+запуск продолжается с той же страницы, а счета, которые не удалось
+отправить, повторяются при следующем запуске. Без --until конец интервала
+фиксируется при первом запуске и берется из чекпоинта при продолжении.
+
+Запуск:
+    poetry run python -m app.cli.backfill --since 2025-09-01 --until 2025-10-01
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import delivery_log
+from app.services.http_pool import close_http_clients
+from app.services.payment_journal import payment_journal
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillCheckpoint:
+    """
+    Прогресс догрузки: следующая страница каталога, уже обработанные элементы
+    текущей страницы и элементы, которые не удалось отправить.
+    """
+
+    def __init__(self, path: Path, params: dict[str, Any]) -> None:
+        """
+        Args:
+            path: Путь к файлу чекпоинта
+            params: Параметры запуска (каталог и интервал), к которым относится чекпоинт
+        """
+        self.path = path
+        self.params = params
+        self.page = 1
+        self.done: set[int] = set()
+        self.failed: dict[int, dict[str, Any]] = {}
+        self.stats: dict[str, int] = {"scanned": 0, "paid": 0, "already_delivered": 0, "delivered": 0, "failed": 0}
+
+    @classmethod
+    def load(cls, path: Path, params: dict[str, Any]) -> "BackfillCheckpoint":
+        """
+        Загрузить чекпоинт, если он относится к тем же параметрам запуска.
+
+        Если конец интервала не задан (params["until"] is None), подходит
+        чекпоинт с теми же остальными параметрами, и продолжается его
+        интервал: иначе без --until каждый запуск начинался бы заново.
+
+        Args:
+            path: Путь к файлу чекпоинта
+            params: Параметры текущего запуска
+
+        Returns:
+            BackfillCheckpoint: Сохраненный прогресс или новый чекпоинт
+        """
+        checkpoint = cls(path, params)
+        if not path.exists():
+            return checkpoint
+
+        data = json.loads(path.read_text(encoding="utf-8"))
+        saved: dict[str, Any] = data.get("params", {})
+        if params.get("until") is None:
+            params = {**params, "until": saved.get("until")}
+        if saved != params:
+            logger.warning("Чекпоинт %s создан для других параметров, начинаем заново", path)
+            return checkpoint
+
+        checkpoint.params = saved
+
+        checkpoint.page = data["page"]
+        checkpoint.done = set(data["done"])
+        checkpoint.failed = {element["id"]: element for element in data.get("failed", [])}
+        checkpoint.stats.update(data["stats"])
+        logger.info("Продолжаем догрузку со страницы %s", checkpoint.page)
+
+        return checkpoint
+
+    def save(self) -> None:
+        """Атомарно сохранить чекпоинт на диск."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {
+                    "params": self.params,
+                    "page": self.page,
+                    "done": sorted(self.done),
+                    "failed": list(self.failed.values()),
+                    "stats": self.stats,
+                },
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+    def next_page(self) -> None:
+        """Отметить текущую страницу как полностью обработанную (сохраняет вызывающий код)."""
+        self.page += 1
+        self.done.clear()
+
+
+async def run_backfill(
+    since: datetime,
+    until: datetime | None,
+    concurrency: int,
+    checkpoint_path: Path,
+    dry_run: bool = False,
+) -> dict[str, int]:
+    """
+    Догрузить оплаченные счета, измененные в интервале [since, until).
+
+    Args:
+        since: Начало интервала по updated_at элемента
+        until: Конец интервала по updated_at элемента (None - из чекпоинта или момент первого запуска)
+        concurrency: Максимум одновременно обрабатываемых счетов
+        checkpoint_path: Путь к файлу чекпоинта
+        dry_run: Только найти счета, ничего не отправлять на платформу
+
+    Returns:
+        dict: Статистика запуска (scanned, paid, already_delivered, delivered, failed)
+
+    Raises:
+        ValueError: Если не задан AMO_INVOICES_CATALOG_ID
+    """
+    catalog_id = settings.AMO_INVOICES_CATALOG_ID
+    if catalog_id is None:
+        raise ValueError("Не задан AMO_INVOICES_CATALOG_ID")
+
+    since_ts = int(since.timestamp())
+    params = {"catalog_id": catalog_id, "since": since_ts, "until": int(until.timestamp()) if until is not None else None}
+    checkpoint = await asyncio.to_thread(BackfillCheckpoint.load, checkpoint_path, params)
+    if checkpoint.params["until"] is None:
+        # Конец интервала фиксируется при первом запуске и сохраняется в чекпоинт
+        checkpoint.params["until"] = int(time.time())
+    until_ts: int = checkpoint.params["until"]
+
+    client = AmoCRMClient()
+    processor = CatalogWebhookProcessor()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_element(element: dict[str, Any], undelivered: set[int]) -> None:
+        async with semaphore:
+            try:
+                event = processor.extract_payment_event_from_element(element)
+                if event is not None and element["id"] not in undelivered:
+                    checkpoint.stats["already_delivered"] += 1
+                elif event is not None:
+                    checkpoint.stats["paid"] += 1
+                    if dry_run:
+                        logger.info("[dry-run] Счет %s, lead_id=%s, сумма=%s", element["id"], event.lead_id, event.amount)
+                    else:
+                        await processor.process_payment_event(event)
+                        checkpoint.stats["delivered"] += 1
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # Неотправленный счет повторится при следующем запуске
+                checkpoint.stats["failed"] += 1
+                checkpoint.failed[element["id"]] = element
+                logger.error("Счет %s не обработан: %s", element.get("id"), e)
+            else:
+                checkpoint.failed.pop(element["id"], None)
+                checkpoint.done.add(element["id"])
+
+    async def process_elements(elements: list[dict[str, Any]]) -> None:
+        undelivered = await asyncio.to_thread(delivery_log.undelivered, (element["id"] for element in elements))
+        await asyncio.gather(*(process_element(element, undelivered) for element in elements))
+
+    if checkpoint.failed:
+        logger.info("Повторяем счета, не отправленные в прошлый раз: %s", len(checkpoint.failed))
+        await process_elements(list(checkpoint.failed.values()))
+        await asyncio.to_thread(checkpoint.save)
+
+    pages = client.iterate_pages(
+        f"/api/v4/catalogs/{catalog_id}/elements", "elements", params={"page": checkpoint.page, "limit": 250}
+    )
+
+    async for elements in pages:
+        checkpoint.stats["scanned"] += len(elements)
+        candidates = [
+            element
+            for element in elements
+            if since_ts <= element.get("updated_at", 0) < until_ts
+            and element["id"] not in checkpoint.done
+            and element["id"] not in checkpoint.failed
+        ]
+        logger.info("Страница %s: элементов %s, в интервале %s", checkpoint.page, len(elements), len(candidates))
+
+        await process_elements(candidates)
+
+        checkpoint.next_page()
+        await asyncio.to_thread(checkpoint.save)
+
+    logger.info("Догрузка завершена: %s", checkpoint.stats)
+
+    return checkpoint.stats
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    parser = argparse.ArgumentParser(description="Догрузка оплаченных счетов из каталога amoCRM")
+    parser.add_argument("--since", type=datetime.fromisoformat, required=True, help="Начало интервала (ISO 8601)")
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Конец интервала (ISO 8601); по умолчанию - из чекпоинта или момент первого запуска",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="Одновременно обрабатываемых счетов")
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=Path(settings.DATA_DIR) / "backfill_checkpoint.json",
+        help="Файл чекпоинта для продолжения прерванного запуска",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Только найти счета, ничего не отправлять")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=settings.log_level_value,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    async def run() -> None:
+        payment_journal.start()
+        try:
+            await run_backfill(args.since, args.until, args.concurrency, args.checkpoint, args.dry_run)
+        finally:
+            await close_http_clients()
+            await payment_journal.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Заполнение индекса lead_id → contact_id по списку сделок amoCRM.
+
+С заполненным индексом сделка и контакт при оплате запрашиваются
+одновременно, а не друг за другом.
+
+Запуск:
+    poetry run python -m app.cli.index_contacts --updated-since 2025-01-01
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any
+
+from app.services.amocrm_client import AmoCRMClient
+from app.services.contact_index import contact_index
+from app.services.http_pool import close_http_clients
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def index_contacts(updated_since: datetime | None = None) -> int:
+    """
+    Проиндексировать основные контакты сделок.
+
+    Args:
+        updated_since: Только сделки, измененные после этой даты (None - все)
+
+    Returns:
+        int: Количество проиндексированных сделок
+    """
+    params: dict[str, Any] = {"with": "contacts", "limit": 250}
+    if updated_since is not None:
+        params["filter[updated_at][from]"] = int(updated_since.timestamp())
+
+    indexed = 0
+    async for leads in AmoCRMClient().iterate_pages("/api/v4/leads", "leads", params=params):
+        indexed += await asyncio.to_thread(contact_index.index_leads, leads)
+        logger.info("Проиндексировано сделок: %s", indexed)
+
+    return indexed
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    parser = argparse.ArgumentParser(description="Заполнение индекса lead_id → contact_id")
+    parser.add_argument("--updated-since", type=datetime.fromisoformat, help="Только сделки, измененные после даты (ISO 8601)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=settings.log_level_value,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    async def run() -> None:
+        try:
+            await index_contacts(args.updated_since)
+        finally:
+            await close_http_clients()
+            contact_index.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
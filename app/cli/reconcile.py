@@ -0,0 +1,45 @@
+"""
+Разовая сверка оплаченных счетов amoCRM с журналом доставок.
+
+Делает то же, что периодическая сверка внутри сервиса (RECONCILE_INTERVAL_SECONDS),
+но один раз: удобно запускать из cron, если в сервисе сверка выключена.
+
+Запуск:
+    poetry run python -m app.cli.reconcile
+"""
+
+import asyncio
+import logging
+
+from app.services.delivery_log import delivery_log
+from app.services.http_pool import close_http_clients
+from app.services.payment_journal import payment_journal
+from app.services.reconciler import reconciler
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    logging.basicConfig(
+        level=settings.log_level_value,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    async def run() -> None:
+        payment_journal.start()
+        try:
+            stats = await reconciler.run_once()
+            if stats is None:
+                logger.info("Сверка пропущена: ее выполняет другой процесс")
+        finally:
+            await close_http_clients()
+            await payment_journal.stop()
+            delivery_log.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
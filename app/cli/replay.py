@@ -0,0 +1,136 @@
+"""
+Воспроизведение записанных webhook (CAPTURE_ENABLED) на выбранный сервис.
+
+Отправляет запросы с исходными интервалами, ускоренными в --speed раз,
+или без пауз (--speed 0) с ограничением --concurrency, и выводит
+пропускную способность и распределение задержек.
+
+Запуск:
+    poetry run python -m app.cli.replay data/capture --base-url http://localhost:8005 --speed 10
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from app.services.webhook_capture import CapturedRequest, read_capture
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _quantile(ordered: list[float], q: float) -> float | None:
+    """Квантиль отсортированного списка."""
+    if not ordered:
+        return None
+
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def run_replay(
+    requests: Iterable[CapturedRequest],
+    client: httpx.AsyncClient,
+    speed: float,
+    concurrency: int,
+    path: str | None = None,
+) -> dict[str, Any]:
+    """
+    Отправить записанные webhook и измерить задержки ответов.
+
+    Запросы читаются из requests по мере отправки: следующий берется, только
+    когда освободилось место в concurrency, поэтому в памяти не больше
+    concurrency записей и задач, сколько бы их ни было в записи.
+
+    Args:
+        requests: Записанные запросы в порядке записи (например, read_capture)
+        client: HTTP-клиент с base_url сервиса
+        speed: Ускорение относительно исходных интервалов (0 - без пауз)
+        concurrency: Максимум одновременных запросов
+        path: Путь endpoint webhook (None - записанный путь запроса, у каждого аккаунта свой)
+
+    Returns:
+        dict: Статистика (sent, statuses, seconds, rps, задержки latency p50/p90/p99/max в секундах)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+    in_flight: set[asyncio.Task[None]] = set()
+    sent = 0
+    first_timestamp: float | None = None
+    started = time.monotonic()
+
+    async def send(request: CapturedRequest) -> None:
+        try:
+            sent_at = time.monotonic()
+            try:
+                response = await client.post(path or request.path, content=request.body, headers=request.headers)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.monotonic() - sent_at)
+        finally:
+            semaphore.release()
+
+    for request in requests:
+        if first_timestamp is None:
+            first_timestamp = request.timestamp
+        if speed > 0:
+            await asyncio.sleep(max(0.0, (request.timestamp - first_timestamp) / speed - (time.monotonic() - started)))
+
+        await semaphore.acquire()
+        task = asyncio.create_task(send(request))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        sent += 1
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+    seconds = time.monotonic() - started
+    ordered = sorted(latencies)
+    return {
+        "sent": sent,
+        "statuses": dict(statuses),
+        "seconds": round(seconds, 3),
+        "rps": round(sent / seconds, 1) if seconds > 0 else None,
+        "latency": {
+            "p50": _quantile(ordered, 0.5),
+            "p90": _quantile(ordered, 0.9),
+            "p99": _quantile(ordered, 0.99),
+            "max": ordered[-1] if ordered else None,
+        },
+    }
+
+
+def main() -> None:
+    """Точка входа CLI."""
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных webhook amoCRM")
+    parser.add_argument("paths", type=Path, nargs="+", help="Сегменты записи или каталоги с ними")
+    parser.add_argument("--base-url", required=True, help="Адрес сервиса, например http://localhost:8005")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение: 1 - как записано, 0 - без пауз")
+    parser.add_argument("--concurrency", type=int, default=64, help="Максимум одновременных запросов")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Таймаут одного запроса (в секундах)")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=settings.log_level_value,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+
+    async def run() -> dict[str, Any]:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            return await run_replay(read_capture(args.paths), client, args.speed, args.concurrency)
+
+    logger.info("Воспроизведение завершено: %s", asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,29 @@
 """Главное приложение FastAPI для интеграции amoCRM → Платформа."""
 
 import logging
+import signal
+import threading
+from types import FrameType
 
 from fastapi import FastAPI
 
-from app.api import amo_webhook, health
+from app.api import amo_webhook, cluster, debug, health, metrics, payments
+from app.services.cache_snapshot import cache_snapshot
+from app.services.coalescer import event_coalescer
+from app.services.contact_index import contact_index
+from app.services.delivery_log import delivery_log
+from app.services.events_poller import events_poller
+from app.services.http_pool import close_http_clients
+from app.services.loop_monitor import loop_monitor
+from app.services.partition import partition_router
+from app.services.payment_journal import payment_journal
+from app.services.prefetcher import lead_prefetcher
+from app.services.readiness import readiness_probe
+from app.services.reconciler import reconciler
+from app.services.retry_queue import retry_queue
+from app.services.retry_store import retry_store
+from app.services.shutdown import shutdown_coordinator
+from app.services.webhook_capture import webhook_capture
 from app.settings import settings
 
 logging.basicConfig(
@@ -22,6 +41,33 @@ app = FastAPI(
 
 app.include_router(health.router)
 app.include_router(amo_webhook.router)
+app.include_router(metrics.router)
+app.include_router(cluster.router)
+app.include_router(payments.router)
+app.include_router(debug.router)
+
+
+def _install_sigterm_handler() -> None:
+    """
+    Начинать остановку сразу по SIGTERM.
+
+    uvicorn сначала дообрабатывает соединения и только потом вызывает
+    shutdown-обработчики, поэтому снять сервис с балансировки, перестать
+    принимать webhook и начать отсчет бюджета SHUTDOWN_GRACE_SECONDS нужно
+    в момент сигнала. Обработчик uvicorn вызывается следом.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum: int, frame: FrameType | None) -> None:
+        readiness_probe.withdraw()
+        shutdown_coordinator.begin()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
 
 @app.on_event("startup")
@@ -32,12 +78,55 @@ async def startup_event() -> None:
     logger.info("PLATFORM_URL: %s", settings.PLATFORM_URL)
     logger.info("LOG_LEVEL: %s", settings.LOG_LEVEL)
 
+    if settings.LOOP_MONITOR_INTERVAL_SECONDS > 0:
+        loop_monitor.start()
+    readiness_probe.start()
+    # Кэш сделок наполняет только предзагрузка: без нее снимок всегда пуст
+    if settings.LEAD_PREFETCH_ENABLED and settings.CACHE_SNAPSHOT_INTERVAL_SECONDS > 0:
+        cache_snapshot.start()
+    payment_journal.start()
+    if settings.CAPTURE_ENABLED:
+        webhook_capture.start()
+    retry_queue.start()
+    # Платежи, не обработанные к прошлой остановке (удаляются из хранилища после обработки)
+    for event, attempt in retry_store.pending():
+        retry_queue.enqueue(event, attempt=attempt)
+    reconciler.start()
+    events_poller.start()
+    partition_router.start()
+    _install_sigterm_handler()
+
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
-    """Очистка ресурсов при остановке приложения."""
+    """
+    Очистка ресурсов при остановке приложения.
+
+    Готовность снята и прием webhook остановлен еще по SIGTERM; здесь
+    сервис дообрабатывает фоновые платежи в остатке бюджета
+    SHUTDOWN_GRACE_SECONDS, сохраняет необработанные для повтора после
+    запуска и только потом закрывает пулы.
+    """
     logger.info("Остановка amoCRM Payment Webhook сервиса")
 
+    await readiness_probe.stop()
+    shutdown_coordinator.begin()
+    await partition_router.stop()
+    await reconciler.stop()
+    await events_poller.stop()
+    await lead_prefetcher.stop()
+    await shutdown_coordinator.drain(event_coalescer.flush(), retry_queue.stop())
+    shutdown_coordinator.save(retry_queue.take_pending())
+    if settings.LEAD_PREFETCH_ENABLED and settings.CACHE_SNAPSHOT_INTERVAL_SECONDS > 0:
+        await cache_snapshot.stop()
+    await close_http_clients()
+    await payment_journal.stop()
+    await webhook_capture.stop()
+    delivery_log.close()
+    contact_index.close()
+    retry_store.close()
+    await loop_monitor.stop()
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -47,4 +136,5 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8005,
         reload=True,
+        timeout_graceful_shutdown=int(settings.SHUTDOWN_GRACE_SECONDS),
     )
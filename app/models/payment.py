@@ -0,0 +1,14 @@
+"""Модели данных об оплате, извлеченных из webhook каталога 'Счета/покупки'."""
+
+from pydantic import BaseModel, Field
+
+
+class PaymentEvent(BaseModel):
+    """Оплаченный счет, готовый к обработке (загрузка из amoCRM и отправка на платформу)."""
+
+    event_type: str = Field(..., description="Источник: событие каталога ('add', 'update') или API ('api')")
+    catalog_element_id: int | None = Field(None, description="ID элемента каталога 'Счета/покупки'")
+    lead_id: int = Field(..., description="ID сделки из поля LINK_TO_LEAD")
+    items: list[dict[str, str | int]] = Field(..., description="Позиции счета [{description, unit_price, quantity}]")
+    amount: int = Field(..., description="Общая сумма счета (BILL_PRICE)")
+    tenant: str | None = Field(None, description="Аккаунт amoCRM (None - основной)")
@@ -0,0 +1,149 @@
+"""Таймауты запросов к внешним API по наблюдаемым задержкам."""
+
+import logging
+from functools import partial
+
+import httpx
+
+from app.services.deadline import Deadline
+from app.services.metrics import metrics
+from app.services.tenants import current_tenant
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_METRIC = "upstream_request_seconds"
+
+
+class AdaptiveTimeouts:
+    """
+    Таймауты по гистограммам задержек отдельных endpoint (сделка, контакт, отправка на платформу).
+
+    Таймаут чтения - p99 × multiplier, таймаут соединения - p50 × multiplier
+    (установка соединения занимает порядка одного обычного обмена), оба в
+    пределах [floor, ceiling]. Пока задержек меньше min_samples, действует
+    ceiling - прежний фиксированный таймаут.
+
+    Запросы, оборвавшиеся по таймауту, учитываются с задержкой, равной
+    таймауту: иначе гистограмма видела бы только успевшие ответы, и при
+    замедлении API таймаут сжимался бы вслед за ними. У неидемпотентных
+    endpoint (отправка платежа) адаптируется только таймаут соединения:
+    таймаут чтения по p99 обрывал бы медленные, но успешные запросы, а их
+    повтор отправлял бы платеж второй раз.
+
+    Статистика ведется отдельно по аккаунтам (endpoint дополнительного
+    аккаунта - "аккаунт:endpoint"): у них разные адреса amoCRM и платформы.
+    """
+
+    def __init__(
+        self, multiplier: float, floor: float, ceiling: float, min_samples: int, non_idempotent: frozenset[str] = frozenset()
+    ) -> None:
+        """
+        Args:
+            multiplier: Во сколько раз таймаут больше квантиля задержки
+            floor: Минимальный таймаут (в секундах)
+            ceiling: Максимальный таймаут (в секундах)
+            min_samples: Сколько задержек нужно, чтобы считать таймаут по ним
+            non_idempotent: Endpoint, у которых таймаут чтения всегда ceiling
+        """
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.non_idempotent = non_idempotent
+        self._endpoints: set[str] = set()
+
+    def observe(self, endpoint: str, seconds: float) -> None:
+        """
+        Учесть задержку полученного ответа или оборвавшегося по таймауту запроса.
+
+        Args:
+            endpoint: Имя endpoint (например, "amocrm_lead_get")
+            seconds: Время от отправки запроса до ответа или до таймаута
+        """
+        label = self._label(endpoint)
+        if label not in self._endpoints:
+            self._endpoints.add(label)
+            for kind in ("connect", "read"):
+                metrics.gauge(
+                    f'upstream_timeout_seconds{{endpoint="{label}",kind="{kind}"}}', partial(self._computed, label, kind)
+                )
+
+        metrics.observe(_METRIC, seconds, endpoint=label)
+
+    def compute(self, endpoint: str) -> dict[str, float]:
+        """
+        Рассчитать таймауты endpoint.
+
+        Args:
+            endpoint: Имя endpoint
+
+        Returns:
+            dict: Таймауты соединения и чтения {"connect": ..., "read": ...} (в секундах)
+        """
+        return self._compute(self._label(endpoint))
+
+    def _compute(self, label: str) -> dict[str, float]:
+        """Рассчитать таймауты по статистике endpoint с именем аккаунта."""
+        histogram = metrics.histogram(_METRIC, endpoint=label)
+        if histogram.samples < self.min_samples:
+            return {"connect": self.ceiling, "read": self.ceiling}
+
+        p50 = histogram.quantile(0.5) or self.ceiling
+        p99 = histogram.quantile(0.99) or self.ceiling
+        read = self.ceiling if label.rpartition(":")[2] in self.non_idempotent else self._clamp(p99 * self.multiplier)
+        return {"connect": self._clamp(p50 * self.multiplier), "read": read}
+
+    def timeout(self, endpoint: str, deadline: Deadline | None = None) -> httpx.Timeout:
+        """
+        Таймаут очередной попытки запроса с учетом deadline.
+
+        Args:
+            endpoint: Имя endpoint
+            deadline: Бюджет времени или None
+
+        Returns:
+            httpx.Timeout: Таймауты соединения и чтения
+
+        Raises:
+            DeadlineExceededError: Если время уже истекло
+        """
+        computed = self.compute(endpoint)
+        read = deadline.timeout(computed["read"]) if deadline is not None else computed["read"]
+        return httpx.Timeout(read, connect=min(computed["connect"], read))
+
+    def snapshot(self) -> dict[str, dict[str, float | int | None]]:
+        """Текущие задержки и таймауты по всем endpoint (для просмотра)."""
+        result: dict[str, dict[str, float | int | None]] = {}
+        for label in sorted(self._endpoints):
+            histogram = metrics.histogram(_METRIC, endpoint=label)
+            result[label] = {
+                "samples": histogram.samples,
+                "p50": histogram.quantile(0.5),
+                "p99": histogram.quantile(0.99),
+                **self._compute(label),
+            }
+
+        return result
+
+    def _computed(self, label: str, kind: str) -> float:
+        """Рассчитанный таймаут одного вида (для метрик)."""
+        return self._compute(label)[kind]
+
+    @staticmethod
+    def _label(endpoint: str) -> str:
+        """Имя endpoint в статистике: для дополнительных аккаунтов - с именем аккаунта."""
+        tenant = current_tenant()
+        return endpoint if tenant is None else f"{tenant}:{endpoint}"
+
+    def _clamp(self, seconds: float) -> float:
+        return min(self.ceiling, max(self.floor, seconds))
+
+
+adaptive_timeouts = AdaptiveTimeouts(
+    multiplier=settings.ADAPTIVE_TIMEOUT_MULTIPLIER,
+    floor=settings.ADAPTIVE_TIMEOUT_FLOOR_SECONDS,
+    ceiling=settings.ADAPTIVE_TIMEOUT_CEILING_SECONDS,
+    min_samples=settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+    non_idempotent=frozenset({"platform_post"}),
+)
@@ -0,0 +1,151 @@
+"""Ограничение количества одновременно обрабатываемых webhook (admission control)."""
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejectedError(Exception):
+    """Webhook отклонен из-за перегрузки: все слоты заняты и очередь ожидания полна."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        """
+        Args:
+            reason: Причина отказа ("queue_full" или "queue_timeout")
+            retry_after: Через сколько секунд amoCRM стоит повторить запрос
+        """
+        super().__init__(f"Webhook отклонен: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Лимит одновременно обрабатываемых webhook с ограниченной очередью ожидания.
+
+    Если свободных слотов нет и очередь заполнена, запрос сразу отклоняется,
+    а не копит корутины в event loop. Ожидающие запросы разбиты по ключам
+    (аккаунтам): освободившийся слот передается ключам по очереди, поэтому
+    всплеск webhook одного аккаунта не задерживает остальные.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, retry_after: int) -> None:
+        """
+        Args:
+            max_in_flight: Максимум одновременно обрабатываемых webhook
+            max_queue: Максимум webhook одного ключа, ожидающих слот
+            queue_timeout: Максимальное время ожидания слота (в секундах)
+            retry_after: Значение Retry-After для отклоненных запросов (в секундах)
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._queues: OrderedDict[Hashable, deque[asyncio.Future[None]]] = OrderedDict()
+        self._in_flight = 0
+        self._waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Количество webhook в обработке."""
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        """Количество webhook, ожидающих слот."""
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable = None) -> AsyncIterator[None]:
+        """
+        Занять слот обработки на время блока.
+
+        Args:
+            key: Ключ справедливой очереди (аккаунт; None - основной)
+
+        Raises:
+            AdmissionRejectedError: Если слот не удалось получить
+        """
+        if self._in_flight < self.max_in_flight and not self._queues:
+            self._in_flight += 1
+        else:
+            await self._wait(key)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait(self, key: Hashable) -> None:
+        """Дождаться слота, переданного освободившим его запросом."""
+        queue = self._queues.get(key)
+        if len(queue or ()) >= self.max_queue:
+            logger.warning("Перегрузка: in_flight=%s, waiting=%s - отклоняем webhook", self._in_flight, self._waiting)
+            raise AdmissionRejectedError("queue_full", self.retry_after)
+
+        if queue is None:
+            queue = self._queues[key] = deque()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Слот уже передан этому запросу - отдаем его следующему
+                self._release()
+            else:
+                self._discard(key, future)
+
+            if isinstance(e, TimeoutError):
+                logger.warning("Webhook не дождался слота за %s с - отклоняем", self.queue_timeout)
+                raise AdmissionRejectedError("queue_timeout", self.retry_after) from e
+            raise
+        finally:
+            self._waiting -= 1
+
+    def _discard(self, key: Hashable, future: "asyncio.Future[None]") -> None:
+        """Убрать ожидающий запрос из очереди ключа."""
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[key]
+
+    def _release(self) -> None:
+        """Передать слот первому ожидающему следующего по очереди ключа или освободить его."""
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._in_flight -= 1
+
+
+admission_controller = AdmissionController(
+    max_in_flight=settings.WEBHOOK_MAX_IN_FLIGHT,
+    max_queue=settings.WEBHOOK_MAX_QUEUE,
+    queue_timeout=settings.WEBHOOK_QUEUE_TIMEOUT_SECONDS,
+    retry_after=settings.WEBHOOK_RETRY_AFTER_SECONDS,
+)
+
+metrics.size("admission_waiting", lambda: admission_controller.waiting)
@@ -1,20 +1,37 @@
 """Клиент для работы с API amoCRM."""
 
+import asyncio
 import logging
+import re
+import sqlite3
+import time
+from collections.abc import AsyncIterator
 from typing import Any
+from urllib.parse import urlsplit
 
 import httpx
 from tenacity import (
     AsyncRetrying,
+    RetryError,
     retry_if_exception_type,
-    stop_after_attempt,
     wait_exponential,
 )
 
+from app.services.adaptive_timeout import adaptive_timeouts
+from app.services.concurrency_limiter import get_concurrency_limiter
+from app.services.contact_index import contact_index
+from app.services.deadline import Deadline, DeadlineExceededError, retry_stop
+from app.services.hedging import get_hedge_budget, hedge_delay
+from app.services.http_pool import get_http_client
+from app.services.metrics import metrics
+from app.services.rate_limiter import get_rate_limiter
+from app.services.tenants import current_tenant
 from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+_ENTITY_PATH_RE = re.compile(r"^/api/v4/(lead|contact)s/\d+$")
+
 
 class AmoCRMClient:
     """Клиент для взаимодействия с API amoCRM."""
@@ -28,7 +45,14 @@ class AmoCRMClient:
             "Content-Type": "application/json",
         }
 
-    async def _make_request(self, method: str, endpoint: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: dict[str, Any] | None = None,
+        deadline: Deadline | None = None,
+        low_priority: bool = False,
+    ) -> dict[str, Any]:
         """
         Выполнить HTTP запрос к API amoCRM с retry механизмом.
 
@@ -36,12 +60,15 @@ class AmoCRMClient:
             method: HTTP метод (GET, POST, PATCH)
             endpoint: Endpoint API (например, /api/v4/leads/123)
             params: Параметры запроса (для GET)
+            deadline: Бюджет времени: таймауты и повторы ужимаются под оставшееся время
+            low_priority: Фоновый запрос: уступает rate limit обычным запросам
 
         Returns:
             Ответ от API в виде dict
 
         Raises:
             httpx.HTTPError: При ошибке API
+            DeadlineExceededError: Если запрос не уложился в deadline
         """
         url = f"{self.base_url}{endpoint}"
 
@@ -49,16 +76,58 @@ class AmoCRMClient:
         if params:
             logger.debug("Request params: %s", params)
 
+        try:
+            if method == "GET" and settings.AMO_HEDGE_ENABLED:
+                return await self._hedged_request(url, params, deadline, low_priority)
+            return await self._request_with_retry(method, url, params, deadline, low_priority)
+        except RetryError as e:
+            # Попытки остановлены раньше лимита - значит, следующий повтор не укладывался в deadline
+            if deadline is not None and e.last_attempt.attempt_number < settings.MAX_RETRY_ATTEMPTS:
+                raise DeadlineExceededError(f"AmoCRM {method} {endpoint}: повторы не укладываются в deadline") from e
+            raise
+
+    async def _request_with_retry(
+        self,
+        method: str,
+        url: str,
+        params: dict[str, Any] | None,
+        deadline: Deadline | None,
+        low_priority: bool = False,
+        hedge: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Выполнить запрос с повторами при ошибках сети и HTTP-статусах ошибок.
+
+        Дубль (hedge=True) не ждет места в лимите одновременных запросов:
+        если его нет, дубль сразу отказывается (ConcurrencyLimitReachedError).
+        """
         async for attempt in AsyncRetrying(
-            stop=stop_after_attempt(settings.MAX_RETRY_ATTEMPTS),
+            stop=retry_stop(settings.MAX_RETRY_ATTEMPTS, deadline),
             wait=wait_exponential(multiplier=1, min=1, max=10),
             retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.RequestError)),
         ):
             with attempt:
                 try:
-                    async with httpx.AsyncClient(timeout=30.0) as client:
+                    await get_rate_limiter(self.base_url).acquire(low_priority=low_priority)
+                    async with get_concurrency_limiter("amocrm").permit(wait=not hedge):
+                        client = get_http_client(self.base_url)
                         if method == "GET":
-                            response = await client.get(url, headers=self.headers, params=params)
+                            endpoint_name = self._endpoint_name(url)
+                            started = time.monotonic()
+                            try:
+                                response = await client.get(
+                                    url,
+                                    headers=self.headers,
+                                    params=params,
+                                    timeout=adaptive_timeouts.timeout(endpoint_name, deadline),
+                                )
+                            except httpx.TimeoutException:
+                                # Таймаут тоже задержка: без него таймаут сжимался бы по одним успевшим ответам
+                                adaptive_timeouts.observe(endpoint_name, time.monotonic() - started)
+                                raise
+                            elapsed = time.monotonic() - started
+                            metrics.observe("amocrm_request_seconds", elapsed)
+                            adaptive_timeouts.observe(endpoint_name, elapsed)
                         else:
                             raise ValueError(f"Unsupported HTTP method: {method}")
 
@@ -68,9 +137,9 @@ class AmoCRMClient:
 
                         response.raise_for_status()
 
-                        logger.info("AmoCRM API response: %s", response.status_code)
+                    logger.info("AmoCRM API response: %s", response.status_code)
 
-                        return response.json() if response.text else {}
+                    return response.json() if response.text else {}
 
                 except httpx.HTTPError as e:
                     logger.error("AmoCRM API error: %s", e)
@@ -79,16 +148,159 @@ class AmoCRMClient:
                         logger.error("Status code: %s", resp.status_code)
                         logger.error("Response text: %s", resp.text)
 
+                    if deadline is not None and deadline.expired:
+                        raise DeadlineExceededError(f"AmoCRM {method} {url}: deadline истек") from e
+
                     raise
 
         return {}
 
-    async def get_lead_with_contact(self, lead_id: int) -> dict[str, Any]:
+    def _endpoint_name(self, url: str) -> str:
+        """Имя endpoint для статистики задержек: сделка, контакт или прочие GET."""
+        match = _ENTITY_PATH_RE.match(urlsplit(url).path)
+        if match:
+            return f"amocrm_{match.group(1)}_get"
+
+        return "amocrm_get"
+
+    async def _hedged_request(
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        deadline: Deadline | None,
+        low_priority: bool,
+    ) -> dict[str, Any]:
+        """
+        GET с дублированием: если ответа нет дольше p95, отправить второй запрос и взять первый ответ.
+
+        Дубль идет с низким приоритетом rate limit, только в пределах бюджета
+        дублей (AMO_HEDGE_MAX_RATIO) и только при свободном месте в лимите
+        одновременных запросов, поэтому не вытесняет обычные запросы и не
+        занимает второе место в очереди лимита.
+        """
+        hedge_budget = get_hedge_budget()
+        hedge_budget.record_request()
+        metrics.inc("amocrm_get_requests_total")
+
+        primary = asyncio.create_task(self._request_with_retry("GET", url, params, deadline, low_priority))
+        tasks = [primary]
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay(metrics.histogram("amocrm_request_seconds")))
+            if done or not get_concurrency_limiter("amocrm").has_capacity or not hedge_budget.try_spend():
+                return await primary
+
+            logger.info("AmoCRM GET %s: нет ответа дольше p95, отправляем дубль", url)
+            metrics.inc("amocrm_hedged_requests_total")
+            hedge = asyncio.create_task(self._request_with_retry("GET", url, params, deadline, low_priority=True, hedge=True))
+            tasks.append(hedge)
+
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.inc("amocrm_hedge_wins_total")
+                        return task.result()
+
+            # Упали оба запроса: отдаем ошибку основного
+            return primary.result()
+        finally:
+            # Проигравший запрос (и оба - при отмене вызывающего) дожидаемся: он освобождает место
+            # в лимите одновременных запросов, а его ошибка не остается непрочитанной
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_account(self) -> dict[str, Any]:
+        """
+        Получить данные аккаунта amoCRM.
+
+        Самый дешевый запрос к API, используется для проверки токена.
+
+        Returns:
+            dict: Данные аккаунта
+        """
+        return await self._make_request("GET", "/api/v4/account")
+
+    async def iterate_pages(
+        self,
+        endpoint: str,
+        embedded_key: str,
+        params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Пройти по всем страницам списка, следуя _links.next.
+
+        Следующая страница запрашивается, пока вызывающий код обрабатывает
+        текущую, поэтому в памяти одновременно не больше двух страниц.
+
+        Args:
+            endpoint: Endpoint списка (например, /api/v4/leads)
+            embedded_key: Ключ списка в _embedded (например, "leads")
+            params: Параметры первой страницы: limit, page, filter[...], with
+
+        Yields:
+            list[dict]: Сущности очередной страницы
+        """
+        next_page: asyncio.Task[dict[str, Any]] | None = asyncio.create_task(self._make_request("GET", endpoint, params=params))
+
+        try:
+            while next_page is not None:
+                data = await next_page
+                next_page = None
+
+                next_href = data.get("_links", {}).get("next", {}).get("href")
+                if next_href:
+                    next_page = asyncio.create_task(self._make_request("GET", self._relative_endpoint(next_href)))
+
+                entities = data.get("_embedded", {}).get(embedded_key, [])
+                if entities:
+                    yield entities
+        finally:
+            # Недочитанную страницу дожидаемся после отмены: она освобождает место в лимите
+            # одновременных запросов, а ее ошибка не остается непрочитанной
+            if next_page is not None:
+                next_page.cancel()
+                await asyncio.gather(next_page, return_exceptions=True)
+
+    async def iterate(
+        self,
+        endpoint: str,
+        embedded_key: str,
+        params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Пройти по всем сущностям списка (с предзагрузкой следующей страницы).
+
+        Args:
+            endpoint: Endpoint списка (например, /api/v4/contacts)
+            embedded_key: Ключ списка в _embedded (например, "contacts")
+            params: Параметры первой страницы: limit, page, filter[...], with
+
+        Yields:
+            dict: Очередная сущность
+        """
+        async for page in self.iterate_pages(endpoint, embedded_key, params):
+            for entity in page:
+                yield entity
+
+    def _relative_endpoint(self, href: str) -> str:
+        """Преобразовать абсолютную ссылку из _links в endpoint относительно base_url."""
+        parts = urlsplit(href)
+        return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+    async def get_lead_with_contact(
+        self, lead_id: int, deadline: Deadline | None = None, low_priority: bool = False
+    ) -> dict[str, Any]:
         """
         Получить полные данные сделки вместе с контактом.
 
         Args:
             lead_id: ID сделки
+            deadline: Бюджет времени на оба запроса
+            low_priority: Фоновая загрузка: запросы уступают rate limit обычным
 
         Returns:
             dict: Данные сделки и контакта
@@ -102,7 +314,41 @@ class AmoCRMClient:
         """
         logger.info("Fetching lead %s with contact data", lead_id)
 
-        lead_data = await self._make_request("GET", f"/api/v4/leads/{lead_id}", params={"with": "contacts"})
+        # Сделка запрашивается сразу, пока ищем ее контакт в индексе
+        lead_request = asyncio.create_task(
+            self._make_request(
+                "GET", f"/api/v4/leads/{lead_id}", params={"with": "contacts"}, deadline=deadline, low_priority=low_priority
+            )
+        )
+
+        lead_data: dict[str, Any]
+        contact_data: dict[str, Any] | None = None
+        try:
+            # Контакт сделки уже известен по индексу: запрашиваем сделку и контакт одновременно
+            indexed_contact_id = await self._indexed_contact_id(lead_id)
+            if indexed_contact_id is not None:
+                results = await asyncio.gather(
+                    lead_request,
+                    self._make_request(
+                        "GET", f"/api/v4/contacts/{indexed_contact_id}", deadline=deadline, low_priority=low_priority
+                    ),
+                    return_exceptions=True,
+                )
+                lead_result, contact_result = results
+                if isinstance(lead_result, BaseException):
+                    raise lead_result
+                lead_data = lead_result
+                if isinstance(contact_result, BaseException):
+                    logger.warning("Contact %s from index not loaded: %s", indexed_contact_id, contact_result)
+                else:
+                    contact_data = contact_result
+            else:
+                lead_data = await lead_request
+        except BaseException:
+            # Ошибка индекса или отмена: запрос сделки не должен остаться висеть без ожидания
+            lead_request.cancel()
+            await asyncio.gather(lead_request, return_exceptions=True)
+            raise
 
         if not lead_data:
             raise ValueError(f"Lead {lead_id} not found")
@@ -115,13 +361,46 @@ class AmoCRMClient:
         contact_id = embedded_contacts[0]["id"]
         logger.info("Found contact %s for lead %s", contact_id, lead_id)
 
-        contact_data = await self._make_request("GET", f"/api/v4/contacts/{contact_id}")
+        if contact_id != indexed_contact_id:
+            # Индекс пуст или устарел: контакт, загруженный параллельно, не тот
+            contact_data = None
+            await self._index_contact(lead_id, contact_id)
+
+        if contact_data is None:
+            contact_data = await self._make_request(
+                "GET", f"/api/v4/contacts/{contact_id}", deadline=deadline, low_priority=low_priority
+            )
 
         if not contact_data:
             raise ValueError(f"Contact {contact_id} not found")
 
         return {"lead": lead_data, "contact": contact_data}
 
+    async def _indexed_contact_id(self, lead_id: int) -> int | None:
+        """Найти контакт сделки в индексе (SQLite - в отдельном потоке); ошибка индекса не мешает загрузке."""
+        # Индекс ведется только для основного аккаунта
+        if current_tenant() is not None:
+            return None
+
+        try:
+            contact_id = await asyncio.to_thread(contact_index.get, lead_id)
+        except sqlite3.Error as e:
+            logger.warning("Contact index lookup failed: %s", e)
+            return None
+
+        metrics.inc("contact_index_lookups_total", result="miss" if contact_id is None else "hit")
+        return contact_id
+
+    async def _index_contact(self, lead_id: int, contact_id: int) -> None:
+        """Запомнить контакт сделки в индексе (SQLite - в отдельном потоке); ошибка индекса не мешает загрузке."""
+        if current_tenant() is not None:
+            return
+
+        try:
+            await asyncio.to_thread(contact_index.put, lead_id, contact_id)
+        except sqlite3.Error as e:
+            logger.warning("Contact index update failed: %s", e)
+
     def _parse_custom_fields(self, custom_fields_values: list[dict[str, Any]]) -> dict[int, Any]:
         """
         Преобразовать custom_fields_values в словарь {field_id: value}.
@@ -0,0 +1,162 @@
+"""Снимок кэша предзагруженных сделок на диске: кэш переживает перезапуск сервиса."""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import socket
+import tempfile
+import time
+from collections.abc import Hashable
+from pathlib import Path
+from typing import Any
+
+from app.services.lead_cache import LeadCache, lead_cache
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+def _encode_key(key: Hashable) -> Any:
+    """Ключ кэша в JSON: lead_id или [аккаунт, lead_id]."""
+    return list(key) if isinstance(key, tuple) else key
+
+
+def _decode_key(key: Any) -> Hashable:
+    return tuple(key) if isinstance(key, list) else key
+
+
+def snapshot_path(data_dir: Path, node: str) -> Path:
+    """
+    Файл снимка узла в DATA_DIR.
+
+    Узлы с общим DATA_DIR иначе перезаписывали бы снимки друг друга; имя
+    узла (CLUSTER_SELF_URL или имя хоста) не меняется между перезапусками,
+    поэтому узел находит свой снимок после запуска.
+    """
+    return data_dir / f"cache_snapshot.{re.sub(r'[^A-Za-z0-9.-]+', '_', node).strip('_')}.json.gz"
+
+
+class CacheSnapshot:
+    """
+    Периодическое сохранение кэша сделок в сжатый файл и загрузка после запуска.
+
+    Снимок пишется раз в interval и при остановке (атомарной заменой файла),
+    а читается в фоне после запуска, не задерживая прием webhook. Записи
+    снимка проверяются по сроку жизни: устаревшие не загружаются.
+
+    В снимке персональные данные контактов, поэтому файл доступен только
+    владельцу процесса (0600). Временный файл у каждой записи свой, а файл
+    снимка у каждого узла свой (см. snapshot_path).
+    """
+
+    def __init__(self, path: Path, cache: LeadCache, interval: float) -> None:
+        """
+        Args:
+            path: Путь к файлу снимка
+            cache: Кэш сделок
+            interval: Интервал сохранения (в секундах)
+        """
+        self.path = path
+        self.cache = cache
+        self.interval = interval
+        self._task: asyncio.Task[None] | None = None
+
+    def _write(self, entries: list[tuple[Hashable, float, dict[str, Any]]]) -> None:
+        """Записать снимок во временный файл и заменить им предыдущий (в отдельном потоке)."""
+        snapshot = {
+            "version": _FORMAT_VERSION,
+            "saved_at": time.time(),
+            "lead_cache": [[_encode_key(key), expires_at, data] for key, expires_at, data in entries],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # mkstemp создает файл с уникальным именем и правами 0600, os.replace их сохраняет
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as file:
+                json.dump(snapshot, file, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _read(self) -> list[tuple[Hashable, float, dict[str, Any]]]:
+        """Прочитать записи снимка (в отдельном потоке)."""
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            snapshot: dict[str, Any] = json.load(file)
+
+        if snapshot.get("version") != _FORMAT_VERSION:
+            logger.warning("Снимок кэша %s другой версии (%s), пропускаем", self.path, snapshot.get("version"))
+            return []
+
+        return [(_decode_key(key), expires_at, data) for key, expires_at, data in snapshot["lead_cache"]]
+
+    async def save(self) -> int:
+        """
+        Сохранить действующие записи кэша.
+
+        Returns:
+            int: Количество сохраненных записей
+        """
+        entries = self.cache.export()
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except OSError as e:
+            logger.error("Не удалось сохранить снимок кэша: %s", e)
+            return 0
+
+        return len(entries)
+
+    async def load(self) -> int:
+        """
+        Загрузить в кэш записи снимка, срок жизни которых не истек.
+
+        Returns:
+            int: Количество загруженных записей
+        """
+        try:
+            entries = await asyncio.to_thread(self._read)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Не удалось прочитать снимок кэша %s: %s", self.path, e)
+            return 0
+
+        restored = self.cache.restore(entries)
+        logger.info("Из снимка загружено сделок: %s (в снимке %s)", restored, len(entries))
+        return restored
+
+    def start(self) -> None:
+        """Загрузить снимок и сохранять кэш в фоне."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновое сохранение и сохранить кэш в последний раз."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        saved = await self.save()
+        logger.info("Снимок кэша сохранен: %s сделок", saved)
+
+    async def _run(self) -> None:
+        await self.load()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+
+cache_snapshot = CacheSnapshot(
+    path=snapshot_path(Path(settings.DATA_DIR), settings.CLUSTER_SELF_URL or socket.gethostname()),
+    cache=lead_cache,
+    interval=settings.CACHE_SNAPSHOT_INTERVAL_SECONDS,
+)
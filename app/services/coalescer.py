@@ -0,0 +1,165 @@
+"""Склейка серий webhook по одному элементу каталога: обрабатывается только последнее состояние."""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from app.models.payment import PaymentEvent
+from app.services.metrics import metrics
+from app.services.retry_queue import retry_queue
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[PaymentEvent], Awaitable[Any]]
+
+
+class _PendingEvent:
+    """Ожидающее обработки событие и моменты первого и последнего поступления."""
+
+    __slots__ = ("event", "first_seen", "last_seen")
+
+    def __init__(self, event: PaymentEvent, now: float) -> None:
+        self.event = event
+        self.first_seen = now
+        self.last_seen = now
+
+
+class EventCoalescer:
+    """
+    Окно склейки событий по catalog_element_id.
+
+    Событие, пришедшее внутри окна, заменяет ожидающее, и окно продлевается.
+    Обработка запускается, когда окно закрылось без новых событий, но не позже
+    max_delay секунд после первого события серии.
+    """
+
+    def __init__(self, window: float, max_delay: float, max_pending: int, handler: EventHandler) -> None:
+        """
+        Args:
+            window: Окно склейки (в секундах), 0 - склейка выключена
+            max_delay: Максимальная задержка обработки от первого события серии (в секундах)
+            max_pending: Максимум одновременно ожидающих элементов каталога
+            handler: Обработчик итогового события
+        """
+        self.window = window
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._handler = handler
+        self._pending: dict[Hashable, _PendingEvent] = {}
+        self._tasks: dict[Hashable, asyncio.Task[None]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Включена ли склейка событий."""
+        return self.window > 0
+
+    @property
+    def pending_count(self) -> int:
+        """Количество элементов каталога, ожидающих обработки."""
+        return len(self._pending)
+
+    @staticmethod
+    def _key(catalog_element_id: int, tenant: str | None) -> Hashable:
+        return (tenant, catalog_element_id) if tenant is not None else catalog_element_id
+
+    def cancel(self, catalog_element_id: int, tenant: str | None = None) -> bool:
+        """
+        Отменить ожидающее событие элемента каталога.
+
+        Вызывается, когда пришло новое состояние счета, которое не надо
+        обрабатывать (например, счет снова не оплачен): итоговым должно
+        остаться именно оно, а не оплата из начала серии.
+
+        Args:
+            catalog_element_id: ID элемента каталога
+            tenant: Аккаунт amoCRM (None - основной)
+
+        Returns:
+            bool: True если ожидающее событие было отменено
+        """
+        key = self._key(catalog_element_id, tenant)
+        if self._pending.pop(key, None) is None:
+            return False
+
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+        logger.info("Ожидающее событие catalog_element_id=%s отменено более новым состоянием счета", key)
+        return True
+
+    def submit(self, event: PaymentEvent) -> bool:
+        """
+        Поставить событие в окно склейки.
+
+        Args:
+            event: Оплаченный счет
+
+        Returns:
+            bool: True если событие принято (обработается позже), False если его нужно обработать сразу
+        """
+        if not self.enabled or event.catalog_element_id is None:
+            return False
+
+        key = self._key(event.catalog_element_id, event.tenant)
+
+        now = time.monotonic()
+        pending = self._pending.get(key)
+
+        if pending is not None:
+            pending.event = event
+            pending.last_seen = now
+            logger.info("Событие для catalog_element_id=%s склеено с ожидающим", key)
+            return True
+
+        if len(self._pending) >= self.max_pending:
+            logger.warning("Окно склейки переполнено (%s), обрабатываем событие сразу", len(self._pending))
+            return False
+
+        self._pending[key] = _PendingEvent(event, now)
+        self._tasks[key] = asyncio.create_task(self._wait_and_process(key))
+        logger.info("Событие для catalog_element_id=%s ожидает окончания окна склейки", key)
+
+        return True
+
+    async def flush(self) -> None:
+        """Немедленно обработать все ожидающие события (например, при остановке)."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+        pending, self._pending = self._pending, {}
+        await asyncio.gather(*(self._process(key, item.event) for key, item in pending.items()))
+
+    async def _wait_and_process(self, key: Hashable) -> None:
+        """Дождаться закрытия окна для элемента каталога и обработать последнее событие."""
+        while True:
+            pending = self._pending[key]
+            deadline = min(pending.last_seen + self.window, pending.first_seen + self.max_delay)
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        del self._pending[key]
+        self._tasks.pop(key, None)
+        await self._process(key, pending.event)
+
+    async def _process(self, key: Hashable, event: PaymentEvent) -> None:
+        """Вызвать обработчик и залогировать ошибку, не роняя фоновую задачу."""
+        try:
+            await self._handler(event)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.exception("Ошибка при обработке склеенного события catalog_element_id=%s: %s", key, e)
+
+
+event_coalescer = EventCoalescer(
+    window=settings.COALESCE_WINDOW_SECONDS,
+    max_delay=settings.COALESCE_MAX_DELAY_SECONDS,
+    max_pending=settings.COALESCE_MAX_PENDING,
+    handler=retry_queue.process,
+)
+
+metrics.size("coalescer_pending", lambda: event_coalescer.pending_count)
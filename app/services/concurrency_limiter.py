@@ -0,0 +1,177 @@
+"""Адаптивный лимит одновременных запросов к внешним API (AIMD)."""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.services.metrics import metrics
+from app.services.tenants import current_tenant
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitReachedError(Exception):
+    """Свободных мест в лимите нет, а запрос не может ждать (например, дубль запроса)."""
+
+
+def is_overload(error: BaseException) -> bool:
+    """Ошибка говорит о перегрузке внешнего API: 429, 5xx или таймаут."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+
+    return isinstance(error, httpx.TimeoutException)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Лимит одновременных запросов, подстраиваемый по принципу AIMD.
+
+    Пока ответы приходят без ошибок перегрузки и задержка не выше
+    latency_tolerance × базовой, лимит растет на 1 за каждые limit успешных
+    запросов. При 429, 5xx или таймауте лимит умножается на backoff - не
+    чаще раза за время ответа: ошибки запросов, отправленных до предыдущего
+    снижения, относятся к старому лимиту и его уже снизили. Базовая
+    задержка - медленно растущий минимум наблюдаемых задержек.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_tolerance: float,
+        backoff: float,
+    ) -> None:
+        """
+        Args:
+            name: Имя внешнего API (для логов и метрик)
+            initial: Начальный лимит
+            min_limit: Минимальный лимит
+            max_limit: Максимальный лимит
+            latency_tolerance: Во сколько раз задержка может превышать базовую без остановки роста
+            backoff: Множитель лимита при перегрузке (от 0 до 1)
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._baseline: float | None = None
+        # Номер снижения лимита: запрос снижает лимит, только если с его отправки снижений не было
+        self._epoch = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Текущий лимит одновременных запросов."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся запросов."""
+        return self._in_flight
+
+    @property
+    def has_capacity(self) -> bool:
+        """Есть ли свободное место в лимите прямо сейчас."""
+        return self._in_flight < self.limit
+
+    @asynccontextmanager
+    async def permit(self, wait: bool = True) -> AsyncIterator[None]:
+        """
+        Выполнить запрос в пределах лимита и учесть его результат.
+
+        Ошибки перегрузки (is_overload) снижают лимит, успешные быстрые
+        ответы повышают; прочие ошибки лимит не меняют.
+
+        Args:
+            wait: Ждать свободного места; False - сразу отказать, если его нет
+
+        Raises:
+            ConcurrencyLimitReachedError: Если wait=False и свободного места нет
+        """
+        async with self._condition:
+            if not wait and not self.has_capacity:
+                raise ConcurrencyLimitReachedError(f"{self.name}: нет свободных мест в лимите {self.limit}")
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            epoch = self._epoch
+
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if is_overload(e):
+                self._decrease(epoch)
+            raise
+        else:
+            self._on_success(time.monotonic() - started)
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def _on_success(self, latency: float) -> None:
+        """Учесть успешный ответ."""
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # Базовая задержка медленно подтягивается вверх, если upstream стал стабильно медленнее
+            self._baseline += (latency - self._baseline) * 0.01
+
+        if latency <= self._baseline * self.latency_tolerance:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+    def _decrease(self, epoch: int) -> None:
+        """Снизить лимит после ошибки перегрузки запроса, отправленного при номере снижения epoch."""
+        if epoch != self._epoch:
+            return
+
+        self._epoch += 1
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        if self.limit != previous:
+            logger.warning("%s: перегрузка, лимит одновременных запросов %s → %s", self.name, previous, self.limit)
+
+
+_limiters: dict[tuple[str | None, str], AdaptiveConcurrencyLimiter] = {}
+
+
+def get_concurrency_limiter(name: str) -> AdaptiveConcurrencyLimiter:
+    """
+    Получить адаптивный лимит для внешнего API текущего аккаунта.
+
+    У каждого аккаунта свои адреса amoCRM и платформы, поэтому и свой лимит:
+    перегрузка API одного аккаунта не снижает лимит остальных.
+
+    Args:
+        name: Имя внешнего API ("amocrm" или "platform")
+
+    Returns:
+        AdaptiveConcurrencyLimiter: Лимит, общий для всех клиентов этого API в текущем аккаунте
+    """
+    tenant = current_tenant()
+    limiter = _limiters.get((tenant, name))
+    if limiter is None:
+        label = name if tenant is None else f"{tenant}:{name}"
+        limiter = AdaptiveConcurrencyLimiter(
+            name=label,
+            initial=settings.UPSTREAM_CONCURRENCY_INITIAL,
+            min_limit=settings.UPSTREAM_CONCURRENCY_MIN,
+            max_limit=settings.UPSTREAM_CONCURRENCY_MAX,
+            latency_tolerance=settings.UPSTREAM_CONCURRENCY_LATENCY_TOLERANCE,
+            backoff=settings.UPSTREAM_CONCURRENCY_BACKOFF,
+        )
+        _limiters[(tenant, name)] = limiter
+        metrics.gauge(f'upstream_concurrency_limit{{upstream="{label}"}}', lambda: limiter.limit)
+        metrics.gauge(f'upstream_in_flight{{upstream="{label}"}}', lambda: limiter.in_flight)
+
+    return limiter
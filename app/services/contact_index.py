@@ -0,0 +1,115 @@
+"""Постоянный индекс lead_id → contact_id (SQLite) для параллельной загрузки сделки и контакта."""
+
+import logging
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_contacts (
+    lead_id INTEGER PRIMARY KEY,
+    contact_id INTEGER NOT NULL
+)
+"""
+
+
+class ContactIndex:
+    """
+    Индекс основного контакта сделки.
+
+    Заполняется по ответам amoCRM (загрузка сделки и просмотр списков сделок).
+    Если контакт сделки известен, get_lead_with_contact запрашивает сделку
+    и контакт одновременно, а связь проверяет после ответа.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Путь к файлу SQLite
+        """
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и создать таблицу при первом обращении."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            self._connection = connection
+
+        return self._connection
+
+    def get(self, lead_id: int) -> int | None:
+        """
+        Найти основной контакт сделки.
+
+        Args:
+            lead_id: ID сделки
+
+        Returns:
+            int | None: ID контакта или None, если сделка не индексирована
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT contact_id FROM lead_contacts WHERE lead_id = ?", (lead_id,)).fetchone()
+
+        return row[0] if row else None
+
+    def put_many(self, pairs: Iterable[tuple[int, int]]) -> None:
+        """
+        Записать связи сделка → контакт.
+
+        Args:
+            pairs: Пары (lead_id, contact_id)
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.executemany("INSERT OR REPLACE INTO lead_contacts VALUES (?, ?)", pairs)
+            connection.commit()
+
+    def put(self, lead_id: int, contact_id: int) -> None:
+        """
+        Записать связь сделка → контакт.
+
+        Args:
+            lead_id: ID сделки
+            contact_id: ID основного контакта
+        """
+        self.put_many([(lead_id, contact_id)])
+
+    def index_leads(self, leads: Iterable[dict[str, Any]]) -> int:
+        """
+        Проиндексировать сделки из ответа amoCRM (with=contacts).
+
+        Args:
+            leads: Сделки с _embedded.contacts
+
+        Returns:
+            int: Количество проиндексированных сделок
+        """
+        pairs = [
+            (lead["id"], lead["_embedded"]["contacts"][0]["id"]) for lead in leads if lead.get("_embedded", {}).get("contacts")
+        ]
+        if pairs:
+            self.put_many(pairs)
+
+        return len(pairs)
+
+    def close(self) -> None:
+        """Закрыть соединение с базой."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+contact_index = ContactIndex(Path(settings.DATA_DIR) / "contact_index.sqlite3")
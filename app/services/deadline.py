@@ -0,0 +1,85 @@
+"""Общий бюджет времени на обработку одного webhook (deadline)."""
+
+import time
+
+from tenacity import stop_after_attempt, stop_before_delay
+from tenacity.stop import stop_base
+
+
+class DeadlineExceededError(Exception):
+    """Бюджет времени на обработку webhook исчерпан."""
+
+
+class Deadline:
+    """
+    Момент, к которому обработка должна завершиться.
+
+    Передается через весь конвейер: таймауты HTTP-запросов и количество
+    повторных попыток ужимаются под оставшееся время.
+    """
+
+    def __init__(self, timeout: float, expires_at: float | None = None) -> None:
+        """
+        Args:
+            timeout: Бюджет времени (в секундах)
+            expires_at: Момент истечения по time.monotonic() (по умолчанию - сейчас + timeout)
+        """
+        self.total = timeout
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Оставшееся время в секундах (не меньше 0)."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        """Истек ли бюджет времени."""
+        return time.monotonic() >= self.expires_at
+
+    def stage(self, share: float) -> "Deadline":
+        """
+        Выделить бюджет для этапа конвейера.
+
+        Этап получает share от общего бюджета, но не больше оставшегося времени.
+
+        Args:
+            share: Доля общего бюджета (0..1)
+
+        Returns:
+            Deadline: Deadline этапа
+        """
+        budget = self.total * share
+        return Deadline(budget, min(self.expires_at, time.monotonic() + budget))
+
+    def timeout(self, default: float) -> float:
+        """
+        Таймаут очередной попытки: не больше default и не больше оставшегося времени.
+
+        Raises:
+            DeadlineExceededError: Если время уже истекло
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"Бюджет времени {self.total:.1f} с исчерпан")
+
+        return min(default, remaining)
+
+
+def retry_stop(max_attempts: int, deadline: Deadline | None) -> stop_base:
+    """
+    Условие остановки повторных попыток с учетом deadline.
+
+    Повтор не запускается, если пауза перед ним выходит за оставшееся время.
+
+    Args:
+        max_attempts: Максимальное количество попыток
+        deadline: Бюджет времени или None
+
+    Returns:
+        stop_base: Условие остановки для tenacity
+    """
+    stop = stop_after_attempt(max_attempts)
+    if deadline is None:
+        return stop
+
+    return stop | stop_before_delay(deadline.remaining())
@@ -0,0 +1,103 @@
+"""Локальный журнал платежей, успешно доставленных на платформу (SQLite)."""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from app.models.payment import PaymentEvent
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS delivered_payments (
+    catalog_element_id INTEGER PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    order_id TEXT,
+    delivered_at REAL NOT NULL
+)
+"""
+
+
+class DeliveryLog:
+    """Журнал доставленных платежей: по нему сверка находит пропущенные оплаты."""
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Путь к файлу SQLite
+        """
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и создать таблицу при первом обращении."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_SCHEMA)
+            self._connection = connection
+
+        return self._connection
+
+    def record(self, event: PaymentEvent, platform_response: dict[str, str]) -> None:
+        """
+        Записать успешную доставку платежа.
+
+        Args:
+            event: Доставленный платеж
+            platform_response: Ответ платформы (order_id, если есть)
+        """
+        if event.catalog_element_id is None:
+            return
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO delivered_payments VALUES (?, ?, ?, ?, ?)",
+                (event.catalog_element_id, event.lead_id, event.amount, platform_response.get("order_id"), time.time()),
+            )
+            connection.commit()
+
+    def undelivered(self, catalog_element_ids: Iterable[int]) -> set[int]:
+        """
+        Отобрать элементы каталога, по которым доставка не записана.
+
+        Args:
+            catalog_element_ids: ID элементов каталога
+
+        Returns:
+            set[int]: ID элементов, которых нет в журнале
+        """
+        ids = set(catalog_element_ids)
+        if not ids:
+            return ids
+
+        with self._lock:
+            rows = (
+                self._connect()
+                .execute(
+                    f"SELECT catalog_element_id FROM delivered_payments WHERE catalog_element_id IN ({','.join('?' * len(ids))})",
+                    tuple(ids),
+                )
+                .fetchall()
+            )
+
+        return ids - {row[0] for row in rows}
+
+    def close(self) -> None:
+        """Закрыть соединение с базой."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+delivery_log = DeliveryLog(Path(settings.DATA_DIR) / "payments.sqlite3")
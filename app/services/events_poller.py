@@ -0,0 +1,312 @@
+"""Получение изменений счетов опросом /api/v4/events вместо push-webhook."""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import DeliveryLog, delivery_log
+from app.services.retry_queue import retry_queue
+from app.services.retry_store import retry_store
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_CATALOG_ENTITY_TYPE = "catalog_element"
+
+
+async def changed_catalog_element_ids(client: AmoCRMClient, since: int, until: int) -> set[int]:
+    """
+    ID элементов каталога, изменявшихся в интервале [since, until) по /api/v4/events.
+
+    Args:
+        client: Клиент amoCRM
+        since: Начало интервала (unix time)
+        until: Конец интервала (unix time, не включается)
+
+    Returns:
+        set[int]: ID измененных элементов каталога
+    """
+    element_ids: set[int] = set()
+    params = {"filter[created_at][from]": since, "filter[created_at][to]": until - 1, "limit": 250}
+    async for page in client.iterate_pages("/api/v4/events", "events", params=params):
+        element_ids.update(event["entity_id"] for event in page if event.get("entity_type") == _CATALOG_ENTITY_TYPE)
+
+    return element_ids
+
+
+class EventsCursor:
+    """Позиция опроса: created_at последнего обработанного события и ID событий с этим created_at."""
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Путь к файлу курсора
+        """
+        self.path = path
+        self.created_at: int | None = None
+        self.seen: set[str] = set()
+
+    @classmethod
+    def load(cls, path: Path) -> "EventsCursor":
+        """
+        Загрузить курсор с диска.
+
+        Args:
+            path: Путь к файлу курсора
+
+        Returns:
+            EventsCursor: Сохраненный курсор или пустой, если файла нет
+        """
+        cursor = cls(path)
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            cursor.created_at = data["created_at"]
+            cursor.seen = set(data["seen"])
+
+        return cursor
+
+    def save(self) -> None:
+        """Атомарно сохранить курсор на диск."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"created_at": self.created_at, "seen": sorted(self.seen)}), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def is_new(self, event: dict[str, Any]) -> bool:
+        """Событие еще не обработано: оно позже курсора или с тем же created_at, но с другим ID."""
+        if self.created_at is None or event["created_at"] > self.created_at:
+            return True
+
+        return event["created_at"] == self.created_at and event["id"] not in self.seen
+
+    def advance(self, events: list[dict[str, Any]]) -> None:
+        """
+        Сдвинуть курсор за обработанные события и сохранить его.
+
+        Args:
+            events: Обработанные события, отсортированные по created_at
+        """
+        last_created_at = events[-1]["created_at"]
+        if last_created_at != self.created_at:
+            self.created_at = last_created_at
+            self.seen = set()
+
+        self.seen.update(event["id"] for event in events if event["created_at"] == last_created_at)
+        self.save()
+
+    def skip_to(self, created_at: int) -> None:
+        """
+        Сдвинуть курсор на created_at, если все события до него обработаны, и сохранить его.
+
+        Args:
+            created_at: Конец прочитанного окна событий
+        """
+        if self.created_at is None or created_at > self.created_at:
+            self.created_at = created_at
+            self.seen = set()
+            self.save()
+
+
+class EventsPoller:
+    """
+    Опрос /api/v4/events: pull-альтернатива webhook с контролируемой нагрузкой.
+
+    События читаются окнами по created_at (window секунд), поэтому в памяти
+    нет всей истории с момента курсора. События изменений элементов каталога
+    обрабатываются пачками: по каждой пачке запрашиваются сами счета,
+    оплаченные и еще не доставленные уходят в CatalogWebhookProcessor.
+    Курсор сохраняется после каждой пачки и каждого прочитанного окна, поэтому
+    после перезапуска события не обрабатываются повторно.
+
+    Интервал опроса подстраивается под поток событий: при полной пачке
+    следующий опрос идет через min_interval, без событий - интервал удваивается
+    до max_interval.
+    """
+
+    def __init__(
+        self,
+        cursor_path: Path,
+        deliveries: DeliveryLog,
+        min_interval: float,
+        max_interval: float,
+        batch_size: int,
+        concurrency: int,
+        window: int,
+    ) -> None:
+        """
+        Args:
+            cursor_path: Путь к файлу курсора
+            deliveries: Журнал доставленных платежей
+            min_interval: Минимальный интервал опроса (в секундах)
+            max_interval: Максимальный интервал опроса (в секундах)
+            batch_size: Размер пачки событий
+            concurrency: Максимум одновременно обрабатываемых счетов
+            window: Окно created_at, читаемое за один проход (в секундах)
+        """
+        self.cursor_path = cursor_path
+        self.deliveries = deliveries
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.window = window
+        self.interval = min_interval
+        self._task: asyncio.Task[None] | None = None
+
+    async def poll_once(self) -> dict[str, int]:
+        """
+        Получить новые события окнами по created_at, обработать их пачками и пересчитать интервал опроса.
+
+        Returns:
+            dict: Статистика опроса (events, elements, delivered, failed)
+
+        Raises:
+            ValueError: Если не задан AMO_INVOICES_CATALOG_ID
+        """
+        catalog_id = settings.AMO_INVOICES_CATALOG_ID
+        if catalog_id is None:
+            raise ValueError("Не задан AMO_INVOICES_CATALOG_ID")
+
+        cursor = await asyncio.to_thread(EventsCursor.load, self.cursor_path)
+        client = AmoCRMClient()
+        stats = {"events": 0, "elements": 0, "delivered": 0, "failed": 0}
+        now = int(time.time())
+
+        if cursor.created_at is None:
+            # Первый запуск: историю не перечитываем, для нее есть догрузка (app.cli.backfill)
+            cursor.created_at = now
+            await asyncio.to_thread(cursor.save)
+
+        while cursor.created_at is not None:
+            since = cursor.created_at
+            window_end = since + self.window
+            events = await self._fetch_events(client, cursor, since, min(window_end, now))
+            stats["events"] += len(events)
+
+            for start in range(0, len(events), self.batch_size):
+                batch = events[start : start + self.batch_size]
+                await self._process_batch(client, catalog_id, batch, stats)
+                await asyncio.to_thread(cursor.advance, batch)
+
+            if window_end >= now:
+                break
+
+            # Окно целиком в прошлом: следующий проход начинается с его конца
+            await asyncio.to_thread(cursor.skip_to, window_end)
+
+        if stats["events"] >= self.batch_size:
+            self.interval = self.min_interval
+        elif stats["events"]:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+        if stats["events"]:
+            logger.info("Опрос событий: %s, следующий через %.1f с", stats, self.interval)
+
+        return stats
+
+    async def _fetch_events(self, client: AmoCRMClient, cursor: EventsCursor, since: int, until: int) -> list[dict[str, Any]]:
+        """
+        Новые события элементов каталога за окно [since, until], отсортированные по created_at.
+
+        amoCRM не гарантирует порядок событий между страницами, поэтому окно
+        читается целиком, но в памяти хранятся только события каталога, а
+        размер окна ограничен window.
+        """
+        events: list[dict[str, Any]] = []
+        params = {"filter[created_at][from]": since, "filter[created_at][to]": until, "limit": self.batch_size}
+        async for page in client.iterate_pages("/api/v4/events", "events", params=params):
+            events.extend(event for event in page if event.get("entity_type") == _CATALOG_ENTITY_TYPE and cursor.is_new(event))
+
+        events.sort(key=lambda event: (event["created_at"], event["id"]))
+        return events
+
+    async def _process_batch(
+        self, client: AmoCRMClient, catalog_id: int, batch: list[dict[str, Any]], stats: dict[str, int]
+    ) -> None:
+        """
+        Запросить счета из пачки событий и доставить оплаченные.
+
+        Недоставленный счет сохраняется в RetryStore до постановки в очередь
+        повтора: курсор уходит дальше, и после падения сервиса счет
+        восстанавливается из хранилища, а не теряется вместе с очередью.
+        """
+        element_ids = await asyncio.to_thread(self.deliveries.undelivered, [event["entity_id"] for event in batch])
+        if not element_ids:
+            return
+
+        processor = CatalogWebhookProcessor()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(element: dict[str, Any]) -> None:
+            async with semaphore:
+                try:
+                    event = processor.extract_payment_event_from_element(element)
+                except ValueError as e:
+                    stats["failed"] += 1
+                    logger.error("Счет %s не может быть обработан: %s", element.get("id"), e)
+                    return
+
+                if event is None:
+                    return
+
+                try:
+                    await processor.process_payment_event(event)
+                    stats["delivered"] += 1
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    stats["failed"] += 1
+                    logger.error("Счет %s не доставлен, ставим в очередь повтора: %s", element.get("id"), e)
+                    await asyncio.to_thread(retry_store.save, [(event, 0)])
+                    retry_queue.enqueue(event)
+
+        params = {"filter[id][]": sorted(element_ids), "limit": self.batch_size}
+        async for page in client.iterate_pages(f"/api/v4/catalogs/{catalog_id}/elements", "elements", params=params):
+            stats["elements"] += len(page)
+            await asyncio.gather(*(deliver(element) for element in page))
+
+    def start(self) -> None:
+        """Запустить опрос событий, если включен EVENTS_POLL_ENABLED."""
+        if not settings.EVENTS_POLL_ENABLED or settings.AMO_INVOICES_CATALOG_ID is None:
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self) -> None:
+        """Остановить опрос событий."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_periodically(self) -> None:
+        """Опрашивать события с адаптивным интервалом."""
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception("Ошибка опроса событий amoCRM: %s", e)
+                self.interval = min(self.max_interval, self.interval * 2)
+
+            await asyncio.sleep(self.interval)
+
+
+events_poller = EventsPoller(
+    cursor_path=Path(settings.DATA_DIR) / "events_cursor.json",
+    deliveries=delivery_log,
+    min_interval=settings.EVENTS_POLL_MIN_INTERVAL_SECONDS,
+    max_interval=settings.EVENTS_POLL_MAX_INTERVAL_SECONDS,
+    batch_size=settings.EVENTS_POLL_BATCH_SIZE,
+    concurrency=settings.EVENTS_POLL_CONCURRENCY,
+    window=settings.EVENTS_POLL_WINDOW_SECONDS,
+)
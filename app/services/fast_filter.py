@@ -0,0 +1,152 @@
+"""Быстрый отсев неоплаченных webhook по сырому телу запроса, без полного парсинга."""
+
+import re
+from urllib.parse import unquote_plus
+
+from app.settings import settings
+
+# Варианты записи квадратных скобок в ключах form-urlencoded тела
+_BRACKETS = ((b"[", b"]"), (b"%5B", b"%5D"), (b"%5b", b"%5d"))
+
+_CODE_KEY_RE = re.compile(r"^catalogs\[(add|update)\]\[0\]\[custom_fields\]\[(\d+)\]\[code\]$")
+
+_BILL_STATUS = b"BILL_STATUS"
+_BILL_STATUS_VALUE = b"=" + _BILL_STATUS
+
+
+def _encode_key(key: str, opening: bytes, closing: bytes) -> bytes:
+    """Закодировать ключ с заданным вариантом записи скобок."""
+    return key.encode("ascii").replace(b"[", opening).replace(b"]", closing)
+
+
+def _find_single_value(raw_body: bytes, key: bytes) -> bytes | None:
+    """
+    Найти значение ключа, который встречается в теле ровно один раз.
+
+    Returns:
+        bytes | None: Значение или None, если ключ не найден или повторяется
+    """
+    needle = key + b"="
+    start = len(needle) if raw_body.startswith(needle) else -1
+
+    needle = b"&" + needle
+    found = raw_body.find(needle)
+    if found != -1:
+        if start != -1 or raw_body.find(needle, found + 1) != -1:
+            return None
+        start = found + len(needle)
+
+    if start == -1:
+        return None
+
+    end = raw_body.find(b"&", start)
+    return raw_body[start : end if end != -1 else len(raw_body)]
+
+
+def _find_bill_status_enum(raw_body: bytes) -> bytes | None:
+    """
+    Найти enum поля BILL_STATUS, не разбирая остальное тело.
+
+    Все сомнительные случаи (несколько BILL_STATUS, смешанная кодировка
+    скобок, события add и update в одном теле) дают None.
+
+    Returns:
+        bytes | None: Значение enum или None, если его не удалось однозначно найти
+    """
+    if raw_body.count(_BILL_STATUS) != 1:
+        return None
+
+    value_pos = raw_body.find(_BILL_STATUS_VALUE)
+    value_end = value_pos + len(_BILL_STATUS_VALUE)
+    if value_pos == -1 or (value_end < len(raw_body) and raw_body[value_end] != ord("&")):
+        return None
+
+    raw_key = raw_body[raw_body.rfind(b"&", 0, value_pos) + 1 : value_pos]
+    match = _CODE_KEY_RE.match(unquote_plus(raw_key.decode("ascii", errors="replace")))
+    if not match:
+        return None
+
+    event_type, field_index = match.groups()
+
+    # Вариант записи скобок берем из найденного ключа: в закодированном теле не должно быть сырых скобок
+    for opening, closing in _BRACKETS:
+        if raw_key == _encode_key(match.group(0), opening, closing):
+            break
+    else:
+        return None
+
+    if opening != b"[" and b"[" in raw_body:
+        return None
+
+    # Полный парсер считает событие "add", если в теле есть хоть один ключ catalogs[add][0]
+    if event_type == "update" and _encode_key("catalogs[add][0]", opening, closing) in raw_body:
+        return None
+
+    enum_key = f"catalogs[{event_type}][0][custom_fields][{field_index}][values][0][enum]"
+    enum_value = _find_single_value(raw_body, _encode_key(enum_key, opening, closing))
+
+    return enum_value if enum_value and enum_value.isdigit() else None
+
+
+def fast_reject_reason(raw_body: bytes) -> str | None:
+    """
+    Определить по сырому телу, что webhook заведомо будет проигнорирован.
+
+    Проверка консервативна: причина возвращается, только если результат
+    полного парсинга однозначен. Во всех сомнительных случаях возвращается
+    None, и webhook идет через полный парсер.
+
+    Args:
+        raw_body: Сырое тело запроса (application/x-www-form-urlencoded)
+
+    Returns:
+        str | None: "not_catalog_event", "not_paid" или None, если нужен полный разбор
+    """
+    if b"catalogs" not in raw_body:
+        return "not_catalog_event"
+
+    enum_value = _find_bill_status_enum(raw_body)
+    if enum_value is None:
+        return None
+
+    if int(enum_value) == settings.AMO_BILL_STATUS_PAID_ENUM:
+        return None
+
+    return "not_paid"
+
+
+_LEAD_LINK_RE = re.compile(rb"(?:/|%2[Ff])leads(?:/|%2[Ff])detail(?:/|%2[Ff])(\d+)")
+
+
+def extract_lead_id(raw_body: bytes) -> int | None:
+    """
+    Найти ID сделки из ссылки LINK_TO_LEAD в сыром теле, без полного парсинга.
+
+    Args:
+        raw_body: Сырое тело запроса (application/x-www-form-urlencoded)
+
+    Returns:
+        int | None: ID сделки или None, если ссылка не найдена или их несколько разных
+    """
+    lead_ids = {int(match) for match in _LEAD_LINK_RE.findall(raw_body)}
+    return lead_ids.pop() if len(lead_ids) == 1 else None
+
+
+def extract_catalog_element_id(raw_body: bytes) -> int | None:
+    """
+    Найти ID элемента каталога (catalogs[update|add][0][id]) в сыром теле, без полного парсинга.
+
+    Args:
+        raw_body: Сырое тело запроса (application/x-www-form-urlencoded)
+
+    Returns:
+        int | None: ID элемента или None, если он не найден однозначно
+    """
+    found = set()
+    for event_type in ("add", "update"):
+        for opening, closing in _BRACKETS:
+            value = _find_single_value(raw_body, _encode_key(f"catalogs[{event_type}][0][id]", opening, closing))
+            if value is not None and value.isdigit():
+                found.add(int(value))
+
+    return found.pop() if len(found) == 1 else None
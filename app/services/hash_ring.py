@@ -0,0 +1,72 @@
+"""Консистентное хеширование ключей по узлам кластера."""
+
+import bisect
+import hashlib
+from collections.abc import Iterable
+
+
+def _hash(value: str) -> int:
+    """Стабильный между процессами хеш (встроенный hash() рандомизирован)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования с виртуальными узлами.
+
+    При добавлении или удалении узла меняют владельца только ключи,
+    попадающие на его участки кольца (примерно 1/N всех ключей).
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64) -> None:
+        """
+        Args:
+            nodes: Узлы кольца
+            vnodes: Количество виртуальных узлов на каждый узел
+        """
+        self.vnodes = vnodes
+        self._nodes: set[str] = set()
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self.set_nodes(nodes)
+
+    @property
+    def nodes(self) -> list[str]:
+        """Узлы кольца (отсортированы)."""
+        return sorted(self._nodes)
+
+    def set_nodes(self, nodes: Iterable[str]) -> bool:
+        """
+        Заменить набор узлов.
+
+        Args:
+            nodes: Новый набор узлов
+
+        Returns:
+            bool: True если набор изменился
+        """
+        new_nodes = set(nodes)
+        if new_nodes == self._nodes and self._points:
+            return False
+
+        ring = sorted((_hash(f"{node}#{index}"), node) for node in new_nodes for index in range(self.vnodes))
+        self._nodes = new_nodes
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+        return True
+
+    def owner(self, key: str | int) -> str | None:
+        """
+        Найти узел-владельца ключа.
+
+        Args:
+            key: Ключ (например, lead_id)
+
+        Returns:
+            str | None: Узел или None, если кольцо пусто
+        """
+        if not self._points:
+            return None
+
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[index]
@@ -0,0 +1,99 @@
+"""Ограничение доли дублирующих (hedged) запросов."""
+
+import logging
+
+from app.services.metrics import LatencyHistogram, metrics
+from app.services.tenants import current_tenant
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Задержка дубля, пока задержек накоплено слишком мало для p95
+_DEFAULT_HEDGE_DELAY = 1.0
+_MIN_SAMPLES = 20
+
+
+class HedgeBudget:
+    """
+    Бюджет дублей: каждый запрос пополняет его на ratio, каждый дубль тратит 1.
+
+    Так доля дублей не превышает ratio даже при всплеске медленных ответов,
+    а запас max_tokens позволяет продублировать короткую серию подряд.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float) -> None:
+        """
+        Args:
+            ratio: Допустимая доля дублей от всех запросов
+            max_tokens: Максимальный запас дублей
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def record_request(self) -> None:
+        """Учесть обычный запрос."""
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Взять из бюджета один дубль.
+
+        Returns:
+            bool: True если дубль разрешен
+        """
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+
+def hedge_delay(latency: LatencyHistogram) -> float:
+    """
+    Через сколько секунд без ответа отправлять дубль.
+
+    Args:
+        latency: Гистограмма задержек запросов
+
+    Returns:
+        float: AMO_HEDGE_DELAY_SECONDS, если задан, иначе измеренный p95
+    """
+    if settings.AMO_HEDGE_DELAY_SECONDS > 0:
+        return settings.AMO_HEDGE_DELAY_SECONDS
+
+    if latency.samples < _MIN_SAMPLES:
+        return _DEFAULT_HEDGE_DELAY
+
+    return latency.quantile(0.95) or _DEFAULT_HEDGE_DELAY
+
+
+_budgets: dict[str | None, HedgeBudget] = {}
+
+
+def get_hedge_budget() -> HedgeBudget:
+    """
+    Получить бюджет дублей текущего аккаунта.
+
+    У каждого аккаунта свой лимит запросов amoCRM, поэтому дубли одного
+    аккаунта не расходуют бюджет остальных.
+
+    Returns:
+        HedgeBudget: Бюджет дублей аккаунта
+    """
+    tenant = current_tenant()
+    budget = _budgets.get(tenant)
+    if budget is None:
+        budget = _budgets[tenant] = HedgeBudget(ratio=settings.AMO_HEDGE_MAX_RATIO, max_tokens=settings.AMO_HEDGE_BURST)
+
+    return budget
+
+
+def _ratio(numerator: str, denominator: str) -> float:
+    """Отношение двух счетчиков (0, если знаменатель пуст)."""
+    total = metrics.counter(denominator)
+    return metrics.counter(numerator) / total if total else 0.0
+
+
+metrics.gauge("amocrm_hedge_rate", lambda: _ratio("amocrm_hedged_requests_total", "amocrm_get_requests_total"))
+metrics.gauge("amocrm_hedge_win_rate", lambda: _ratio("amocrm_hedge_wins_total", "amocrm_hedged_requests_total"))
@@ -0,0 +1,92 @@
+"""Общий пул HTTP-соединений к внешним сервисам (amoCRM, платформа)."""
+
+import asyncio
+import logging
+
+import httpx
+
+from app.services.tenants import current_tenant
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ - (аккаунт amoCRM, base_url): у каждого аккаунта свои пулы соединений
+_clients: dict[tuple[str | None, str], tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Получить общий httpx-клиент для внешнего сервиса.
+
+    Клиент создается один раз на аккаунт, base_url и текущий event loop,
+    поэтому TCP/TLS-соединения переиспользуются между webhook, а всплеск
+    одного аккаунта не занимает соединения остальных.
+
+    Args:
+        base_url: Базовый URL сервиса (например, settings.AMO_BASE_URL)
+
+    Returns:
+        httpx.AsyncClient: Клиент с пулом соединений
+    """
+    loop = asyncio.get_running_loop()
+    key = (current_tenant(), base_url)
+    cached = _clients.get(key)
+
+    if cached is not None and cached[0] is loop and not cached[1].is_closed:
+        return cached[1]
+
+    client = httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    _clients[key] = (loop, client)
+    logger.info("Создан пул HTTP-соединений для %s", _label(key))
+
+    return client
+
+
+def _label(key: tuple[str | None, str]) -> str:
+    """Имя пула в логах и статистике: base_url, для дополнительных аккаунтов - с именем аккаунта."""
+    tenant, base_url = key
+    return base_url if tenant is None else f"{tenant}:{base_url}"
+
+
+def pool_stats() -> dict[str, dict[str, int]]:
+    """
+    Использование пулов соединений по внешним сервисам.
+
+    Читает состояние пулов без ожидания блокировок: значения могут
+    отставать на один запрос, зато опрос не мешает обработке webhook.
+
+    Returns:
+        dict: {base_url (или "аккаунт:base_url"): {"connections", "active", "idle", "requests"}}
+    """
+    stats: dict[str, dict[str, int]] = {}
+    for key, (_, client) in list(_clients.items()):
+        pool = getattr(client._transport, "_pool", None)  # pylint: disable=protected-access
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats[_label(key)] = {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            # Запросы, которые выполняются или ждут свободного соединения
+            "requests": len(getattr(pool, "_requests", [])),
+        }
+
+    return stats
+
+
+async def close_http_clients() -> None:
+    """Закрыть все пулы соединений текущего event loop."""
+    loop = asyncio.get_running_loop()
+
+    for key, (client_loop, client) in list(_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+            logger.info("Пул HTTP-соединений для %s закрыт", _label(key))
+        del _clients[key]
@@ -0,0 +1,109 @@
+"""Последовательная обработка событий одного ключа при параллельной обработке разных ключей."""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TypeVar
+
+from app.services.admission import AdmissionRejectedError
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _KeyState:
+    """Очередь одного ключа: блокировка (FIFO) и количество ожидающих задач."""
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class KeyedExecutor:
+    """
+    Исполнитель с упорядочиванием по ключу.
+
+    Задачи одного ключа (например, lead_id) выполняются строго по очереди
+    в порядке поступления, задачи разных ключей - параллельно, но не больше
+    workers одновременно. Ожидающие задачи ключа не занимают worker, поэтому
+    один "горячий" ключ держит не больше одного worker; его очередь
+    ограничена max_queue_per_key.
+    """
+
+    def __init__(self, workers: int, max_queue_per_key: int, retry_after: int) -> None:
+        """
+        Args:
+            workers: Максимум одновременно выполняемых задач
+            max_queue_per_key: Максимум задач одного ключа (выполняемая и ожидающие)
+            retry_after: Значение Retry-After при переполнении очереди ключа (в секундах)
+        """
+        self.max_queue_per_key = max_queue_per_key
+        self.retry_after = retry_after
+        self._workers = asyncio.Semaphore(workers)
+        self._keys: dict[Hashable, _KeyState] = {}
+
+    @property
+    def active_keys(self) -> int:
+        """Количество ключей с выполняемыми или ожидающими задачами."""
+        return len(self._keys)
+
+    def pending(self, key: Hashable) -> int:
+        """Количество задач ключа (выполняемая и ожидающие)."""
+        state = self._keys.get(key)
+        return state.pending if state is not None else 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]], timeout: float | None = None) -> T:
+        """
+        Выполнить задачу после всех ранее поставленных задач того же ключа.
+
+        Args:
+            key: Ключ упорядочивания
+            func: Функция, возвращающая корутину задачи
+            timeout: Максимальное ожидание очереди (в секундах), None - без ограничения
+
+        Returns:
+            Результат задачи
+
+        Raises:
+            AdmissionRejectedError: Если очередь ключа переполнена
+            TimeoutError: Если очередь не дошла до задачи за timeout
+        """
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState()
+
+        if state.pending >= self.max_queue_per_key:
+            logger.warning("Очередь ключа %s переполнена (%s задач)", key, state.pending)
+            raise AdmissionRejectedError("key_queue_full", self.retry_after)
+
+        state.pending += 1
+        try:
+            async with asyncio.timeout(timeout):
+                await state.lock.acquire()
+                try:
+                    await self._workers.acquire()
+                except BaseException:
+                    state.lock.release()
+                    raise
+
+            try:
+                return await func()
+            finally:
+                self._workers.release()
+                state.lock.release()
+        finally:
+            state.pending -= 1
+            if state.pending == 0:
+                del self._keys[key]
+
+
+keyed_executor = KeyedExecutor(
+    workers=settings.KEYED_EXECUTOR_WORKERS,
+    max_queue_per_key=settings.KEYED_EXECUTOR_MAX_QUEUE_PER_KEY,
+    retry_after=settings.WEBHOOK_RETRY_AFTER_SECONDS,
+)
+
+metrics.gauge("keyed_executor_active_keys", lambda: keyed_executor.active_keys)
@@ -0,0 +1,128 @@
+"""Кэш сделок с контактами, загруженных заранее (до оплаты счета)."""
+
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LeadCache:
+    """
+    LRU-кэш результатов get_lead_with_contact с ограниченным сроком жизни.
+
+    Запись забирается один раз: оплата должна видеть данные не старше ttl,
+    а повторная оплата той же сделки пойдет в amoCRM за свежими.
+
+    Записи переживают перезапуск через снимок (export/restore); попадания
+    считаются в lead_cache_lookups_total отдельно для предзагруженных и
+    восстановленных из снимка записей.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """
+        Args:
+            ttl: Срок жизни записи (в секундах)
+            max_size: Максимальное количество записей
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        # lead_id -> (срок жизни по time.monotonic, данные, источник: "prefetch" или "snapshot")
+        self._entries: OrderedDict[Hashable, tuple[float, dict[str, Any], str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, lead_id: Hashable) -> bool:
+        entry = self._entries.get(lead_id)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, lead_id: Hashable, lead_and_contact: dict[str, Any]) -> None:
+        """
+        Положить сделку с контактом в кэш.
+
+        Args:
+            lead_id: ID сделки (для дополнительных аккаунтов - (аккаунт, ID сделки))
+            lead_and_contact: Результат get_lead_with_contact
+        """
+        self._entries[lead_id] = (time.monotonic() + self.ttl, lead_and_contact, "prefetch")
+        self._entries.move_to_end(lead_id)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Удалить самые старые записи сверх max_size."""
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, lead_id: Hashable) -> None:
+        """
+        Удалить запись, если она есть (данные сделки изменились и устарели).
+
+        Args:
+            lead_id: ID сделки (для дополнительных аккаунтов - (аккаунт, ID сделки))
+        """
+        self._entries.pop(lead_id, None)
+
+    def pop(self, lead_id: Hashable) -> dict[str, Any] | None:
+        """
+        Забрать сделку с контактом из кэша.
+
+        Args:
+            lead_id: ID сделки (для дополнительных аккаунтов - (аккаунт, ID сделки))
+
+        Returns:
+            dict | None: Результат get_lead_with_contact или None, если записи нет или она устарела
+        """
+        entry = self._entries.pop(lead_id, None)
+        if entry is None or entry[0] <= time.monotonic():
+            metrics.inc("lead_cache_lookups_total", result="miss")
+            return None
+
+        metrics.inc("lead_cache_lookups_total", result="hit", source=entry[2])
+        logger.info("Сделка %s взята из кэша предзагрузки", lead_id)
+        return entry[1]
+
+    def export(self) -> list[tuple[Hashable, float, dict[str, Any]]]:
+        """
+        Действующие записи для снимка, от старых к новым.
+
+        Returns:
+            list: Тройки (lead_id, срок жизни в unix time, данные)
+        """
+        now, wall_now = time.monotonic(), time.time()
+        return [
+            (lead_id, wall_now + expires - now, data) for lead_id, (expires, data, _) in self._entries.items() if expires > now
+        ]
+
+    def restore(self, entries: Iterable[tuple[Hashable, float, dict[str, Any]]]) -> int:
+        """
+        Добавить записи из снимка; устаревшие и уже загруженные заново пропускаются.
+
+        Args:
+            entries: Тройки (lead_id, срок жизни в unix time, данные) от старых к новым
+
+        Returns:
+            int: Количество добавленных записей
+        """
+        now, wall_now = time.monotonic(), time.time()
+        restored: OrderedDict[Hashable, tuple[float, dict[str, Any], str]] = OrderedDict()
+        for lead_id, expires_at, data in entries:
+            if expires_at > wall_now and lead_id not in self._entries:
+                restored[lead_id] = (now + min(expires_at - wall_now, self.ttl), data, "snapshot")
+
+        added = list(restored)
+        # Записи, загруженные после запуска, новее снимка
+        restored.update(self._entries)
+        self._entries = restored
+        self._evict()
+        return sum(1 for lead_id in added if lead_id in self._entries)
+
+
+lead_cache = LeadCache(ttl=settings.LEAD_PREFETCH_TTL_SECONDS, max_size=settings.LEAD_PREFETCH_MAX_ENTRIES)
+
+metrics.size("lead_cache", lambda: len(lead_cache))
@@ -0,0 +1,109 @@
+"""Наблюдение за задержкой event loop и поиск кода, который его блокирует."""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Задержка планирования event loop и стеки синхронного кода, который его держит.
+
+    Задача на loop раз в interval засыпает и измеряет, насколько позже
+    запланированного проснулась (гистограмма event_loop_lag_seconds).
+    Отдельный поток следит за отметками этой задачи: если loop не
+    отвечает дольше threshold, поток снимает стек потока loop и пишет его
+    в лог - это стек кода, который блокирует все остальные webhook.
+    """
+
+    def __init__(self, interval: float, threshold: float) -> None:
+        """
+        Args:
+            interval: Интервал измерений (в секундах)
+            threshold: Задержка, после которой снимается стек (в секундах)
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._last_lag = 0.0
+        self._loop_thread_id = 0
+        self._task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def last_lag(self) -> float:
+        """Задержка последнего измерения (в секундах)."""
+        return self._last_lag
+
+    def start(self) -> None:
+        """Запустить измерения и поток наблюдения."""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Остановить измерения и поток наблюдения."""
+        self._stopped.set()
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            scheduled = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+
+            self._last_lag = max(0.0, now - scheduled)
+            metrics.observe("event_loop_lag_seconds", self._last_lag)
+            if self._last_lag >= self.threshold:
+                logger.warning("Event loop был заблокирован на %.3f с", self._last_lag)
+
+    def _watch(self) -> None:
+        """Снимать стек потока loop, пока он не отвечает дольше threshold (один раз на блокировку)."""
+        reported_heartbeat = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)  # pylint: disable=protected-access
+            if frame is None:
+                continue
+
+            metrics.inc("event_loop_stalls_total")
+            logger.warning("Event loop не отвечает %.3f с, выполняется:\n%s", stalled, "".join(traceback.format_stack(frame)))
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_SECONDS,
+    threshold=settings.LOOP_LAG_THRESHOLD_SECONDS,
+)
+
+metrics.gauge("event_loop_lag_last_seconds", lambda: loop_monitor.last_lag)
@@ -0,0 +1,153 @@
+"""Диагностика роста памяти: снимки tracemalloc и их сравнение."""
+
+import logging
+import tracemalloc
+from collections import OrderedDict
+from typing import Any
+
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryDiagnostics:
+    """
+    Именованные снимки tracemalloc и разница между ними по модулям и строкам.
+
+    Пока трассировка не включена (start), сервис не несет накладных
+    расходов. Разница снимков показывается вместе с размерами кэшей и
+    очередей (metrics.sizes), чтобы отличить утечку от заполняющегося кэша.
+    """
+
+    def __init__(self, frames: int, max_snapshots: int) -> None:
+        """
+        Args:
+            frames: Глубина стека, сохраняемая для каждого выделения памяти
+            max_snapshots: Сколько снимков хранить (старые удаляются)
+        """
+        self.frames = frames
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[str, tracemalloc.Snapshot] = OrderedDict()
+
+    @property
+    def tracing(self) -> bool:
+        """Включена ли трассировка выделений памяти."""
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Включить трассировку выделений памяти."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info("Трассировка памяти включена (глубина стека %s)", self.frames)
+
+    def stop(self) -> None:
+        """Выключить трассировку и удалить снимки."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("Трассировка памяти выключена")
+        self._snapshots.clear()
+
+    def status(self) -> dict[str, Any]:
+        """Состояние трассировки, снимки и размеры кэшей и очередей."""
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "snapshots": list(self._snapshots),
+            "sizes": metrics.sizes(),
+        }
+
+    def take_snapshot(self, name: str) -> dict[str, Any]:
+        """
+        Снять и сохранить именованный снимок.
+
+        Args:
+            name: Имя снимка
+
+        Returns:
+            dict: Имя снимка, объем и количество отслеживаемых выделений
+
+        Raises:
+            RuntimeError: Если трассировка не включена
+        """
+        snapshot = self._snapshot()
+        self._snapshots.pop(name, None)
+        self._snapshots[name] = snapshot
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+
+        stats = snapshot.statistics("filename")
+        return {
+            "name": name,
+            "size_bytes": sum(stat.size for stat in stats),
+            "count": sum(stat.count for stat in stats),
+        }
+
+    def compare(self, base: str, target: str | None = None, group_by: str = "lineno", limit: int = 20) -> list[dict[str, Any]]:
+        """
+        Наибольшие изменения памяти между снимками.
+
+        Args:
+            base: Имя исходного снимка
+            target: Имя снимка для сравнения; None - снять текущий
+            group_by: Группировка: "filename" (модуль) или "lineno" (строка)
+            limit: Сколько записей вернуть
+
+        Returns:
+            list[dict]: Изменения по убыванию прироста памяти
+
+        Raises:
+            KeyError: Если снимок не найден
+            RuntimeError: Если нужно снять снимок, а трассировка не включена
+        """
+        snapshot = self._snapshots[target] if target is not None else self._snapshot()
+        differences = snapshot.compare_to(self._snapshots[base], group_by)
+        return [
+            {
+                "location": str(diff.traceback[0]),
+                "size_diff_bytes": diff.size_diff,
+                "size_bytes": diff.size,
+                "count_diff": diff.count_diff,
+                "count": diff.count,
+            }
+            for diff in differences[:limit]
+        ]
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Трассировка памяти не включена")
+
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def format_differences(differences: list[dict[str, Any]], sizes: dict[str, float]) -> str:
+    """
+    Записать изменения памяти и размеры структур в виде текста.
+
+    Args:
+        differences: Результат MemoryDiagnostics.compare
+        sizes: Размеры кэшей и очередей (metrics.sizes)
+
+    Returns:
+        str: Текстовый отчет
+    """
+    lines = [
+        f"{diff['size_diff_bytes'] / 1024:+10.1f} KiB {diff['count_diff']:+8d} blocks  "
+        f"{diff['size_bytes'] / 1024:10.1f} KiB  {diff['location']}"
+        for diff in differences
+    ]
+    lines.append("")
+    lines.extend(f"{component}: {size:g}" for component, size in sizes.items())
+    return "\n".join(lines) + "\n"
+
+
+memory_diagnostics = MemoryDiagnostics(frames=settings.MEMORY_TRACE_FRAMES, max_snapshots=settings.MEMORY_MAX_SNAPSHOTS)
@@ -0,0 +1,197 @@
+"""Метрики сервиса в памяти процесса и их выдача в формате Prometheus."""
+
+import bisect
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+
+logger = logging.getLogger(__name__)
+
+Labels = tuple[tuple[str, str], ...]
+
+# Границы корзин гистограммы задержек (в секундах)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек: корзины для выдачи в Prometheus и окно последних
+    значений для расчета квантилей внутри сервиса.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        """
+        Args:
+            window: Сколько последних значений хранить для квантилей
+        """
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        """Учесть одно значение задержки."""
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self._recent.append(seconds)
+
+    @property
+    def samples(self) -> int:
+        """Количество значений в окне."""
+        return len(self._recent)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Квантиль задержки по окну последних значений.
+
+        Args:
+            q: Квантиль от 0 до 1 (например, 0.95)
+
+        Returns:
+            float | None: Значение квантиля или None, если значений нет
+        """
+        if not self._recent:
+            return None
+
+        ordered = sorted(self._recent)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class RecentEvents:
+    """Моменты последних событий для подсчета за скользящие окна (например, повторы за 5 минут)."""
+
+    def __init__(self, horizon: float = 3600.0, max_events: int = 100_000) -> None:
+        """
+        Args:
+            horizon: Сколько секунд хранить события
+            max_events: Максимум хранимых событий
+        """
+        self.horizon = horizon
+        self._events: deque[float] = deque(maxlen=max_events)
+
+    def add(self) -> None:
+        """Учесть событие."""
+        now = time.monotonic()
+        self._events.append(now)
+        while self._events and self._events[0] < now - self.horizon:
+            self._events.popleft()
+
+    def count(self, seconds: float) -> int:
+        """Количество событий за последние seconds секунд."""
+        since = time.monotonic() - seconds
+        result = 0
+        for moment in reversed(self._events):
+            if moment < since:
+                break
+            result += 1
+
+        return result
+
+
+class Metrics:
+    """Реестр счетчиков, гистограмм и вычисляемых показателей."""
+
+    def __init__(self) -> None:
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], LatencyHistogram] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+        self._sizes: dict[str, Callable[[], float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> tuple[str, Labels]:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Увеличить счетчик."""
+        key = self._key(name, labels)
+        self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Текущее значение счетчика."""
+        return self._counters.get(self._key(name, labels), 0.0)
+
+    def histogram(self, name: str, **labels: str) -> LatencyHistogram:
+        """Гистограмма задержек (создается при первом обращении)."""
+        key = self._key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = LatencyHistogram()
+
+        return histogram
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Учесть задержку в гистограмме."""
+        self.histogram(name, **labels).observe(seconds)
+
+    def gauge(self, name: str, getter: Callable[[], float]) -> None:
+        """Зарегистрировать показатель, вычисляемый в момент выдачи метрик."""
+        self._gauges[name] = getter
+
+    def size(self, component: str, getter: Callable[[], float]) -> None:
+        """
+        Зарегистрировать размер внутренней структуры (кэш, очередь, буфер).
+
+        Размер выдается как показатель internal_size{component=...} и в sizes(),
+        чтобы рост памяти можно было сверить с заполнением кэшей и очередей.
+        """
+        self._sizes[component] = getter
+        self.gauge(f'internal_size{{component="{component}"}}', getter)
+
+    def sizes(self) -> dict[str, float]:
+        """Текущие размеры всех зарегистрированных структур."""
+        result: dict[str, float] = {}
+        for component, getter in sorted(self._sizes.items()):
+            try:
+                result[component] = getter()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.warning("Не удалось вычислить размер %s: %s", component, e)
+
+        return result
+
+    def series(self) -> int:
+        """Количество счетчиков и гистограмм в реестре."""
+        return len(self._counters) + len(self._histograms)
+
+    def reset(self) -> None:
+        """Сбросить счетчики и гистограммы (показатели остаются)."""
+        self._counters.clear()
+        self._histograms.clear()
+
+    def render(self) -> str:
+        """Выдать все метрики в текстовом формате Prometheus."""
+        lines: list[str] = []
+
+        for (name, labels), value in sorted(self._counters.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, bucket_count in zip((*LATENCY_BUCKETS, float("inf")), histogram.buckets):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels((*labels, ('le', le)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for name, getter in sorted(self._gauges.items()):
+            try:
+                lines.append(f"{name} {getter():g}")
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.warning("Не удалось вычислить метрику %s: %s", name, e)
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    """Записать метки в формате Prometheus."""
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+metrics.size("metrics_series", metrics.series)
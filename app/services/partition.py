@@ -0,0 +1,217 @@
+"""Распределение обработки webhook по узлам кластера по консистентному хешу lead_id."""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+from collections.abc import Mapping
+from typing import Any
+
+import httpx
+
+from app.services.admission import AdmissionRejectedError
+from app.services.deadline import Deadline
+from app.services.hash_ring import HashRing
+from app.services.http_pool import get_http_client
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Заголовок пересланного webhook: узел-владелец обрабатывает его сам, не пересылая дальше
+FORWARDED_HEADER = "X-Partition-Forwarded-By"
+
+# Подпись пересылки: HMAC-SHA256 общего секрета кластера над отправителем и телом
+SIGNATURE_HEADER = "X-Partition-Signature"
+
+
+class PartitionRouter:
+    """
+    Маршрутизация webhook на узел-владельца сделки.
+
+    Webhook может прийти на любой узел; если сделка принадлежит другому
+    узлу (консистентный хеш lead_id), тело пересылается ему как есть.
+    Так кэш сделок, склейка событий и очередь сделки живут на одном узле.
+
+    Состав кластера - список CLUSTER_NODES; в кольце узлы, готовые принимать
+    трафик (опрос /ready): узел, который запускается или уже останавливается
+    по SIGTERM, выходит из кольца, и его сделки переходят остальным. Внешний
+    брокер не нужен: узлы общаются тем же HTTP, что и amoCRM с сервисом.
+
+    Пересланный webhook подписывается общим секретом кластера (CLUSTER_SECRET):
+    без верной подписи заголовок пересылки игнорируется, иначе любой внешний
+    клиент мог бы обойти маршрутизацию и запись webhook. Без секрета
+    распределение выключено.
+    """
+
+    def __init__(
+        self, self_url: str, nodes: list[str], vnodes: int, heartbeat: float, forward_timeout: float, secret: str
+    ) -> None:
+        """
+        Args:
+            self_url: Базовый URL этого узла (как его видят остальные)
+            nodes: Базовые URL всех узлов кластера
+            vnodes: Количество виртуальных узлов на узел
+            heartbeat: Интервал проверки готовности узлов (в секундах)
+            forward_timeout: Таймаут пересылки webhook владельцу (в секундах)
+            secret: Общий секрет кластера для подписи пересылаемых webhook
+        """
+        self.self_url = self_url.rstrip("/")
+        self.peers = sorted({node.strip().rstrip("/") for node in nodes} - {self.self_url})
+        self.heartbeat = heartbeat
+        self.forward_timeout = forward_timeout
+        self.secret = secret
+        self.ring = HashRing([self.self_url, *self.peers], vnodes=vnodes)
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """Включено ли распределение (задан адрес узла, секрет кластера и есть другие узлы)."""
+        return bool(self.self_url and self.peers and self.secret)
+
+    def _signature(self, sender: str, raw_body: bytes) -> str:
+        """Подпись пересылки webhook от узла sender."""
+        return hmac.new(self.secret.encode(), sender.encode() + b"\n" + raw_body, hashlib.sha256).hexdigest()
+
+    def is_forwarded(self, headers: Mapping[str, str], raw_body: bytes) -> bool:
+        """
+        Переслан ли webhook другим узлом кластера (заголовок пересылки с верной подписью).
+
+        Args:
+            headers: Заголовки запроса
+            raw_body: Сырое тело webhook
+
+        Returns:
+            bool: True если пересылку подписал узел с тем же секретом кластера
+        """
+        sender = headers.get(FORWARDED_HEADER)
+        if sender is None:
+            return False
+
+        signature = headers.get(SIGNATURE_HEADER, "")
+        if not self.secret or not hmac.compare_digest(signature, self._signature(sender, raw_body)):
+            logger.warning("Заголовок %s без верной подписи от %s проигнорирован", FORWARDED_HEADER, sender)
+            return False
+
+        return True
+
+    def owner(self, lead_id: int) -> str:
+        """Узел-владелец сделки."""
+        return self.ring.owner(lead_id) or self.self_url
+
+    def is_local(self, lead_id: int) -> bool:
+        """Принадлежит ли сделка этому узлу."""
+        return not self.enabled or self.owner(lead_id) == self.self_url
+
+    async def forward(
+        self, raw_body: bytes, lead_id: int, deadline: Deadline | None = None, path: str = "/amo/webhook/handle"
+    ) -> dict[str, Any] | None:
+        """
+        Переслать webhook узлу-владельцу сделки.
+
+        Args:
+            raw_body: Сырое тело webhook
+            lead_id: ID сделки
+            deadline: Бюджет времени webhook
+            path: Путь webhook (у дополнительных аккаунтов свой)
+
+        Returns:
+            dict | None: Ответ владельца или None, если webhook надо обработать здесь
+                (сделка своя или соединение с владельцем не установлено)
+
+        Raises:
+            AdmissionRejectedError: Если владелец перегружен или ответ от него не получен (503):
+                владелец мог уже начать обработку, поэтому локально webhook не обрабатывается
+            DeadlineExceededError: Если бюджет времени уже исчерпан
+        """
+        owner = self.owner(lead_id)
+        if owner == self.self_url:
+            return None
+
+        try:
+            response = await get_http_client(owner).post(
+                f"{owner}{path}",
+                content=raw_body,
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    FORWARDED_HEADER: self.self_url,
+                    SIGNATURE_HEADER: self._signature(self.self_url, raw_body),
+                },
+                timeout=deadline.timeout(self.forward_timeout) if deadline is not None else self.forward_timeout,
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # Запрос не дошел до владельца - обработать здесь безопасно
+            logger.warning("Узел %s недоступен, обрабатываем сделку %s здесь: %s", owner, lead_id, e)
+            return None
+        except httpx.HTTPError as e:
+            logger.warning("Нет ответа от узла %s по сделке %s, amoCRM повторит webhook: %s", owner, lead_id, e)
+            raise AdmissionRejectedError("owner_unavailable", settings.WEBHOOK_RETRY_AFTER_SECONDS) from e
+
+        if response.status_code == 503:
+            retry_after = int(response.headers.get("Retry-After", settings.WEBHOOK_RETRY_AFTER_SECONDS))
+            raise AdmissionRejectedError("owner_overloaded", retry_after)
+
+        if response.status_code != 200:
+            logger.warning("Узел %s ответил %s по сделке %s, amoCRM повторит webhook", owner, response.status_code, lead_id)
+            raise AdmissionRejectedError("owner_failed", settings.WEBHOOK_RETRY_AFTER_SECONDS)
+
+        logger.info("Webhook сделки %s обработан узлом %s", lead_id, owner)
+        result: dict[str, Any] = response.json()
+        return result
+
+    async def check_members(self) -> None:
+        """Опросить /ready узлов и перестроить кольцо по готовым (/health остается 200 и при остановке)."""
+
+        async def is_alive(peer: str) -> bool:
+            try:
+                response = await get_http_client(peer).get(f"{peer}/ready", timeout=min(self.heartbeat, 2.0))
+                return response.status_code == 200
+            except httpx.HTTPError:
+                return False
+
+        alive = await asyncio.gather(*(is_alive(peer) for peer in self.peers))
+        members = [self.self_url, *(peer for peer, ok in zip(self.peers, alive) if ok)]
+
+        if self.ring.set_nodes(members):
+            logger.warning("Состав кластера изменился: %s", self.ring.nodes)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Состояние кластера для просмотра."""
+        return {"self": self.self_url, "enabled": self.enabled, "members": self.ring.nodes, "peers": self.peers}
+
+    def start(self) -> None:
+        """Запустить проверку готовности узлов, если распределение включено."""
+        if self.self_url and self.peers and not self.secret:
+            logger.error("CLUSTER_NODES задан, но не задан CLUSTER_SECRET: распределение по узлам выключено")
+
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self) -> None:
+        """Остановить проверку готовности узлов."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_periodically(self) -> None:
+        """Проверять готовность узлов раз в heartbeat секунд."""
+        while True:
+            try:
+                await self.check_members()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception("Ошибка проверки состава кластера: %s", e)
+
+            await asyncio.sleep(self.heartbeat)
+
+
+partition_router = PartitionRouter(
+    self_url=settings.CLUSTER_SELF_URL,
+    nodes=[node for node in settings.CLUSTER_NODES.split(",") if node.strip()],
+    vnodes=settings.CLUSTER_VNODES,
+    heartbeat=settings.CLUSTER_HEARTBEAT_SECONDS,
+    forward_timeout=settings.CLUSTER_FORWARD_TIMEOUT_SECONDS,
+    secret=settings.CLUSTER_SECRET,
+)
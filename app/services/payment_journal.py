@@ -0,0 +1,297 @@
+"""Журнал исходов обработки webhook (SQLite, только добавление) с поиском по платежам."""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from app.models.payment import PaymentEvent
+from app.services.metrics import metrics
+from app.services.tenants import current_tenant
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payment_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    reason TEXT,
+    catalog_element_id INTEGER,
+    lead_id INTEGER,
+    email TEXT,
+    amount INTEGER,
+    order_id TEXT,
+    error TEXT,
+    tenant TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_journal_element ON payment_journal (catalog_element_id, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_journal_lead ON payment_journal (lead_id, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_journal_email ON payment_journal (email, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_journal_time ON payment_journal (recorded_at);
+"""
+
+# Старые записи удаляются не чаще раза в час: запрос по индексу времени, но пачки пишутся раз в секунду
+_PRUNE_INTERVAL = 3600.0
+
+_COLUMNS = (
+    "recorded_at",
+    "outcome",
+    "reason",
+    "catalog_element_id",
+    "lead_id",
+    "email",
+    "amount",
+    "order_id",
+    "error",
+    "tenant",
+)
+
+
+class PaymentJournal:
+    """
+    Журнал исходов webhook: проигнорирован (с причиной), доставлен (с order_id платформы) или ошибка.
+
+    Запись не блокирует обработку: строки копятся в памяти и пишутся в SQLite
+    пачками в отдельном потоке. Индексы по catalog_element_id, lead_id, email
+    и времени позволяют отвечать на запросы о платеже за миллисекунды.
+    Записи старше retention удаляются при записи, не чаще раза в _PRUNE_INTERVAL.
+    """
+
+    def __init__(self, path: Path, batch_size: int, flush_interval: float, max_buffer: int, retention: float = 0) -> None:
+        """
+        Args:
+            path: Путь к файлу SQLite
+            batch_size: Размер пачки, при котором запись начинается сразу
+            flush_interval: Максимальная задержка записи (в секундах)
+            max_buffer: Максимум строк в памяти; при переполнении старые строки отбрасываются
+            retention: Срок хранения записей (в секундах, 0 - хранить всегда)
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention = retention
+        self._buffer: list[tuple[Any, ...]] = []
+        self._dropped = 0
+        self._pruned_at = 0.0
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def buffered(self) -> int:
+        """Количество строк, ожидающих записи."""
+        return len(self._buffer)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и создать таблицу при первом обращении."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            # Журналы, созданные до появления дополнительных аккаунтов
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(payment_journal)")}
+            if "tenant" not in columns:
+                connection.execute("ALTER TABLE payment_journal ADD COLUMN tenant TEXT")
+            self._connection = connection
+
+        return self._connection
+
+    def record(
+        self,
+        outcome: str,
+        reason: str | None = None,
+        event: PaymentEvent | None = None,
+        catalog_element_id: int | None = None,
+        lead_id: int | None = None,
+        email: str | None = None,
+        order_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        """
+        Добавить исход webhook в журнал (запись на диск - в фоне).
+
+        Аккаунт amoCRM берется из контекста обработки (None - основной).
+
+        Args:
+            outcome: Исход: "ignored", "accepted", "success" или "failed"
+            reason: Причина (например, "not_paid" или "coalesced")
+            event: Платеж, если webhook дошел до извлечения данных
+            catalog_element_id: ID элемента каталога, если платежа нет
+            lead_id: ID сделки, если платежа нет
+            email: Email клиента
+            order_id: ID заказа на платформе
+            error: Текст ошибки
+        """
+        self._buffer.append(
+            (
+                time.time(),
+                outcome,
+                reason,
+                event.catalog_element_id if event is not None else catalog_element_id,
+                event.lead_id if event is not None else lead_id,
+                email,
+                event.amount if event is not None else None,
+                order_id,
+                error,
+                current_tenant(),
+            )
+        )
+
+        if len(self._buffer) > self.max_buffer:
+            overflow = len(self._buffer) - self.max_buffer
+            del self._buffer[:overflow]
+            self._dropped += overflow
+            logger.warning("Журнал платежей не успевает писать, отброшено строк: %s", self._dropped)
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _write(self, rows: list[tuple[Any, ...]]) -> None:
+        """Записать пачку строк (в отдельном потоке)."""
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                f"INSERT INTO payment_journal ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows
+            )
+            self._prune(connection)
+            connection.commit()
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Удалить записи старше retention (под блокировкой, вместе с записью пачки)."""
+        now = time.time()
+        if self.retention <= 0 or now - self._pruned_at < _PRUNE_INTERVAL:
+            return
+
+        deleted = connection.execute("DELETE FROM payment_journal WHERE recorded_at < ?", (now - self.retention,)).rowcount
+        self._pruned_at = now
+        if deleted:
+            logger.info("Из журнала платежей удалено устаревших записей: %s", deleted)
+
+    async def flush(self) -> None:
+        """Записать все накопленные строки."""
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except sqlite3.Error as e:
+            logger.error("Не удалось записать %s строк журнала платежей: %s", len(rows), e)
+
+    def _query(self, sql: str, params: tuple[Any, ...]) -> list[dict[str, Any]]:
+        """Выполнить запрос чтения (в отдельном потоке)."""
+        with self._lock:
+            return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    async def by_catalog_element(self, catalog_element_id: int) -> list[dict[str, Any]]:
+        """
+        История обработки счета текущего аккаунта, от новых записей к старым.
+
+        Args:
+            catalog_element_id: ID элемента каталога
+
+        Returns:
+            list[dict]: Записи журнала
+        """
+        await self.flush()
+        return await asyncio.to_thread(
+            self._query,
+            "SELECT * FROM payment_journal WHERE catalog_element_id = ? AND tenant IS ? ORDER BY recorded_at DESC, id DESC",
+            (catalog_element_id, current_tenant()),
+        )
+
+    async def search(
+        self,
+        since: float,
+        until: float,
+        lead_id: int | None = None,
+        email: str | None = None,
+        outcome: str | None = None,
+        tenant: str | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """
+        Записи журнала за интервал времени, от новых к старым.
+
+        Args:
+            since: Начало интервала (unix time)
+            until: Конец интервала (unix time)
+            lead_id: Только эта сделка
+            email: Только этот email клиента
+            outcome: Только этот исход
+            tenant: Только этот аккаунт amoCRM
+            limit: Максимум записей
+
+        Returns:
+            list[dict]: Записи журнала
+        """
+        conditions = ["recorded_at >= ?", "recorded_at < ?"]
+        params: list[Any] = [since, until]
+        for column, value in (("lead_id", lead_id), ("email", email), ("outcome", outcome), ("tenant", tenant)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+
+        await self.flush()
+        return await asyncio.to_thread(
+            self._query,
+            f"SELECT * FROM payment_journal WHERE {' AND '.join(conditions)} ORDER BY recorded_at DESC, id DESC LIMIT ?",
+            (*params, limit),
+        )
+
+    def start(self) -> None:
+        """Запустить фоновую запись журнала."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновую запись и дописать накопленные строки."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+        await self.flush()
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    async def _run(self) -> None:
+        """Писать накопленные строки пачками: по заполнении пачки или раз в flush_interval."""
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+
+payment_journal = PaymentJournal(
+    path=Path(settings.DATA_DIR) / "payment_journal.sqlite3",
+    batch_size=settings.JOURNAL_BATCH_SIZE,
+    flush_interval=settings.JOURNAL_FLUSH_INTERVAL_SECONDS,
+    max_buffer=settings.JOURNAL_MAX_BUFFER,
+    retention=settings.JOURNAL_RETENTION_DAYS * 86400,
+)
+
+metrics.size("payment_journal_buffer", lambda: payment_journal.buffered)
@@ -4,6 +4,7 @@ import hashlib
 import hmac
 import json
 import logging
+import time
 
 import httpx
 from tenacity import (
@@ -14,6 +15,11 @@ from tenacity import (
 )
 
 from app.models.platform import PlatformPayload
+from app.services.adaptive_timeout import adaptive_timeouts
+from app.services.concurrency_limiter import get_concurrency_limiter
+from app.services.deadline import Deadline, DeadlineExceededError
+from app.services.http_pool import get_http_client
+from app.services.shutdown import shutdown_coordinator
 from app.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -27,18 +33,25 @@ class PlatformClient:
         self.platform_url = settings.PLATFORM_URL
         self.secret_key = settings.API_SECRET_KEY
 
-    async def send_payment(self, payload: PlatformPayload) -> dict[str, str]:
+    async def send_payment(self, payload: PlatformPayload, deadline: Deadline | None = None) -> dict[str, str]:
         """
         Отправить данные об оплате на платформу.
 
+        Отправка на платформу не идемпотентна: deadline проверяется только
+        перед отправкой. Начатая отправка не прерывается по deadline и не
+        откладывается в очередь повтора - иначе медленный, но успешный POST
+        был бы отправлен второй раз.
+
         Args:
             payload: Данные для отправки
+            deadline: Бюджет времени, в который отправка должна начаться
 
         Returns:
             dict: Ответ от платформы {"status": "success", "order_id": "..."}
 
         Raises:
             httpx.HTTPError: При ошибке отправки
+            DeadlineExceededError: Если deadline истек до начала отправки
         """
         logger.info("Отправка данных на платформу: %s", self.platform_url)
 
@@ -58,6 +71,13 @@ class PlatformClient:
         logger.debug("Request body: %s", body_str)
         logger.debug("Signature: %s", signature)
 
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceededError("Platform POST: deadline истек до отправки")
+
+        return await self._post_with_retry(endpoint, headers, body_str)
+
+    async def _post_with_retry(self, endpoint: str, headers: dict[str, str], body_str: str) -> dict[str, str]:
+        """Отправить POST с повторами при ошибках сети и HTTP-статусах ошибок (без ограничения deadline)."""
         async for attempt in AsyncRetrying(
             stop=stop_after_attempt(settings.MAX_RETRY_ATTEMPTS),
             wait=wait_exponential(multiplier=1, min=1, max=10),
@@ -65,12 +85,22 @@ class PlatformClient:
         ):
             with attempt:
                 try:
-                    async with httpx.AsyncClient(timeout=30.0) as client:
-                        response = await client.post(
-                            endpoint,
-                            headers=headers,
-                            content=body_str,
-                        )
+                    async with get_concurrency_limiter("platform").permit():
+                        client = get_http_client(self.platform_url)
+                        # С этого момента платеж мог дойти до платформы: при остановке его нельзя повторять
+                        shutdown_coordinator.mark_sending()
+                        started = time.monotonic()
+                        try:
+                            response = await client.post(
+                                endpoint,
+                                headers=headers,
+                                content=body_str,
+                                timeout=adaptive_timeouts.timeout("platform_post"),
+                            )
+                        except httpx.TimeoutException:
+                            adaptive_timeouts.observe("platform_post", time.monotonic() - started)
+                            raise
+                        adaptive_timeouts.observe("platform_post", time.monotonic() - started)
 
                         if response.status_code == 429:
                             logger.warning("Platform rate limit exceeded, retrying...")
@@ -78,10 +108,10 @@ class PlatformClient:
 
                         response.raise_for_status()
 
-                        logger.info("Platform response: %s", response.status_code)
-                        logger.debug("Response body: %s", response.text)
+                    logger.info("Platform response: %s", response.status_code)
+                    logger.debug("Response body: %s", response.text)
 
-                        return response.json() if response.text else {"status": "success"}
+                    return response.json() if response.text else {"status": "success"}
 
                 except httpx.HTTPError as e:
                     logger.error("Platform API error: %s", e)
@@ -0,0 +1,103 @@
+"""Фоновая предзагрузка сделки и контакта при создании неоплаченного счета."""
+
+import asyncio
+import logging
+from collections.abc import Hashable
+
+from app.services.amocrm_client import AmoCRMClient
+from app.services.lead_cache import LeadCache, lead_cache
+from app.services.metrics import metrics
+from app.services.tenants import scoped
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LeadPrefetcher:
+    """
+    Предзагрузка сделок в кэш, пока счет еще не оплачен.
+
+    Почти каждый созданный счет потом оплачивают; если к этому моменту
+    сделка и контакт уже в кэше, webhook об оплате не ходит в amoCRM.
+    Запросы идут с низким приоритетом и не вытесняют обработку оплат.
+
+    Каждый webhook об изменении счета означает, что сделка могла измениться:
+    запись в кэше сбрасывается и загружается заново. Если загрузка уже идет,
+    ее результат мог быть прочитан до изменения - она повторяется.
+    """
+
+    def __init__(self, cache: LeadCache, concurrency: int, max_pending: int) -> None:
+        """
+        Args:
+            cache: Кэш, куда складываются загруженные сделки
+            concurrency: Максимум одновременных предзагрузок
+            max_pending: Максимум запланированных предзагрузок, лишние отбрасываются
+        """
+        self.cache = cache
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[Hashable, asyncio.Task[None]] = {}
+        # Сделки, изменившиеся во время загрузки: результат устарел, загрузка повторяется
+        self._stale: set[Hashable] = set()
+
+    @property
+    def pending_count(self) -> int:
+        """Количество запланированных и выполняющихся предзагрузок."""
+        return len(self._tasks)
+
+    def schedule(self, lead_id: int) -> bool:
+        """
+        Сбросить сделку в кэше и запланировать ее загрузку заново.
+
+        Args:
+            lead_id: ID сделки
+
+        Returns:
+            bool: True если запланирована новая предзагрузка
+        """
+        key = scoped(lead_id)
+        self.cache.discard(key)
+        if key in self._tasks:
+            self._stale.add(key)
+            return False
+
+        if len(self._tasks) >= self.max_pending:
+            logger.debug("Очередь предзагрузки полна, сделка %s пропущена", lead_id)
+            return False
+
+        self._tasks[key] = asyncio.create_task(self._prefetch(key, lead_id))
+        return True
+
+    async def _prefetch(self, key: Hashable, lead_id: int) -> None:
+        """Загрузить сделку с контактом и положить в кэш (в контексте аккаунта, где запланирована)."""
+        try:
+            async with self._semaphore:
+                while True:
+                    self._stale.discard(key)
+                    lead_and_contact = await AmoCRMClient().get_lead_with_contact(lead_id, low_priority=True)
+                    if key not in self._stale:
+                        break
+                    logger.debug("Сделка %s изменилась во время предзагрузки, загружаем заново", lead_id)
+
+                self.cache.put(key, lead_and_contact)
+                logger.info("Сделка %s предзагружена", lead_id)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("Не удалось предзагрузить сделку %s: %s", lead_id, e)
+        finally:
+            self._tasks.pop(key, None)
+            self._stale.discard(key)
+
+    async def stop(self) -> None:
+        """Отменить все незавершенные предзагрузки."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+lead_prefetcher = LeadPrefetcher(
+    cache=lead_cache, concurrency=settings.LEAD_PREFETCH_CONCURRENCY, max_pending=settings.LEAD_PREFETCH_MAX_PENDING
+)
+
+metrics.size("prefetcher_pending", lambda: lead_prefetcher.pending_count)
@@ -0,0 +1,176 @@
+"""Профилирование отдельных webhook по запросу: сэмплы стека в формате для flame graph."""
+
+import asyncio
+import hmac
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile-Token"
+
+
+def _frame_label(frame: FrameType) -> str:
+    """Подпись функции в стеке: имя и файл с номером строки объявления."""
+    code = frame.f_code
+    path = Path(code.co_filename)
+    try:
+        filename = str(path.relative_to(Path.cwd()))
+    except ValueError:
+        filename = "/".join(path.parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame: FrameType | None) -> list[str]:
+    """Стек потока от внешней функции к текущей."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def _await_stack(task: "asyncio.Task[Any]") -> list[str]:
+    """Цепочка await приостановленной задачи от корутины задачи до ожидаемого объекта."""
+    stack = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+
+    stack.append(f"[await {type(awaitable).__name__}]" if awaitable is not None else "[await]")
+    return stack
+
+
+class _Sampler(threading.Thread):
+    """
+    Поток, который раз в interval записывает, где находится задача:
+    стек потока event loop, если задача выполняется, или ее цепочку await,
+    если она ждет ответа внешнего API, очереди или блокировки.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: "asyncio.Task[Any]", interval: float) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.debug("Не удалось снять сэмпл стека: %s", e)
+
+    def _sample(self) -> None:
+        if self.task.done():
+            return
+
+        if asyncio.current_task(self.loop) is self.task:
+            stack = _thread_stack(sys._current_frames().get(self._loop_thread_id))  # pylint: disable=protected-access
+        else:
+            stack = _await_stack(self.task)
+        self.samples[";".join(stack)] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfiler:
+    """
+    Профилировщик выбранных webhook.
+
+    Запрос профилируется, если профилирование взведено на следующие N
+    запросов (arm) или в запросе передан заголовок X-Profile-Token с
+    ADMIN_TOKEN. Отчет - сэмплы стеков в свернутом формате
+    ("f1;f2;f3 count", flamegraph.pl, speedscope) - сохраняется в directory.
+    Пока профилирование не выбрано, запрос проходит без дополнительной работы.
+    """
+
+    def __init__(self, directory: Path, interval: float) -> None:
+        """
+        Args:
+            directory: Каталог отчетов
+            interval: Интервал между сэмплами (в секундах)
+        """
+        self.directory = directory
+        self.interval = interval
+        self._armed = 0
+
+    @property
+    def armed(self) -> int:
+        """Сколько следующих запросов будет профилировано."""
+        return self._armed
+
+    def arm(self, count: int) -> int:
+        """
+        Профилировать следующие count запросов.
+
+        Returns:
+            int: Сколько запросов будет профилировано
+        """
+        self._armed = count
+        return self._armed
+
+    def should_profile(self, headers: Mapping[str, str]) -> bool:
+        """Выбран ли запрос для профилирования (уменьшает счетчик взведенных запросов)."""
+        if self._armed > 0:
+            self._armed -= 1
+            return True
+
+        token = headers.get(PROFILE_HEADER)
+        return token is not None and bool(settings.ADMIN_TOKEN) and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+    @asynccontextmanager
+    async def profile(self, name: str) -> AsyncIterator[None]:
+        """
+        Профилировать текущую задачу до выхода из контекста и сохранить отчет.
+
+        Args:
+            name: Префикс имени файла отчета
+        """
+        task = asyncio.current_task()
+        assert task is not None
+        sampler = _Sampler(asyncio.get_running_loop(), task, self.interval)
+        started = time.monotonic()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            elapsed = time.monotonic() - started
+            try:
+                path = await asyncio.to_thread(self._save, name, sampler.samples, elapsed)
+                logger.info("Профиль запроса (%.0f мс, сэмплов %s): %s", elapsed * 1000, sampler.samples.total(), path)
+            except OSError as e:
+                logger.error("Не удалось сохранить профиль запроса: %s", e)
+
+    def _save(self, name: str, samples: Counter[str], elapsed: float) -> Path:
+        """Записать сэмплы в свернутом формате (в отдельном потоке)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms-{id(samples):x}.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()), encoding="utf-8")
+        return path
+
+
+request_profiler = RequestProfiler(
+    directory=Path(settings.DATA_DIR) / "profiles",
+    interval=settings.PROFILE_SAMPLE_INTERVAL_SECONDS,
+)
@@ -0,0 +1,107 @@
+"""Ограничение частоты запросов к внешним API (token bucket)."""
+
+import asyncio
+import logging
+import time
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket: не больше rate запросов в секунду с допустимым всплеском burst.
+
+    Ожидающие запросы обслуживаются по очереди (FIFO). Фоновые запросы
+    (low_priority) пропускают вперед обычные и не трогают последние
+    low_priority_reserve токенов.
+    """
+
+    def __init__(self, rate: float, burst: int, low_priority_reserve: int = 0) -> None:
+        """
+        Args:
+            rate: Допустимое количество запросов в секунду
+            burst: Максимальный запас токенов (всплеск)
+            low_priority_reserve: Сколько токенов фоновые запросы оставляют обычным
+        """
+        self.rate = rate
+        self.burst = burst
+        self.low_priority_reserve = min(low_priority_reserve, burst - 1)
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+
+    @property
+    def tokens(self) -> float:
+        """Текущий запас токенов."""
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        """Начислить токены за прошедшее время."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, low_priority: bool = False) -> None:
+        """
+        Дождаться токена и списать его.
+
+        Args:
+            low_priority: Фоновый запрос: ждет, пока нет обычных запросов и запас больше резерва
+        """
+        if low_priority:
+            await self._acquire_low_priority()
+            return
+
+        self._waiting += 1
+        try:
+            async with self._lock:
+                self._refill()
+                if self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                    logger.debug("Rate limit: ждем %.3f с", delay)
+                    await asyncio.sleep(delay)
+                    self._refill()
+
+                self._tokens -= 1
+        finally:
+            self._waiting -= 1
+
+    async def _acquire_low_priority(self) -> None:
+        """Списать токен для фонового запроса, не опережая обычные запросы."""
+        while True:
+            if not self._waiting:
+                self._refill()
+                if self._tokens >= 1 + self.low_priority_reserve:
+                    self._tokens -= 1
+                    return
+
+            await asyncio.sleep(1 / self.rate)
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(base_url: str) -> RateLimiter:
+    """
+    Получить общий ограничитель частоты запросов для аккаунта amoCRM.
+
+    Args:
+        base_url: Базовый URL аккаунта amoCRM
+
+    Returns:
+        RateLimiter: Ограничитель, общий для всех клиентов этого аккаунта
+    """
+    limiter = _limiters.get(base_url)
+    if limiter is None:
+        limiter = RateLimiter(
+            rate=settings.AMO_RATE_LIMIT_RPS,
+            burst=settings.AMO_RATE_LIMIT_BURST,
+            low_priority_reserve=settings.AMO_RATE_LIMIT_LOW_PRIORITY_RESERVE,
+        )
+        _limiters[base_url] = limiter
+
+    return limiter
@@ -0,0 +1,199 @@
+"""Проверка готовности сервиса принимать трафик (readiness probe)."""
+
+import asyncio
+import logging
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from app.config.subject_mapping import (
+    get_class_mapping,
+    get_course_name_mapping,
+    get_subject_mapping,
+)
+from app.services.amocrm_client import AmoCRMClient
+from app.services.http_pool import get_http_client
+from app.services.metrics import metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessProbe:
+    """
+    Прогрев соединений и кэшируемая проверка готовности.
+
+    Все проверки выполняются в фоне: при старте и далее раз в
+    READINESS_REFRESH_SECONDS. Endpoint /ready только читает
+    сохраненный результат и ничего не ждет.
+
+    Проверки ограничивают только запуск: после первого успешного прохода
+    сервис остается готовым, а повторные проверки лишь держат соединения
+    теплыми и сообщают состояние amoCRM и платформы (upstream_healthy в
+    /health и метриках). Иначе сбой amoCRM снял бы с балансировки все
+    узлы сразу, и amoCRM отключил бы webhook.
+    """
+
+    def __init__(self) -> None:
+        """Инициализация проверки готовности."""
+        self._ready = False
+        self._withdrawn = False
+        self._healthy: bool | None = None
+        self._checks: dict[str, Any] = {}
+        self._checked_at: float | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Готов ли сервис принимать трафик (прошел проверки при запуске и не останавливается)."""
+        return self._ready
+
+    @property
+    def upstream_healthy(self) -> bool | None:
+        """Прошла ли последняя проверка внешних сервисов (None - проверок еще не было)."""
+        return self._healthy
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Вернуть закэшированный результат последней проверки.
+
+        Returns:
+            dict: {"status": "ready" | "not_ready", "upstream": "ok" | "degraded" | "unknown",
+                "checks": {...}, "checked_at": float | None}
+        """
+        return {
+            "status": "ready" if self._ready else "not_ready",
+            "upstream": self.upstream_status(),
+            "checks": dict(self._checks),
+            "checked_at": self._checked_at,
+        }
+
+    def upstream_status(self) -> str:
+        """Состояние внешних сервисов по последней проверке: "ok", "degraded" или "unknown"."""
+        if self._healthy is None:
+            return "unknown"
+        return "ok" if self._healthy else "degraded"
+
+    async def check(self) -> bool:
+        """
+        Выполнить все проверки и обновить закэшированный результат.
+
+        Первый успешный проход делает сервис готовым; последующие неудачи
+        меняют только состояние внешних сервисов.
+
+        Returns:
+            bool: True если все проверки прошли
+        """
+        checks: dict[str, Any] = {}
+
+        for name, coro in (
+            ("dns", self._resolve_dns()),
+            ("mappings", self._load_mappings()),
+            ("platform", self._warm_platform()),
+            ("amocrm", self._validate_amo_token()),
+        ):
+            try:
+                checks[name] = {"ok": True, **await coro}
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.warning("Readiness check '%s' failed: %s", name, e)
+                checks[name] = {"ok": False, "error": str(e)}
+
+        healthy = all(check["ok"] for check in checks.values())
+
+        if healthy and not self._ready and not self._withdrawn:
+            logger.info("Readiness изменился: ready")
+        elif self._ready and healthy != self._healthy:
+            logger.warning("Состояние внешних сервисов изменилось: %s", "ok" if healthy else "degraded")
+
+        self._checks = checks
+        self._checked_at = time.time()
+        self._healthy = healthy
+        self._ready = not self._withdrawn and (self._ready or healthy)
+
+        return healthy
+
+    def start(self) -> None:
+        """Запустить прогрев и периодическое обновление в фоне."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def withdraw(self) -> None:
+        """Снять сервис с балансировки при остановке (можно вызывать из обработчика сигнала)."""
+        self._withdrawn = True
+        self._ready = False
+
+    async def stop(self) -> None:
+        """Остановить фоновое обновление."""
+        self.withdraw()
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        """Периодически повторять проверки, чтобы результат и соединения оставались свежими."""
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.READINESS_REFRESH_SECONDS)
+
+    async def _resolve_dns(self) -> dict[str, Any]:
+        """Разрешить DNS-имена amoCRM и платформы."""
+        loop = asyncio.get_running_loop()
+        resolved: dict[str, int] = {}
+
+        for url in (settings.AMO_BASE_URL, settings.PLATFORM_URL):
+            parts = urlsplit(url)
+            host = parts.hostname or ""
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            addresses = await loop.getaddrinfo(host, port)
+            resolved[host] = len(addresses)
+
+        return {"resolved": resolved}
+
+    async def _load_mappings(self) -> dict[str, Any]:
+        """Построить таблицы маппинга и убедиться, что они не пустые."""
+        sizes = {
+            "subjects": len(get_subject_mapping()),
+            "classes": len(get_class_mapping()),
+            "courses": len(get_course_name_mapping()),
+        }
+
+        empty = [name for name, size in sizes.items() if not size]
+        if empty:
+            raise ValueError(f"Пустые таблицы маппинга: {', '.join(empty)}")
+
+        return {"sizes": sizes}
+
+    async def _warm_platform(self) -> dict[str, Any]:
+        """Открыть несколько соединений к платформе (любой HTTP-ответ считается успехом)."""
+        client = get_http_client(settings.PLATFORM_URL)
+
+        responses = await asyncio.gather(
+            *(client.head(settings.PLATFORM_URL) for _ in range(settings.READINESS_WARM_CONNECTIONS))
+        )
+
+        return {"warmed": len(responses)}
+
+    async def _validate_amo_token(self) -> dict[str, Any]:
+        """Проверить токен amoCRM одним дешевым запросом и прогреть соединения к amoCRM."""
+        client = get_http_client(settings.AMO_BASE_URL)
+        extra = max(settings.READINESS_WARM_CONNECTIONS - 1, 0)
+
+        account, *_ = await asyncio.gather(
+            AmoCRMClient().get_account(),
+            *(client.head(settings.AMO_BASE_URL) for _ in range(extra)),
+        )
+
+        if not account.get("id"):
+            raise ValueError("amoCRM не вернул данные аккаунта")
+
+        return {"account_id": account["id"], "warmed": extra + 1}
+
+
+readiness_probe = ReadinessProbe()
+
+metrics.gauge("upstream_healthy", lambda: 1.0 if readiness_probe.upstream_healthy else 0.0)
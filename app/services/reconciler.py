@@ -0,0 +1,252 @@
+"""Периодическая сверка оплаченных счетов amoCRM с журналом доставок."""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+from app.models.payment import PaymentEvent
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import DeliveryLog, delivery_log
+from app.services.events_poller import changed_catalog_element_ids
+from app.services.partition import partition_router
+from app.services.retry_queue import retry_queue
+from app.services.retry_store import retry_store
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reconcile_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+"""
+
+_LOCK_NAME = "reconcile"
+
+# Сколько элементов каталога запрашивать одним запросом filter[id][]
+_ELEMENTS_PER_REQUEST = 250
+
+
+class Reconciler:
+    """
+    Сверка: находит оплаченные счета, которых нет в журнале доставок, и доставляет их.
+
+    Каталог целиком не просматривается: измененные после курсора счета
+    берутся из /api/v4/events (amoCRM не фильтрует элементы каталога по
+    updated_at), и запрашиваются только они. Первый запуск только запоминает
+    курсор: сверка начинается с момента развертывания, более ранние оплаты
+    доставляет CLI backfill.
+
+    Недавно измененные счета (моложе окна склейки, webhook и фоновых
+    повторов) пропускаются до следующего запуска: их еще может обрабатывать
+    основной путь. Повторную доставку при гонке дополнительно исключает
+    проверка журнала под очередью сделки в process_payment_event. Счет,
+    который не удалось доставить, уходит в RetryStore и очередь повтора, а
+    курсор идет дальше: один постоянно падающий счет не останавливает сверку.
+
+    Журнал доставок локальный, поэтому в кластере узел сверяет только
+    сделки, которыми владеет сейчас (их webhook пересылаются ему). Окно
+    сверки не сокращается при изменении состава кластера: именно во время
+    перезапуска узла webhook чаще всего и теряются. Аренда (lease) с TTL в SQLite рядом с курсором
+    исключает одновременную сверку процессами одного узла (общий DATA_DIR).
+    """
+
+    def __init__(self, state_path: Path, deliveries: DeliveryLog) -> None:
+        """
+        Args:
+            state_path: Путь к SQLite с курсором и блокировкой
+            deliveries: Журнал доставленных платежей
+        """
+        self.state_path = state_path
+        self.deliveries = deliveries
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._task: asyncio.Task[None] | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение с базой состояния сверки."""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.state_path, timeout=5.0, isolation_level=None)
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def acquire_lock(self, ttl: float) -> bool:
+        """
+        Взять аренду на сверку, если ее никто не держит или она истекла.
+
+        Args:
+            ttl: Срок аренды (в секундах)
+
+        Returns:
+            bool: True если аренда получена
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT owner, expires_at FROM locks WHERE name = ?", (_LOCK_NAME,)).fetchone()
+            now = time.time()
+
+            if row is not None and row[0] != self.owner and row[1] > now:
+                connection.execute("ROLLBACK")
+                logger.info("Сверку уже выполняет %s", row[0])
+                return False
+
+            connection.execute(
+                "INSERT OR REPLACE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)",
+                (_LOCK_NAME, self.owner, now + ttl),
+            )
+            connection.execute("COMMIT")
+            return True
+        finally:
+            connection.close()
+
+    def release_lock(self) -> None:
+        """Отпустить аренду, если она принадлежит этому процессу."""
+        connection = self._connect()
+        try:
+            connection.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (_LOCK_NAME, self.owner))
+        finally:
+            connection.close()
+
+    def _load_state(self) -> dict[str, int]:
+        """Загрузить курсор updated_at."""
+        connection = self._connect()
+        try:
+            return dict(connection.execute("SELECT key, value FROM reconcile_state").fetchall())
+        finally:
+            connection.close()
+
+    def _save_state(self, state: dict[str, int]) -> None:
+        """Сохранить курсор updated_at."""
+        connection = self._connect()
+        try:
+            connection.executemany("INSERT OR REPLACE INTO reconcile_state VALUES (?, ?)", state.items())
+        finally:
+            connection.close()
+
+    async def run_once(self) -> dict[str, int] | None:
+        """
+        Выполнить одну сверку.
+
+        Returns:
+            dict | None: Статистика (scanned - измененных счетов, candidates, delivered, failed)
+                или None, если сверку выполняет другой процесс
+
+        Raises:
+            ValueError: Если не задан AMO_INVOICES_CATALOG_ID
+        """
+        catalog_id = settings.AMO_INVOICES_CATALOG_ID
+        if catalog_id is None:
+            raise ValueError("Не задан AMO_INVOICES_CATALOG_ID")
+
+        if not await asyncio.to_thread(self.acquire_lock, settings.RECONCILE_LOCK_TTL_SECONDS):
+            return None
+
+        try:
+            return await self._reconcile(catalog_id)
+        finally:
+            await asyncio.to_thread(self.release_lock)
+
+    @staticmethod
+    def _settle_seconds() -> float:
+        """Сколько после изменения счет может обрабатывать основной путь (склейка, webhook, фоновые повторы)."""
+        return (
+            settings.COALESCE_MAX_DELAY_SECONDS
+            + settings.WEBHOOK_DEADLINE_SECONDS
+            + settings.BACKGROUND_RETRY_MAX_ATTEMPTS * (settings.RETRY_DELAY_SECONDS + settings.WEBHOOK_DEADLINE_SECONDS)
+        )
+
+    async def _reconcile(self, catalog_id: int) -> dict[str, int]:
+        """Запросить счета, измененные после курсора, и доставить пропущенные оплаты."""
+        state = await asyncio.to_thread(self._load_state)
+        started_at = int(time.time())
+        stats = {"scanned": 0, "candidates": 0, "delivered": 0, "failed": 0}
+
+        if "cursor_updated_at" not in state:
+            await asyncio.to_thread(self._save_state, {"cursor_updated_at": started_at})
+            logger.info("Первая сверка: курсор установлен на текущий момент, более ранние оплаты - через CLI backfill")
+            return stats
+
+        since = state["cursor_updated_at"] - settings.RECONCILE_OVERLAP_SECONDS
+        until = started_at - int(self._settle_seconds())
+
+        client = AmoCRMClient()
+        processor = CatalogWebhookProcessor()
+        missed: list[PaymentEvent] = []
+
+        changed = sorted(await changed_catalog_element_ids(client, since, until)) if until > since else []
+        for start in range(0, len(changed), _ELEMENTS_PER_REQUEST):
+            params = {"filter[id][]": changed[start : start + _ELEMENTS_PER_REQUEST], "limit": _ELEMENTS_PER_REQUEST}
+            async for elements in client.iterate_pages(f"/api/v4/catalogs/{catalog_id}/elements", "elements", params=params):
+                stats["scanned"] += len(elements)
+
+                # Счет, измененный еще раз после until, сверит следующий запуск
+                settled = {element["id"]: element for element in elements if element.get("updated_at", 0) < until}
+                for element_id in await asyncio.to_thread(self.deliveries.undelivered, settled):
+                    try:
+                        event = processor.extract_payment_event_from_element(settled[element_id])
+                    except ValueError as e:
+                        stats["failed"] += 1
+                        logger.error("Сверка: счет %s не может быть обработан: %s", element_id, e)
+                        continue
+
+                    if event is not None and partition_router.is_local(event.lead_id):
+                        missed.append(event)
+
+        stats["candidates"] = len(missed)
+        if missed:
+            logger.warning("Сверка нашла недоставленных оплат: %s", len(missed))
+
+        semaphore = asyncio.Semaphore(settings.RECONCILE_CONCURRENCY)
+
+        async def deliver(event: PaymentEvent) -> None:
+            async with semaphore:
+                try:
+                    await processor.process_payment_event(event)
+                    stats["delivered"] += 1
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    stats["failed"] += 1
+                    logger.error("Сверка: счет %s не доставлен, ставим в очередь повтора: %s", event.catalog_element_id, e)
+                    await asyncio.to_thread(retry_store.save, [(event, 0)])
+                    retry_queue.enqueue(event)
+
+        await asyncio.gather(*(deliver(event) for event in missed))
+
+        # Курсор не переходит через еще не проверенные (моложе until) счета
+        await asyncio.to_thread(self._save_state, {"cursor_updated_at": max(until, state["cursor_updated_at"])})
+
+        logger.info("Сверка завершена: %s", stats)
+        return stats
+
+    def start(self) -> None:
+        """Запустить периодическую сверку, если задан RECONCILE_INTERVAL_SECONDS."""
+        if settings.RECONCILE_INTERVAL_SECONDS <= 0 or settings.AMO_INVOICES_CATALOG_ID is None:
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self) -> None:
+        """Остановить периодическую сверку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_periodically(self) -> None:
+        """Запускать сверку раз в RECONCILE_INTERVAL_SECONDS."""
+        while True:
+            await asyncio.sleep(settings.RECONCILE_INTERVAL_SECONDS)
+            try:
+                await self.run_once()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception("Ошибка сверки: %s", e)
+
+
+reconciler = Reconciler(Path(settings.DATA_DIR) / "reconcile.sqlite3", delivery_log)
@@ -0,0 +1,210 @@
+"""Фоновая очередь повторной обработки платежей, не уложившихся в deadline или упавших по сети."""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.models.payment import PaymentEvent
+from app.services.metrics import RecentEvents, metrics
+from app.services.retry_store import RetryStore, retry_store
+from app.services.tenants import tenant_registry
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[PaymentEvent], Awaitable[Any]]
+
+
+class RetryQueue:
+    """
+    Очередь платежей на повторную обработку в фоне.
+
+    Ошибки валидации (ValueError) не повторяются: те же данные дадут ту же
+    ошибку. Сетевые ошибки и исчерпанный deadline повторяются с паузой
+    delay секунд, не больше max_attempts раз.
+
+    Платежи, восстановленные из RetryStore после перезапуска, удаляются из
+    хранилища только когда очередь с ними закончила.
+    """
+
+    def __init__(
+        self, delay: float, max_attempts: int, concurrency: int, handler: EventHandler, store: RetryStore | None = None
+    ) -> None:
+        """
+        Args:
+            delay: Пауза перед повтором после ошибки (в секундах)
+            max_attempts: Максимальное количество попыток обработки в фоне
+            concurrency: Максимум одновременно обрабатываемых платежей
+            handler: Обработчик платежа
+            store: Хранилище платежей, не обработанных к прошлой остановке
+        """
+        self.delay = delay
+        self.max_attempts = max_attempts
+        self._handler = handler
+        self._store = store
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._heap: list[tuple[float, int, int, PaymentEvent]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task[None] | None = None
+        self._running: set[asyncio.Task[None]] = set()
+        self._history = {outcome: RecentEvents() for outcome in ("enqueued", "succeeded", "failed")}
+
+    @property
+    def size(self) -> int:
+        """Количество платежей, ожидающих повтора."""
+        return len(self._heap)
+
+    def recent_counts(self, windows: tuple[int, ...] = (60, 300, 3600)) -> dict[str, dict[str, int]]:
+        """
+        Постановки в очередь и исходы повторов за последние windows секунд.
+
+        Returns:
+            dict: {"enqueued": {"60s": ..., ...}, "succeeded": {...}, "failed": {...}}
+        """
+        return {
+            outcome: {f"{window}s": history.count(window) for window in windows} for outcome, history in self._history.items()
+        }
+
+    def enqueue(self, event: PaymentEvent, attempt: int = 0, delay: float = 0.0) -> None:
+        """
+        Поставить платеж в очередь.
+
+        Args:
+            event: Оплаченный счет
+            attempt: Номер попытки обработки в фоне (с 0)
+            delay: Через сколько секунд обработать
+        """
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), attempt, event))
+        self._history["enqueued"].add()
+        self._wakeup.set()
+        logger.info(
+            "Платеж catalog_element_id=%s, lead_id=%s поставлен в очередь повтора (попытка %s, через %s с)",
+            event.catalog_element_id,
+            event.lead_id,
+            attempt + 1,
+            delay,
+        )
+
+    async def process(self, event: PaymentEvent, attempt: int = 0) -> None:
+        """
+        Обработать платеж, а при временной ошибке запланировать повтор.
+
+        Args:
+            event: Оплаченный счет
+            attempt: Номер попытки обработки в фоне (с 0)
+        """
+        try:
+            await self._handler(event)
+            self._history["succeeded"].add()
+        except ValueError as e:
+            self._history["failed"].add()
+            logger.error("Платеж lead_id=%s не может быть обработан: %s", event.lead_id, e)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if attempt + 1 < self.max_attempts:
+                logger.warning("Ошибка обработки платежа lead_id=%s в фоне: %s", event.lead_id, e)
+                self.enqueue(event, attempt=attempt + 1, delay=self.delay)
+                return
+
+            self._history["failed"].add()
+            logger.exception(
+                "Платеж catalog_element_id=%s, lead_id=%s не обработан после %s попыток: %s",
+                event.catalog_element_id,
+                event.lead_id,
+                attempt + 1,
+                e,
+            )
+
+        await self._forget(event)
+
+    async def _forget(self, event: PaymentEvent) -> None:
+        """Удалить платеж, с которым очередь закончила, из хранилища."""
+        if self._store is None:
+            return
+
+        try:
+            await asyncio.to_thread(self._store.discard, event)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error("Не удалось удалить платеж lead_id=%s из хранилища повторов: %s", event.lead_id, e)
+
+    def take_pending(self) -> list[tuple[PaymentEvent, int]]:
+        """
+        Забрать из очереди все ожидающие платежи (например, чтобы сохранить их при остановке).
+
+        Returns:
+            list: Пары (платеж, номер попытки) в порядке времени обработки
+        """
+        pending, self._heap = sorted(self._heap, key=lambda item: item[:2]), []
+        return [(event, attempt) for _, _, attempt, event in pending]
+
+    def start(self) -> None:
+        """Запустить фоновый обработчик очереди."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновый обработчик и дождаться платежей, которые уже обрабатываются."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+        if self._heap:
+            logger.warning("В очереди повтора осталось платежей: %s", len(self._heap))
+
+    async def _run(self) -> None:
+        """Забирать платежи, время которых наступило, и обрабатывать их с ограничением параллельности."""
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except TimeoutError:
+                    pass
+                continue
+
+            await self._semaphore.acquire()
+            _, _, attempt, event = heapq.heappop(self._heap)
+
+            task = asyncio.create_task(self.process(event, attempt))
+            self._running.add(task)
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task[None]) -> None:
+        """Освободить слот после обработки платежа."""
+        self._running.discard(task)
+        self._semaphore.release()
+
+
+async def _process_event(event: PaymentEvent) -> dict[str, Any]:
+    """Обработать платеж через CatalogWebhookProcessor без ограничения по времени (с настройками его аккаунта)."""
+    with tenant_registry.activate_optional(event.tenant):
+        return await CatalogWebhookProcessor().process_payment_event(event)
+
+
+retry_queue = RetryQueue(
+    delay=settings.RETRY_DELAY_SECONDS,
+    max_attempts=settings.BACKGROUND_RETRY_MAX_ATTEMPTS,
+    concurrency=settings.BACKGROUND_RETRY_CONCURRENCY,
+    handler=_process_event,
+    store=retry_store,
+)
+
+metrics.size("retry_queue", lambda: retry_queue.size)
@@ -0,0 +1,115 @@
+"""Постоянное хранилище платежей, не обработанных к остановке сервиса (SQLite)."""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from app.models.payment import PaymentEvent
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    saved_at REAL NOT NULL,
+    attempt INTEGER NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS pending_payments_event ON pending_payments (event);
+"""
+
+
+class RetryStore:
+    """
+    Платежи, которые сервис не успел обработать до остановки.
+
+    При остановке сюда сохраняются прерванные платежи и содержимое очереди
+    повтора, при запуске они ставятся обратно в очередь повтора. Запись
+    удаляется только после того, как очередь повтора закончила с платежом
+    (доставлен или попытки исчерпаны), поэтому падение сразу после запуска
+    не теряет восстановленные платежи. Один платеж хранится одной записью.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Args:
+            path: Путь к файлу SQLite
+        """
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть соединение и создать таблицу при первом обращении."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+
+        return self._connection
+
+    def save(self, events: Iterable[tuple[PaymentEvent, int]]) -> int:
+        """
+        Сохранить платежи (уже сохраненный платеж не дублируется, у него обновляется номер попытки).
+
+        Args:
+            events: Пары (платеж, номер попытки обработки в фоне)
+
+        Returns:
+            int: Количество сохраненных платежей
+        """
+        now = time.time()
+        rows = [(now, attempt, event.model_dump_json()) for event, attempt in events]
+        if not rows:
+            return 0
+
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT INTO pending_payments (saved_at, attempt, event) VALUES (?, ?, ?)"
+                " ON CONFLICT (event) DO UPDATE SET attempt = excluded.attempt",
+                rows,
+            )
+            connection.commit()
+
+        return len(rows)
+
+    def pending(self) -> list[tuple[PaymentEvent, int]]:
+        """
+        Прочитать сохраненные платежи (они остаются в хранилище до discard).
+
+        Returns:
+            list: Пары (платеж, номер попытки обработки в фоне) в порядке сохранения
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT attempt, event FROM pending_payments ORDER BY id").fetchall()
+
+        return [(PaymentEvent.model_validate_json(event), attempt) for attempt, event in rows]
+
+    def discard(self, event: PaymentEvent) -> None:
+        """
+        Удалить платеж из хранилища, если он там есть.
+
+        Args:
+            event: Платеж, с которым очередь повтора закончила
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM pending_payments WHERE event = ?", (event.model_dump_json(),))
+            connection.commit()
+
+    def close(self) -> None:
+        """Закрыть соединение с базой."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+retry_store = RetryStore(Path(settings.DATA_DIR) / "retry_store.sqlite3")
@@ -0,0 +1,112 @@
+"""Снимок внутреннего состояния процесса для /debug/runtime."""
+
+import asyncio
+import hashlib
+import json
+import os
+import resource
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from app.config.subject_mapping import get_class_mapping, get_course_name_mapping, get_subject_mapping
+from app.services.admission import admission_controller
+from app.services.http_pool import pool_stats
+from app.services.loop_monitor import loop_monitor
+from app.services.metrics import metrics
+from app.services.retry_queue import retry_queue
+
+
+def _rss_bytes() -> int:
+    """Текущий RSS процесса; без /proc - пиковый RSS."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _task_counts() -> dict[str, int]:
+    """Количество задач asyncio по имени корутины."""
+    counts: Counter[str] = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        counts[getattr(coro, "__qualname__", type(coro).__name__)] += 1
+
+    return dict(counts.most_common())
+
+
+def _mapping_info() -> dict[str, Any]:
+    """Версия (хеш содержимого) и размеры таблиц маппинга; таблицы строятся из настроек текущего аккаунта."""
+    tables: dict[str, dict[int, Any]] = {
+        "subjects": get_subject_mapping(),
+        "classes": get_class_mapping(),
+        "courses": get_course_name_mapping(),
+    }
+    content = json.dumps({name: sorted(table.items()) for name, table in tables.items()}, ensure_ascii=False)
+    return {
+        "version": hashlib.blake2b(content.encode("utf-8"), digest_size=6).hexdigest(),
+        "sizes": {name: len(table) for name, table in tables.items()},
+    }
+
+
+class RuntimeStats:
+    """
+    Счетчики процесса и снимок состояния пулов, кэшей и очередей.
+
+    Снимок только читает текущие значения (без блокировок и ожидания),
+    поэтому его частый опрос не замедляет обработку webhook.
+    """
+
+    def __init__(self) -> None:
+        """Инициализация счетчиков."""
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self._webhooks_in_flight = 0
+
+    @property
+    def webhooks_in_flight(self) -> int:
+        """Количество webhook, обрабатываемых сейчас (включая игнорируемые и пересылаемые)."""
+        return self._webhooks_in_flight
+
+    @contextmanager
+    def track_webhook(self) -> Iterator[None]:
+        """Учесть webhook в обработке на время блока."""
+        self._webhooks_in_flight += 1
+        try:
+            yield
+        finally:
+            self._webhooks_in_flight -= 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Текущее состояние процесса.
+
+        Returns:
+            dict: Время работы, RSS, webhook в обработке, задачи, пулы соединений,
+                повторы фоновой очереди за последние окна, таблицы маппинга и размеры структур
+        """
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "uptime_seconds": round(time.monotonic() - self._started, 3),
+            "rss_bytes": _rss_bytes(),
+            "webhooks": {
+                "in_flight": self._webhooks_in_flight,
+                "processing": admission_controller.in_flight,
+                "waiting": admission_controller.waiting,
+            },
+            "tasks": _task_counts(),
+            "http_pools": pool_stats(),
+            "background_retries": retry_queue.recent_counts(),
+            "mappings": _mapping_info(),
+            "sizes": metrics.sizes(),
+            "event_loop_lag_seconds": loop_monitor.last_lag,
+        }
+
+
+runtime_stats = RuntimeStats()
+
+metrics.gauge("webhooks_in_flight", lambda: runtime_stats.webhooks_in_flight)
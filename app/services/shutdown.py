@@ -0,0 +1,180 @@
+"""Остановка сервиса без потери платежей: дообработка, а остаток - в постоянное хранилище."""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from app.models.payment import PaymentEvent
+from app.services.metrics import metrics
+from app.services.retry_store import RetryStore, retry_store
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """
+    Учет обрабатываемых платежей и их дообработка при остановке.
+
+    Каждый платеж обрабатывается внутри track. Остановка начинается по
+    SIGTERM (begin): сервис перестает принимать webhook (draining), и с
+    этого момента отсчитывается единый бюджет grace секунд - на него же
+    настроен timeout_graceful_shutdown uvicorn. Платежи, не завершенные к
+    концу бюджета, прерываются и вместе с очередью повтора сохраняются в
+    RetryStore для обработки после запуска.
+
+    Платеж, начавший отправку на платформу (mark_sending), не прерывается
+    и не сохраняется: отправка не идемпотентна, и повтор после запуска мог
+    бы доставить его второй раз.
+    """
+
+    def __init__(self, grace: float, store: RetryStore) -> None:
+        """
+        Args:
+            grace: Сколько ждать обрабатываемые платежи (в секундах)
+            store: Хранилище платежей, не обработанных к остановке
+        """
+        self.grace = grace
+        self.store = store
+        self._draining = False
+        self._began_at = 0.0
+        self._in_flight: dict[asyncio.Task[Any], PaymentEvent] = {}
+        self._sending: set[asyncio.Task[Any]] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._interrupted: list[tuple[PaymentEvent, int]] = []
+
+    @property
+    def draining(self) -> bool:
+        """Идет ли остановка (новые webhook не принимаются)."""
+        return self._draining
+
+    @property
+    def in_flight(self) -> int:
+        """Количество обрабатываемых платежей."""
+        return len(self._in_flight)
+
+    @contextmanager
+    def track(self, event: PaymentEvent) -> Iterator[None]:
+        """
+        Учитывать платеж как обрабатываемый на время блока.
+
+        Если задачу отменили (остановка сервиса) до начала отправки на
+        платформу, платеж запоминается для сохранения в хранилище.
+
+        Args:
+            event: Обрабатываемый платеж
+        """
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+
+        self._in_flight[task] = event
+        self._idle.clear()
+        try:
+            yield
+        except asyncio.CancelledError:
+            if task in self._sending:
+                logger.error(
+                    "Платеж catalog_element_id=%s, lead_id=%s прерван во время отправки на платформу и не сохраняется: "
+                    "проверьте доставку вручную",
+                    event.catalog_element_id,
+                    event.lead_id,
+                )
+            else:
+                self._interrupted.append((event, 0))
+                logger.warning("Обработка платежа lead_id=%s прервана, он будет сохранен для повтора", event.lead_id)
+            raise
+        finally:
+            self._in_flight.pop(task, None)
+            self._sending.discard(task)
+            if not self._in_flight:
+                self._idle.set()
+
+    def mark_sending(self) -> None:
+        """Отметить, что платеж текущей задачи начал отправку на платформу."""
+        task = asyncio.current_task()
+        if task is not None and task in self._in_flight:
+            self._sending.add(task)
+
+    def begin(self) -> None:
+        """Перестать принимать webhook и начать отсчет бюджета остановки (можно вызывать из обработчика сигнала)."""
+        if not self._draining:
+            self._draining = True
+            self._began_at = time.monotonic()
+            logger.info("Остановка: новые webhook не принимаются, в обработке платежей: %s", len(self._in_flight))
+
+    async def drain(self, *background: Awaitable[Any]) -> int:
+        """
+        Дождаться обработки платежей до конца бюджета остановки и прервать оставшиеся.
+
+        Бюджет - grace секунд от begin, а не от вызова drain: время, которое
+        uvicorn уже потратил на дообработку webhook, в него входит.
+        Платежи, начавшие отправку на платформу, дожидаются до конца.
+
+        Args:
+            background: Остановка фоновых обработчиков (склейка, очередь повтора),
+                которые дообрабатывают свои платежи в том же бюджете времени
+
+        Returns:
+            int: Количество прерванных платежей
+        """
+        self.begin()
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(awaitable) for awaitable in background]
+
+        if tasks:
+            await asyncio.wait(tasks, timeout=self._remaining())
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=self._remaining())
+        except TimeoutError:
+            pass
+
+        interrupted = [task for task in self._in_flight if task not in self._sending]
+        if interrupted:
+            logger.warning("Платежи не обработаны за %s с, прерываем: %s", self.grace, len(interrupted))
+            for task in interrupted:
+                task.cancel()
+            await asyncio.wait(interrupted)
+
+        sending = list(self._in_flight)
+        if sending:
+            logger.warning("Ждем платежи, уже отправляемые на платформу: %s", len(sending))
+            await asyncio.wait(sending)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info("Остановка: платежи дообработаны за %.1f с, прервано: %s", time.monotonic() - started, len(interrupted))
+        return len(interrupted)
+
+    def _remaining(self) -> float:
+        """Остаток бюджета остановки (в секундах)."""
+        return max(0.0, self.grace - (time.monotonic() - self._began_at))
+
+    def save(self, pending: Iterable[tuple[PaymentEvent, int]] = ()) -> int:
+        """
+        Сохранить прерванные платежи и переданные необработанные в хранилище.
+
+        Args:
+            pending: Пары (платеж, номер попытки), например остаток очереди повтора
+
+        Returns:
+            int: Количество сохраненных платежей
+        """
+        events, self._interrupted = [*self._interrupted, *pending], []
+        saved = self.store.save(events)
+        if saved:
+            logger.warning("Сохранено платежей для обработки после запуска: %s", saved)
+
+        return saved
+
+
+shutdown_coordinator = ShutdownCoordinator(grace=settings.SHUTDOWN_GRACE_SECONDS, store=retry_store)
+
+metrics.gauge("payments_in_flight", lambda: shutdown_coordinator.in_flight)
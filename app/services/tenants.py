@@ -0,0 +1,121 @@
+"""Дополнительные аккаунты amoCRM (tenants), обслуживаемые одним процессом."""
+
+import logging
+import re
+from collections.abc import Hashable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+from app.settings import Settings, base_settings, settings, use_settings
+
+logger = logging.getLogger(__name__)
+
+_TENANT_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+_current_tenant: ContextVar[str | None] = ContextVar("current_tenant", default=None)
+
+
+class TenantNotFoundError(LookupError):
+    """Аккаунт не настроен."""
+
+
+def current_tenant() -> str | None:
+    """Аккаунт, webhook которого сейчас обрабатывается (None - основной)."""
+    return _current_tenant.get()
+
+
+def scoped(key: Hashable) -> Hashable:
+    """
+    Ключ кэша или очереди в пространстве текущего аккаунта.
+
+    ID сделок и элементов каталога разных аккаунтов amoCRM могут совпадать;
+    для основного аккаунта ключ не меняется.
+    """
+    tenant = _current_tenant.get()
+    return key if tenant is None else (tenant, key)
+
+
+class TenantRegistry:
+    """
+    Настройки аккаунтов, загружаемые при первом webhook аккаунта.
+
+    Настройки аккаунта - файл <directory>/<tenant>.env с переменными
+    Settings (AMO_BASE_URL, AMO_LONG_LIVE_TOKEN, PLATFORM_URL, ID полей
+    и т.д.); не заданные в файле значения берутся из основных настроек.
+    """
+
+    def __init__(self, directory: Path, base: Settings) -> None:
+        """
+        Args:
+            directory: Каталог файлов настроек аккаунтов
+            base: Основные настройки (значения по умолчанию для аккаунтов)
+        """
+        self.directory = directory
+        self.base = base
+        self._settings: dict[str, Settings] = {}
+
+    @property
+    def loaded(self) -> list[str]:
+        """Аккаунты, настройки которых уже загружены."""
+        return sorted(self._settings)
+
+    def get(self, tenant: str) -> Settings:
+        """
+        Настройки аккаунта (загружаются при первом обращении).
+
+        Args:
+            tenant: Имя аккаунта из URL
+
+        Returns:
+            Settings: Настройки аккаунта
+
+        Raises:
+            TenantNotFoundError: Если имя некорректно или файла настроек нет
+            pydantic.ValidationError: Если файл настроек некорректен
+        """
+        cached = self._settings.get(tenant)
+        if cached is not None:
+            return cached
+
+        path = self.directory / f"{tenant}.env"
+        if not _TENANT_RE.match(tenant) or not path.is_file():
+            raise TenantNotFoundError(tenant)
+
+        overrides = {key.upper(): value for key, value in dotenv_values(path).items() if value is not None}
+        tenant_settings = Settings(**{**self.base.model_dump(), **overrides})
+        self._settings[tenant] = tenant_settings
+        logger.info("Загружены настройки аккаунта %s (%s)", tenant, tenant_settings.AMO_BASE_URL)
+
+        return tenant_settings
+
+    @contextmanager
+    def activate(self, tenant: str) -> Iterator[None]:
+        """
+        Обрабатывать блок (и созданные в нем задачи) в контексте аккаунта.
+
+        Raises:
+            TenantNotFoundError: Если аккаунт не настроен
+        """
+        tenant_settings = self.get(tenant)
+        token = _current_tenant.set(tenant)
+        try:
+            with use_settings(tenant_settings):
+                yield
+        finally:
+            _current_tenant.reset(token)
+
+    @contextmanager
+    def activate_optional(self, tenant: str | None) -> Iterator[None]:
+        """Как activate, но None - основной аккаунт (ничего не меняется)."""
+        if tenant is None:
+            yield
+            return
+
+        with self.activate(tenant):
+            yield
+
+
+tenant_registry = TenantRegistry(Path(settings.TENANTS_DIR), base=base_settings)
@@ -0,0 +1,207 @@
+"""Запись сырых webhook в сжатые сегменты для последующего воспроизведения."""
+
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import re
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote_plus, unquote_plus
+
+from app.services.metrics import metrics
+from app.services.profiling import PROFILE_HEADER
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT_GLOB = "webhooks-*.jsonl.gz"
+
+# Путь webhook основного аккаунта (в записях до появления поля path - всегда он)
+WEBHOOK_PATH = "/amo/webhook/handle"
+
+# Заголовки, которые не пишем: секреты и то, что пересчитывается при отправке
+_SKIPPED_HEADERS = frozenset({"authorization", "cookie", "x-admin-token", PROFILE_HEADER.lower(), "host", "content-length"})
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE_RE = re.compile(r"(?<![\w])(?:\+\d|[78])[\s\-()]*\d{3}[\s\-()]*\d{3}[\s\-]*\d{2}[\s\-]*\d{2}(?!\d)")
+
+
+def redact(raw_body: bytes) -> bytes:
+    """
+    Заменить email и телефоны в значениях form-urlencoded тела.
+
+    Пары без персональных данных остаются байт в байт, поэтому тело
+    по-прежнему проходит быстрый фильтр и парсинг так же, как оригинал.
+
+    Args:
+        raw_body: Сырое тело webhook
+
+    Returns:
+        bytes: Тело с замененными персональными данными
+    """
+    pairs = raw_body.split(b"&")
+    for index, pair in enumerate(pairs):
+        key, separator, value = pair.partition(b"=")
+        if not separator or not value:
+            continue
+
+        text = unquote_plus(value.decode("utf-8", errors="replace"))
+        redacted = _PHONE_RE.sub("[phone]", _EMAIL_RE.sub("[email]", text))
+        if redacted != text:
+            pairs[index] = key + b"=" + quote_plus(redacted).encode("ascii")
+
+    return b"&".join(pairs)
+
+
+@dataclass
+class CapturedRequest:
+    """Записанный webhook."""
+
+    timestamp: float
+    headers: dict[str, str]
+    body: bytes
+    path: str = WEBHOOK_PATH
+
+
+class WebhookCapture:
+    """
+    Запись сырых webhook (тело и заголовки) в ротируемые gzip-сегменты.
+
+    Запросы копятся в памяти и дописываются пачками в отдельном потоке.
+    Сегмент закрывается, когда его размер превышает segment_bytes; при
+    превышении max_bytes на все сегменты удаляются самые старые.
+    """
+
+    def __init__(self, directory: Path, segment_bytes: int, max_bytes: int, flush_interval: float = 1.0) -> None:
+        """
+        Args:
+            directory: Каталог сегментов
+            segment_bytes: Размер сегмента, после которого начинается новый (в байтах, сжатых)
+            max_bytes: Максимальный размер всех сегментов (в байтах)
+            flush_interval: Интервал записи на диск (в секундах)
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._buffer: list[bytes] = []
+        self._segment: Path | None = None
+        self._sequence = 0
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def buffered(self) -> int:
+        """Количество запросов, ожидающих записи."""
+        return len(self._buffer)
+
+    def capture(self, raw_body: bytes, headers: Mapping[str, str], path: str = WEBHOOK_PATH) -> None:
+        """
+        Записать webhook (на диск - в фоне).
+
+        Args:
+            raw_body: Сырое тело запроса
+            headers: Заголовки запроса
+            path: Путь запроса (у дополнительных аккаунтов свой)
+        """
+        record = {
+            "ts": time.time(),
+            "path": path,
+            "headers": {name: value for name, value in headers.items() if name.lower() not in _SKIPPED_HEADERS},
+            "body": base64.b64encode(redact(raw_body)).decode("ascii"),
+        }
+        self._buffer.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def _next_segment(self) -> Path:
+        """Путь нового сегмента; имена сортируются в порядке записи."""
+        self._sequence += 1
+        return self.directory / f"webhooks-{time.strftime('%Y%m%d-%H%M%S')}-{self._sequence:06d}.jsonl.gz"
+
+    def _write(self, lines: list[bytes]) -> None:
+        """Дописать записи в текущий сегмент, ротировать и соблюсти лимит размера (в отдельном потоке)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._segment is None or not self._segment.exists() or self._segment.stat().st_size >= self.segment_bytes:
+            self._segment = self._next_segment()
+
+        # Каждая пачка - отдельный gzip member; gzip.open читает их подряд как один поток
+        with gzip.open(self._segment, "ab") as segment:
+            segment.writelines(lines)
+
+        segments = sorted(self.directory.glob(_SEGMENT_GLOB))
+        total = sum(path.stat().st_size for path in segments)
+        for path in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink()
+            logger.info("Удален старый сегмент записи webhook: %s", path.name)
+
+    async def flush(self) -> None:
+        """Записать все накопленные запросы."""
+        lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            logger.error("Не удалось записать %s webhook в сегмент: %s", len(lines), e)
+
+    def start(self) -> None:
+        """Запустить фоновую запись."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить фоновую запись и дописать накопленные запросы."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+def read_capture(paths: Iterable[Path]) -> Iterator[CapturedRequest]:
+    """
+    Прочитать записанные webhook из сегментов и каталогов с сегментами.
+
+    Args:
+        paths: Файлы сегментов или каталоги (сегменты читаются в порядке имен)
+
+    Yields:
+        CapturedRequest: Записанные запросы
+    """
+    for path in paths:
+        segments = sorted(path.glob(_SEGMENT_GLOB)) if path.is_dir() else [path]
+        for segment in segments:
+            with gzip.open(segment, "rt", encoding="utf-8") as lines:
+                for line in lines:
+                    record: dict[str, Any] = json.loads(line)
+                    yield CapturedRequest(
+                        timestamp=record["ts"],
+                        headers=record["headers"],
+                        body=base64.b64decode(record["body"]),
+                        path=record.get("path", WEBHOOK_PATH),
+                    )
+
+
+webhook_capture = WebhookCapture(
+    directory=Path(settings.DATA_DIR) / "capture",
+    segment_bytes=settings.CAPTURE_SEGMENT_BYTES,
+    max_bytes=settings.CAPTURE_MAX_BYTES,
+)
+
+metrics.size("webhook_capture_buffer", lambda: webhook_capture.buffered)
@@ -1,12 +1,22 @@
 """Процессор для обработки webhook от amoCRM каталога 'Счета/покупки'."""
 
+import asyncio
 import logging
 import re
 from typing import Any
 
+from app.models.payment import PaymentEvent
 from app.services.amocrm_client import AmoCRMClient
+from app.services.deadline import Deadline, DeadlineExceededError
+from app.services.delivery_log import delivery_log
+from app.services.keyed_executor import keyed_executor
+from app.services.lead_cache import lead_cache
 from app.services.mapper import PaymentPayloadMapper
+from app.services.payment_journal import payment_journal
 from app.services.platform_client import PlatformClient
+from app.services.shutdown import shutdown_coordinator
+from app.services.tenants import current_tenant, scoped
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -33,20 +43,68 @@ class CatalogWebhookProcessor:
         Raises:
             ValueError: При ошибках валидации или обработки
         """
+        event_type, ignored = self.classify(parsed_data)
+        if ignored is not None:
+            return ignored
+
+        return await self.process_paid_event(parsed_data, event_type)
+
+    def classify(self, parsed_data: dict[str, list[str]]) -> tuple[str, dict[str, Any] | None]:
+        """
+        Быстро определить, нужно ли обрабатывать webhook (без запросов к amoCRM).
+
+        Args:
+            parsed_data: Распарсенные данные webhook (parse_qs result)
+
+        Returns:
+            tuple: (тип события, результат для игнорируемого webhook или None)
+        """
         # Проверяем тип события
         event_type = self._detect_event_type(parsed_data)
         if not event_type:
             logger.warning("Webhook не является событием каталога")
-            return {"status": "ignored", "reason": "not_catalog_event"}
+            return "", {"status": "ignored", "reason": "not_catalog_event"}
 
         logger.info("Обнаружено событие каталога: %s", event_type)
 
         # Проверяем статус оплаты
         if not self._is_paid(parsed_data, event_type):
             logger.info("Счет не оплачен, пропускаем")
-            return {"status": "ignored", "reason": "not_paid"}
+            return event_type, {"status": "ignored", "reason": "not_paid"}
+
+        return event_type, None
+
+    async def process_paid_event(self, parsed_data: dict[str, list[str]], event_type: str) -> dict[str, Any]:
+        """
+        Обработать webhook об оплаченном счете (после classify).
+
+        Args:
+            parsed_data: Распарсенные данные webhook (parse_qs result)
+            event_type: Тип события ("add" или "update")
+
+        Returns:
+            dict: Результат обработки
+
+        Raises:
+            ValueError: При ошибках валидации или обработки
+        """
+        event = self.extract_payment_event(parsed_data, event_type)
+        return await self.process_payment_event(event)
+
+    def extract_payment_event(self, parsed_data: dict[str, list[str]], event_type: str) -> PaymentEvent:
+        """
+        Извлечь данные оплаченного счета из webhook.
 
-        # Извлекаем данные
+        Args:
+            parsed_data: Распарсенные данные webhook (parse_qs result)
+            event_type: Тип события ("add" или "update")
+
+        Returns:
+            PaymentEvent: Данные для обработки платежа
+
+        Raises:
+            ValueError: Если не удалось извлечь lead_id или позиции счета
+        """
         catalog_element_id = self._extract_catalog_element_id(parsed_data, event_type)
         lead_id = self._extract_lead_id(parsed_data, event_type)
         items = self._extract_items(parsed_data, event_type)
@@ -66,22 +124,168 @@ class CatalogWebhookProcessor:
             amount,
         )
 
-        # Обрабатываем платеж
-        platform_response = await self._process_payment(lead_id=lead_id, items=items, amount=amount)
+        return PaymentEvent(
+            event_type=event_type,
+            catalog_element_id=catalog_element_id,
+            lead_id=lead_id,
+            items=items,
+            amount=amount,
+            tenant=current_tenant(),
+        )
+
+    def extract_payment_event_from_element(self, element: dict[str, Any]) -> PaymentEvent | None:
+        """
+        Извлечь данные оплаченного счета из элемента каталога в формате API amoCRM.
+
+        Используется, когда счет загружен через API (догрузка, сверка), а не пришел webhook.
+
+        Args:
+            element: Элемент каталога 'Счета/покупки' из /api/v4/catalogs/{id}/elements
+
+        Returns:
+            PaymentEvent | None: Данные для обработки платежа или None, если счет не оплачен
+
+        Raises:
+            ValueError: Если счет оплачен, но не удалось извлечь lead_id или позиции счета
+        """
+        fields = {field.get("field_code"): field.get("values", []) for field in element.get("custom_fields_values") or []}
+
+        status = fields.get("BILL_STATUS", [])
+        if not status or status[0].get("enum_id") != settings.AMO_BILL_STATUS_PAID_ENUM:
+            return None
+
+        lead_id = None
+        link = fields.get("LINK_TO_LEAD", [])
+        if link:
+            match = re.search(r"/leads/detail/(\d+)", str(link[0].get("value", "")))
+            lead_id = int(match.group(1)) if match else None
+
+        if not lead_id:
+            raise ValueError(f"Не удалось извлечь lead_id из элемента каталога {element.get('id')}")
+
+        items: list[dict[str, str | int]] = []
+        for value in fields.get("ITEMS", []):
+            item = value.get("value") or {}
+            if item.get("description"):
+                items.append(
+                    {
+                        "description": str(item["description"]),
+                        "unit_price": int(item.get("unit_price") or 0),
+                        "quantity": int(item.get("quantity") or 0),
+                    }
+                )
+
+        if not items:
+            raise ValueError(f"Не удалось извлечь позиции счета из элемента каталога {element.get('id')}")
+
+        price = fields.get("BILL_PRICE", [])
+        amount = int(price[0].get("value") or 0) if price else 0
+
+        return PaymentEvent(
+            event_type="api",
+            catalog_element_id=element.get("id"),
+            lead_id=lead_id,
+            items=items,
+            amount=amount,
+            tenant=current_tenant(),
+        )
+
+    async def process_payment_event(self, event: PaymentEvent, deadline: Deadline | None = None) -> dict[str, Any]:
+        """
+        Обработать оплаченный счет и сформировать результат webhook.
+
+        Args:
+            event: Данные оплаченного счета
+            deadline: Бюджет времени на обработку (None - без ограничения)
+
+        Returns:
+            dict: Результат обработки
+
+        Raises:
+            DeadlineExceededError: Если обработка не уложилась в deadline
+            AdmissionRejectedError: Если переполнена очередь платежей этой сделки
+        """
+        # Платежи одной сделки обрабатываются по очереди, разных сделок - параллельно
+        try:
+            with shutdown_coordinator.track(event):
+                delivered = await keyed_executor.run(
+                    scoped(event.lead_id),
+                    lambda: self._deliver_once(event, deadline),
+                    timeout=deadline.remaining() if deadline is not None else None,
+                )
+        except TimeoutError as e:
+            payment_journal.record("failed", reason="DeadlineExceededError", event=event, error="не дождался очереди сделки")
+            raise DeadlineExceededError(f"Платеж lead_id={event.lead_id} не дождался очереди сделки") from e
+        except Exception as e:
+            payment_journal.record("failed", reason=type(e).__name__, event=event, error=str(e))
+            raise
+
+        if delivered is None:
+            logger.info("Счет %s уже доставлен на платформу, пропускаем", event.catalog_element_id)
+            payment_journal.record("ignored", reason="already_delivered", event=event)
+            return {
+                "status": "ignored",
+                "reason": "already_delivered",
+                "catalog_element_id": str(event.catalog_element_id),
+                "lead_id": str(event.lead_id),
+            }
+
+        platform_response, client_data = delivered
+        payment_journal.record(
+            "success",
+            event=event,
+            email=client_data.get("contact_email"),
+            order_id=platform_response.get("order_id"),
+        )
 
         return {
             "status": "success",
-            "catalog_element_id": str(catalog_element_id),
-            "lead_id": str(lead_id),
+            "catalog_element_id": str(event.catalog_element_id),
+            "lead_id": str(event.lead_id),
             "platform_response": platform_response,
         }
 
+    async def _deliver_once(
+        self, event: PaymentEvent, deadline: Deadline | None
+    ) -> tuple[dict[str, str], dict[str, Any]] | None:
+        """
+        Доставить платеж, если он еще не записан в журнале доставок (под очередью сделки).
+
+        Webhook, фоновый повтор и сверка могут обрабатывать один счет
+        одновременно; проверка и запись журнала внутри очереди сделки
+        исключают повторную отправку на платформу.
+
+        Args:
+            event: Данные оплаченного счета
+            deadline: Бюджет времени на обработку
+
+        Returns:
+            tuple | None: (ответ платформы, данные клиента) или None, если счет уже доставлен
+        """
+        # Сверка (reconciler, events poller) работает только по основному аккаунту
+        element_id = event.catalog_element_id if event.tenant is None else None
+        if element_id is not None and not await asyncio.to_thread(delivery_log.undelivered, [element_id]):
+            return None
+
+        platform_response, client_data = await self._process_payment(
+            lead_id=event.lead_id, items=event.items, amount=event.amount, deadline=deadline
+        )
+
+        if element_id is not None:
+            try:
+                await asyncio.to_thread(delivery_log.record, event, platform_response)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.error("Не удалось записать доставку платежа в журнал: %s", e)
+
+        return platform_response, client_data
+
     async def _process_payment(
         self,
         lead_id: int,
         items: list[dict[str, str | int]],
         amount: int,
-    ) -> dict[str, str]:
+        deadline: Deadline | None = None,
+    ) -> tuple[dict[str, str], dict[str, Any]]:
         """
         Обработать платеж: загрузить данные из amoCRM, смаппить и отправить на платформу.
 
@@ -89,17 +293,21 @@ class CatalogWebhookProcessor:
             lead_id: ID сделки из amoCRM
             items: Позиции счета из webhook
             amount: Общая сумма
+            deadline: Бюджет времени; на amoCRM отводится доля DEADLINE_AMO_SHARE
 
         Returns:
-            dict: Ответ от платформы
+            tuple: (ответ от платформы, данные клиента из amoCRM)
 
         Raises:
             Exception: При ошибке обработки
         """
         logger.info("Начало обработки платежа для lead_id=%s", lead_id)
 
-        # 1. Загружаем данные клиента из amoCRM
-        lead_and_contact = await self.amo_client.get_lead_with_contact(lead_id)
+        # 1. Загружаем данные клиента из amoCRM (если их не предзагрузили при создании счета)
+        lead_and_contact = lead_cache.pop(scoped(lead_id))
+        if lead_and_contact is None:
+            amo_deadline = deadline.stage(settings.DEADLINE_AMO_SHARE) if deadline is not None else None
+            lead_and_contact = await self.amo_client.get_lead_with_contact(lead_id, deadline=amo_deadline)
         client_data = self.amo_client.extract_lead_data(lead_and_contact["lead"], lead_and_contact["contact"])
 
         logger.info("Данные клиента загружены: %s", client_data.get("contact_email"))
@@ -114,11 +322,11 @@ class CatalogWebhookProcessor:
         logger.info("Payload создан для отправки на платформу")
 
         # 3. Отправляем на платформу
-        response = await self.platform_client.send_payment(payload)
+        response = await self.platform_client.send_payment(payload, deadline=deadline)
 
         logger.info("✓ Платеж успешно отправлен на платформу: %s", response)
 
-        return response
+        return response, client_data
 
     def _detect_event_type(self, parsed_data: dict[str, list[str]]) -> str | None:
         """
@@ -145,7 +353,7 @@ class CatalogWebhookProcessor:
             event_type: Тип события ("add" или "update")
 
         Returns:
-            bool: True если статус = "Оплачен" (enum 1371080)
+            bool: True если статус = "Оплачен" (enum AMO_BILL_STATUS_PAID_ENUM)
         """
         for key, values in parsed_data.items():
             if f"catalogs[{event_type}][0][custom_fields]" in key and "[code]" in key:
@@ -162,7 +370,7 @@ class CatalogWebhookProcessor:
                     status_text = status_value[0] if status_value else "N/A"
                     enum_text = enum_value[0] if enum_value else "N/A"
 
-                    if enum_value and enum_value[0] == "1371080":
+                    if enum_value and enum_value[0] == str(settings.AMO_BILL_STATUS_PAID_ENUM):
                         logger.info("✓ Статус счета: %s (enum: %s)", status_text, enum_text)
                         return True
 
@@ -284,4 +492,3 @@ class CatalogWebhookProcessor:
 
         logger.warning("Поле BILL_PRICE не найдено в webhook")
         return 0
-
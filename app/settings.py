@@ -1,4 +1,8 @@
 import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, cast
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -292,6 +296,16 @@ class Settings(BaseSettings):
         description="ID поля 'Какой курс куплен' в сделке",
     )
 
+    AMO_BILL_STATUS_PAID_ENUM: int = Field(
+        default=1371080,
+        description="ID значения 'Оплачен' в поле BILL_STATUS каталога 'Счета/покупки'",
+    )
+
+    AMO_INVOICES_CATALOG_ID: int | None = Field(
+        default=None,
+        description="ID каталога 'Счета/покупки' (нужен для догрузки счетов через API)",
+    )
+
     CREATE_LEAD_IF_NOT_FOUND: bool = Field(
         default=False,
         description="Создавать ли новую сделку, если не найдена существующая",
@@ -312,6 +326,372 @@ class Settings(BaseSettings):
         description="Уровень логирования (DEBUG, INFO, WARNING, ERROR)",
     )
 
+    HTTP_MAX_CONNECTIONS: int = Field(
+        default=20,
+        description="Максимальное количество соединений в пуле к одному внешнему сервису",
+    )
+
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=10,
+        description="Максимальное количество keep-alive соединений в пуле к одному внешнему сервису",
+    )
+
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = Field(
+        default=60.0,
+        description="Время жизни простаивающего keep-alive соединения (в секундах)",
+    )
+
+    READINESS_WARM_CONNECTIONS: int = Field(
+        default=2,
+        description="Сколько соединений к каждому внешнему сервису открыть при прогреве",
+    )
+
+    READINESS_REFRESH_SECONDS: float = Field(
+        default=30.0,
+        description="Интервал фоновой проверки amoCRM и платформы после запуска (в секундах; готовность не снимает)",
+    )
+
+    WEBHOOK_MAX_IN_FLIGHT: int = Field(
+        default=50,
+        description="Максимальное количество одновременно обрабатываемых оплаченных webhook",
+    )
+
+    WEBHOOK_MAX_QUEUE: int = Field(
+        default=100,
+        description="Максимальное количество webhook, ожидающих освобождения слота обработки",
+    )
+
+    WEBHOOK_QUEUE_TIMEOUT_SECONDS: float = Field(
+        default=5.0,
+        description="Сколько webhook может ждать слот обработки, прежде чем получить 503 (в секундах)",
+    )
+
+    WEBHOOK_RETRY_AFTER_SECONDS: int = Field(
+        default=5,
+        description="Значение заголовка Retry-After в ответе 503 при перегрузке (в секундах)",
+    )
+
+    COALESCE_WINDOW_SECONDS: float = Field(
+        default=0.0,
+        description="Окно склейки событий по одному элементу каталога (в секундах), 0 - выключено",
+    )
+
+    COALESCE_MAX_DELAY_SECONDS: float = Field(
+        default=30.0,
+        description="Максимальная задержка обработки серии событий от первого события (в секундах)",
+    )
+
+    COALESCE_MAX_PENDING: int = Field(
+        default=1000,
+        description="Максимум элементов каталога, одновременно ожидающих в окне склейки",
+    )
+
+    BACKGROUND_RETRY_MAX_ATTEMPTS: int = Field(
+        default=5,
+        description="Максимальное количество попыток обработки платежа в фоновой очереди повтора",
+    )
+
+    BACKGROUND_RETRY_CONCURRENCY: int = Field(
+        default=4,
+        description="Максимум платежей, одновременно обрабатываемых фоновой очередью повтора",
+    )
+
+    WEBHOOK_DEADLINE_SECONDS: float = Field(
+        default=20.0,
+        description="Общий бюджет времени на обработку оплаченного webhook (в секундах)",
+    )
+
+    DEADLINE_AMO_SHARE: float = Field(
+        default=0.6,
+        description="Доля бюджета времени на загрузку сделки и контакта из amoCRM",
+    )
+
+    AMO_RATE_LIMIT_RPS: float = Field(
+        default=7.0,
+        description="Допустимое количество запросов к API amoCRM в секунду",
+    )
+
+    AMO_RATE_LIMIT_BURST: int = Field(
+        default=7,
+        description="Допустимый всплеск запросов к API amoCRM сверх среднего темпа",
+    )
+
+    DATA_DIR: str = Field(
+        default="data",
+        description="Каталог для локальных файлов сервиса (чекпоинты, журналы, снимки)",
+    )
+
+    RECONCILE_INTERVAL_SECONDS: float = Field(
+        default=0.0,
+        description="Интервал сверки оплат amoCRM с журналом доставок (в секундах), 0 - выключено",
+    )
+
+    RECONCILE_OVERLAP_SECONDS: int = Field(
+        default=300,
+        description="Перекрытие курсора updated_at между запусками сверки (в секундах)",
+    )
+
+    RECONCILE_CONCURRENCY: int = Field(
+        default=2,
+        description="Максимум счетов, одновременно доставляемых сверкой",
+    )
+
+    RECONCILE_LOCK_TTL_SECONDS: float = Field(
+        default=600.0,
+        description="Срок аренды сверки: по истечении другой процесс может ее перехватить (в секундах)",
+    )
+
+    EVENTS_POLL_ENABLED: bool = Field(
+        default=False,
+        description="Получать изменения счетов опросом /api/v4/events (в дополнение к webhook)",
+    )
+
+    EVENTS_POLL_MIN_INTERVAL_SECONDS: float = Field(
+        default=2.0,
+        description="Минимальный интервал опроса событий amoCRM (в секундах)",
+    )
+
+    EVENTS_POLL_MAX_INTERVAL_SECONDS: float = Field(
+        default=60.0,
+        description="Максимальный интервал опроса событий amoCRM при отсутствии событий (в секундах)",
+    )
+
+    EVENTS_POLL_BATCH_SIZE: int = Field(
+        default=100,
+        description="Размер пачки событий, после которой сохраняется курсор опроса",
+    )
+
+    EVENTS_POLL_WINDOW_SECONDS: int = Field(
+        default=300,
+        description="Окно created_at, события которого читаются и обрабатываются за один проход (в секундах)",
+    )
+
+    EVENTS_POLL_CONCURRENCY: int = Field(
+        default=4,
+        description="Максимум счетов, одновременно обрабатываемых при опросе событий",
+    )
+
+    AMO_RATE_LIMIT_LOW_PRIORITY_RESERVE: int = Field(
+        default=2,
+        description="Сколько токенов rate limit фоновые запросы (предзагрузка) оставляют обработке оплат",
+    )
+
+    LEAD_PREFETCH_ENABLED: bool = Field(
+        default=False,
+        description="Предзагружать сделку и контакт при создании неоплаченного счета",
+    )
+
+    LEAD_PREFETCH_TTL_SECONDS: float = Field(
+        default=900.0,
+        description="Срок жизни предзагруженной сделки в кэше (в секундах)",
+    )
+
+    LEAD_PREFETCH_MAX_ENTRIES: int = Field(
+        default=1000,
+        description="Максимум сделок в кэше предзагрузки",
+    )
+
+    LEAD_PREFETCH_CONCURRENCY: int = Field(
+        default=1,
+        description="Максимум одновременных предзагрузок сделок",
+    )
+
+    LEAD_PREFETCH_MAX_PENDING: int = Field(
+        default=100,
+        description="Максимум запланированных предзагрузок, лишние отбрасываются",
+    )
+
+    AMO_HEDGE_ENABLED: bool = Field(
+        default=False,
+        description="Дублировать GET-запросы к amoCRM, если ответа нет дольше p95",
+    )
+
+    AMO_HEDGE_DELAY_SECONDS: float = Field(
+        default=0.0,
+        description="Через сколько секунд отправлять дубль GET-запроса, 0 - по измеренному p95",
+    )
+
+    AMO_HEDGE_MAX_RATIO: float = Field(
+        default=0.05,
+        description="Максимальная доля продублированных GET-запросов к amoCRM",
+    )
+
+    AMO_HEDGE_BURST: float = Field(
+        default=3.0,
+        description="Сколько дублей можно отправить подряд сверх доли AMO_HEDGE_MAX_RATIO",
+    )
+
+    UPSTREAM_CONCURRENCY_INITIAL: int = Field(
+        default=8,
+        description="Начальный лимит одновременных запросов к каждому внешнему API (amoCRM, платформа)",
+    )
+
+    UPSTREAM_CONCURRENCY_MIN: int = Field(
+        default=1,
+        description="Минимальный адаптивный лимит одновременных запросов к внешнему API",
+    )
+
+    UPSTREAM_CONCURRENCY_MAX: int = Field(
+        default=64,
+        description="Максимальный адаптивный лимит одновременных запросов к внешнему API",
+    )
+
+    UPSTREAM_CONCURRENCY_LATENCY_TOLERANCE: float = Field(
+        default=2.0,
+        description="Во сколько раз задержка может превышать базовую, чтобы лимит продолжал расти",
+    )
+
+    UPSTREAM_CONCURRENCY_BACKOFF: float = Field(
+        default=0.7,
+        description="Множитель лимита одновременных запросов при 429, 5xx или таймауте",
+    )
+
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = Field(
+        default=3.0,
+        description="Таймаут чтения = p99 задержки endpoint × множитель (соединения - p50 × множитель)",
+    )
+
+    ADAPTIVE_TIMEOUT_FLOOR_SECONDS: float = Field(
+        default=2.0,
+        description="Минимальный адаптивный таймаут запроса к внешнему API (в секундах)",
+    )
+
+    ADAPTIVE_TIMEOUT_CEILING_SECONDS: float = Field(
+        default=30.0,
+        description="Максимальный адаптивный таймаут запроса, он же таймаут до накопления статистики (в секундах)",
+    )
+
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = Field(
+        default=50,
+        description="Сколько ответов endpoint нужно, чтобы считать таймаут по задержкам",
+    )
+
+    KEYED_EXECUTOR_WORKERS: int = Field(
+        default=32,
+        description="Максимум платежей разных сделок, обрабатываемых одновременно",
+    )
+
+    KEYED_EXECUTOR_MAX_QUEUE_PER_KEY: int = Field(
+        default=10,
+        description="Максимум платежей одной сделки в очереди, сверх - отказ с Retry-After",
+    )
+
+    CLUSTER_SELF_URL: str = Field(
+        default="",
+        description="Базовый URL этого узла, как его видят другие узлы кластера (пусто - без кластера)",
+    )
+
+    CLUSTER_NODES: str = Field(
+        default="",
+        description="Базовые URL всех узлов кластера через запятую (включая этот)",
+    )
+
+    CLUSTER_SECRET: str = Field(
+        default="",
+        description="Общий секрет узлов кластера для подписи пересылаемых webhook (без него распределение выключено)",
+    )
+
+    CLUSTER_VNODES: int = Field(
+        default=64,
+        description="Количество виртуальных узлов на узел в кольце консистентного хеширования",
+    )
+
+    CLUSTER_HEARTBEAT_SECONDS: float = Field(
+        default=5.0,
+        description="Интервал проверки готовности (/ready) узлов кластера (в секундах)",
+    )
+
+    CLUSTER_FORWARD_TIMEOUT_SECONDS: float = Field(
+        default=15.0,
+        description="Таймаут пересылки webhook узлу-владельцу сделки (в секундах)",
+    )
+
+    JOURNAL_BATCH_SIZE: int = Field(
+        default=100,
+        description="Размер пачки записей журнала платежей, при котором запись на диск начинается сразу",
+    )
+
+    JOURNAL_FLUSH_INTERVAL_SECONDS: float = Field(
+        default=1.0,
+        description="Максимальная задержка записи журнала платежей на диск (в секундах)",
+    )
+
+    JOURNAL_MAX_BUFFER: int = Field(
+        default=10000,
+        description="Максимум записей журнала платежей в памяти до записи на диск",
+    )
+
+    JOURNAL_RETENTION_DAYS: float = Field(
+        default=90,
+        description="Срок хранения записей журнала платежей (в днях, 0 - хранить всегда)",
+    )
+
+    CAPTURE_ENABLED: bool = Field(
+        default=False,
+        description="Записывать сырые webhook (с замаскированными email и телефонами) для воспроизведения",
+    )
+
+    CAPTURE_SEGMENT_BYTES: int = Field(
+        default=8 * 1024 * 1024,
+        description="Размер сжатого сегмента записи webhook, после которого начинается новый (в байтах)",
+    )
+
+    CAPTURE_MAX_BYTES: int = Field(
+        default=512 * 1024 * 1024,
+        description="Максимальный размер всех сегментов записи webhook; старые удаляются (в байтах)",
+    )
+
+    ADMIN_TOKEN: str = Field(
+        default="",
+        description="Токен служебных endpoint (заголовок X-Admin-Token); пустой - endpoint выключены",
+    )
+
+    LOOP_MONITOR_INTERVAL_SECONDS: float = Field(
+        default=0.1,
+        description="Интервал измерения задержки event loop (в секундах), 0 - не измерять",
+    )
+
+    LOOP_LAG_THRESHOLD_SECONDS: float = Field(
+        default=0.25,
+        description="Задержка event loop, после которой в лог пишется стек блокирующего кода (в секундах)",
+    )
+
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = Field(
+        default=0.002,
+        description="Интервал сэмплов стека при профилировании выбранных webhook (в секундах)",
+    )
+
+    MEMORY_TRACE_FRAMES: int = Field(
+        default=1,
+        description="Глубина стека, сохраняемая tracemalloc для каждого выделения памяти",
+    )
+
+    MEMORY_MAX_SNAPSHOTS: int = Field(
+        default=5,
+        description="Сколько именованных снимков памяти хранить",
+    )
+
+    TENANTS_DIR: str = Field(
+        default="tenants",
+        description="Каталог настроек дополнительных аккаунтов amoCRM: <tenant>.env для /amo/<tenant>/webhook/handle",
+    )
+
+    SHUTDOWN_GRACE_SECONDS: float = Field(
+        default=20.0,
+        description=(
+            "Общий бюджет остановки от SIGTERM (дообработка webhook и фоновых платежей); "
+            "не начавшие отправку платежи сохраняются для повтора после запуска"
+        ),
+    )
+
+    CACHE_SNAPSHOT_INTERVAL_SECONDS: float = Field(
+        default=60.0,
+        description=(
+            "Интервал сохранения снимка кэша сделок на диск при LEAD_PREFETCH_ENABLED "
+            "(также сохраняется при остановке, 0 - не сохранять)"
+        ),
+    )
+
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -324,4 +704,41 @@ class Settings(BaseSettings):
         return getattr(logging, self.LOG_LEVEL.upper(), logging.INFO)
 
 
-settings = Settings()  # type: ignore[call-arg]
+_tenant_settings: ContextVar[Settings | None] = ContextVar("tenant_settings", default=None)
+
+
+class _CurrentSettings:
+    """
+    Настройки текущего аккаунта amoCRM (tenant), а вне его запросов - основные.
+
+    Все модули читают настройки через settings, поэтому webhook дополнительного
+    аккаунта обрабатывается тем же кодом с его URL, токенами и ID полей.
+    """
+
+    def __init__(self, default: Settings) -> None:
+        object.__setattr__(self, "_default", default)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_tenant_settings.get() or self._default, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(_tenant_settings.get() or self._default, name, value)
+
+
+@contextmanager
+def use_settings(tenant_settings: Settings) -> Iterator[None]:
+    """
+    Подменить settings внутри блока (и задач, созданных в нем).
+
+    Args:
+        tenant_settings: Настройки аккаунта amoCRM
+    """
+    token = _tenant_settings.set(tenant_settings)
+    try:
+        yield
+    finally:
+        _tenant_settings.reset(token)
+
+
+base_settings = Settings()  # type: ignore[call-arg]
+settings = cast(Settings, _CurrentSettings(base_settings))
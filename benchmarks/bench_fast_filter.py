@@ -0,0 +1,106 @@
+"""
+Бенчмарк быстрого отсева неоплаченных webhook.
+
+Сравнивает fast_reject_reason с полным путем (unquote_plus + parse_qs +
+CatalogWebhookProcessor.classify) на телах в формате amoCRM.
+
+Запуск: poetry run python -m benchmarks.bench_fast_filter
+"""
+
+import logging
+import timeit
+from collections.abc import Callable
+from urllib.parse import parse_qs, unquote_plus, urlencode
+
+from app.services.fast_filter import fast_reject_reason
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+ROUNDS = 5
+NUMBER = 2000
+
+
+def build_body(status_enum: int, items_count: int) -> bytes:
+    """Собрать тело catalogs[update] с items_count позициями счета."""
+    prefix = "catalogs[update][0]"
+    fields: list[tuple[str, str]] = [
+        ("account[subdomain]", "egeland"),
+        ("account[id]", "29000000"),
+        ("account[_links][self]", "https://egeland.amocrm.ru"),
+        (f"{prefix}[id]", "812345"),
+        (f"{prefix}[catalog_id]", "12345"),
+        (f"{prefix}[name]", "Счет №1024 от 12.09.2025"),
+        (f"{prefix}[created_at]", "1757664000"),
+        (f"{prefix}[updated_at]", "1757667600"),
+        (f"{prefix}[created_by]", "9876543"),
+        (f"{prefix}[custom_fields][0][id]", "1001"),
+        (f"{prefix}[custom_fields][0][name]", "Сделка"),
+        (f"{prefix}[custom_fields][0][code]", "LINK_TO_LEAD"),
+        (f"{prefix}[custom_fields][0][values][0][value]", "https://egeland.amocrm.ru/leads/detail/38743359"),
+        (f"{prefix}[custom_fields][1][id]", "1002"),
+        (f"{prefix}[custom_fields][1][name]", "Плательщик"),
+        (f"{prefix}[custom_fields][1][code]", "PAYER"),
+        (f"{prefix}[custom_fields][1][values][0][value][name]", "Иванов Иван Иванович"),
+        (f"{prefix}[custom_fields][1][values][0][value][entity_type]", "contacts"),
+        (f"{prefix}[custom_fields][2][id]", "1003"),
+        (f"{prefix}[custom_fields][2][name]", "Сумма"),
+        (f"{prefix}[custom_fields][2][code]", "BILL_PRICE"),
+        (f"{prefix}[custom_fields][2][values][0][value]", str(6000 * items_count)),
+    ]
+
+    for idx in range(items_count):
+        base = f"{prefix}[custom_fields][3][values][{idx}][value]"
+        fields += [
+            (f"{base}[sku]", f"SKU-{idx}"),
+            (f"{base}[description]", f"Годовой курс подготовки к ЕГЭ, предмет {idx}"),
+            (f"{base}[unit_price]", "6000"),
+            (f"{base}[quantity]", "2"),
+            (f"{base}[unit_type]", "мес"),
+            (f"{base}[discount][type]", "amount"),
+            (f"{base}[discount][value]", "0"),
+            (f"{base}[vat_rate_id]", "0"),
+        ]
+    fields += [
+        (f"{prefix}[custom_fields][3][id]", "1004"),
+        (f"{prefix}[custom_fields][3][name]", "Позиции"),
+        (f"{prefix}[custom_fields][3][code]", "ITEMS"),
+        (f"{prefix}[custom_fields][4][id]", "1005"),
+        (f"{prefix}[custom_fields][4][name]", "Статус"),
+        (f"{prefix}[custom_fields][4][code]", "BILL_STATUS"),
+        (f"{prefix}[custom_fields][4][values][0][value]", "Создан"),
+        (f"{prefix}[custom_fields][4][values][0][enum]", str(status_enum)),
+    ]
+
+    return urlencode(fields).encode("ascii")
+
+
+def full_path(raw_body: bytes) -> None:
+    """Полный путь до решения об игнорировании, как в handle_amo_webhook до изменений."""
+    parsed_data = parse_qs(unquote_plus(raw_body.decode("utf-8", errors="ignore")))
+    CatalogWebhookProcessor().classify(parsed_data)
+
+
+def measure(func: Callable[[bytes], object], raw_body: bytes) -> float:
+    """Лучшее время одного вызова в микросекундах."""
+    timings = timeit.repeat(lambda: func(raw_body), repeat=ROUNDS, number=NUMBER)
+    return min(timings) / NUMBER * 1_000_000
+
+
+def main() -> None:
+    """Прогнать бенчмарк на телах разного размера и вывести таблицу."""
+    logging.disable(logging.CRITICAL)
+    not_paid_enum = settings.AMO_BILL_STATUS_PAID_ENUM + 1
+
+    print(f"{'items':>5} {'bytes':>7} {'full, us':>10} {'fast, us':>10} {'speedup':>8}")
+    for items_count in (1, 3, 10):
+        raw_body = build_body(not_paid_enum, items_count)
+        assert fast_reject_reason(raw_body) == "not_paid"
+
+        full_us = measure(full_path, raw_body)
+        fast_us = measure(fast_reject_reason, raw_body)
+
+        print(f"{items_count:>5} {len(raw_body):>7} {full_us:>10.1f} {fast_us:>10.1f} {full_us / fast_us:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Тесты для таймаутов по наблюдаемым задержкам внешних API."""
+
+import httpx
+import pytest
+from tenacity import RetryError
+
+from app.services import amocrm_client
+from app.services.adaptive_timeout import AdaptiveTimeouts
+from app.services.amocrm_client import AmoCRMClient
+from app.services.deadline import Deadline
+from app.services.metrics import metrics
+
+
+@pytest.fixture
+def timeouts() -> AdaptiveTimeouts:
+    """Таймауты со свежими гистограммами."""
+    metrics.reset()
+    return AdaptiveTimeouts(multiplier=3.0, floor=1.0, ceiling=30.0, min_samples=10)
+
+
+class TestAdaptiveTimeouts:
+    """Тесты для AdaptiveTimeouts."""
+
+    def test_ceiling_until_enough_samples(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что без статистики действует прежний таймаут (ceiling)."""
+        timeouts.observe("amocrm_lead_get", 0.2)
+
+        assert timeouts.compute("amocrm_lead_get") == {"connect": 30.0, "read": 30.0}
+
+    def test_timeouts_follow_latency(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что таймаут чтения - p99 × k, соединения - p50 × k."""
+        for _ in range(99):
+            timeouts.observe("amocrm_lead_get", 0.5)
+        timeouts.observe("amocrm_lead_get", 2.0)
+
+        assert timeouts.compute("amocrm_lead_get") == {"connect": 1.5, "read": 6.0}
+
+    def test_floor_and_ceiling(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что таймауты ограничены снизу и сверху."""
+        for _ in range(20):
+            timeouts.observe("fast", 0.01)
+            timeouts.observe("slow", 50.0)
+
+        assert timeouts.compute("fast") == {"connect": 1.0, "read": 1.0}
+        assert timeouts.compute("slow") == {"connect": 30.0, "read": 30.0}
+
+    def test_endpoints_are_separate(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что статистика ведется отдельно по каждому endpoint."""
+        for _ in range(20):
+            timeouts.observe("amocrm_lead_get", 2.0)
+            timeouts.observe("platform_post", 0.5)
+
+        assert timeouts.compute("amocrm_lead_get")["read"] == 6.0
+        assert timeouts.compute("platform_post")["read"] == 1.5
+
+    def test_deadline_caps_timeout(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что таймаут не превышает оставшийся бюджет времени."""
+        timeout = timeouts.timeout("amocrm_lead_get", Deadline(2.0))
+
+        assert timeout.read is not None and timeout.read <= 2.0
+        assert timeout.connect is not None and timeout.connect <= 2.0
+
+    def test_non_idempotent_read_timeout_is_not_adapted(self) -> None:
+        """Тест что у отправки платежа адаптируется только таймаут соединения."""
+        metrics.reset()
+        timeouts = AdaptiveTimeouts(
+            multiplier=3.0, floor=1.0, ceiling=30.0, min_samples=10, non_idempotent=frozenset({"platform_post"})
+        )
+        for _ in range(20):
+            timeouts.observe("platform_post", 0.5)
+
+        assert timeouts.compute("platform_post") == {"connect": 1.5, "read": 30.0}
+
+    async def test_timeouts_are_observed(self, timeouts: AdaptiveTimeouts, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что запрос, оборвавшийся по таймауту, учитывается в задержках endpoint."""
+        monkeypatch.setattr(amocrm_client, "adaptive_timeouts", timeouts)
+        monkeypatch.setattr(amocrm_client.settings, "MAX_RETRY_ATTEMPTS", 1)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(amocrm_client, "get_http_client", lambda base_url: client)
+
+        with pytest.raises(RetryError):
+            await AmoCRMClient()._make_request("GET", "/api/v4/leads/1")
+
+        assert metrics.histogram("upstream_request_seconds", endpoint="amocrm_lead_get").samples == 1
+        await client.aclose()
+
+    def test_exposed_for_inspection(self, timeouts: AdaptiveTimeouts) -> None:
+        """Тест что рассчитанные таймауты видны в метриках и снимке."""
+        timeouts.observe("platform_post", 0.5)
+
+        assert 'upstream_timeout_seconds{endpoint="platform_post",kind="read"} 30' in metrics.render()
+        assert timeouts.snapshot()["platform_post"]["samples"] == 1
+
+
+class TestEndpointName:
+    """Тесты для AmoCRMClient._endpoint_name."""
+
+    @pytest.mark.parametrize(
+        ("url", "expected"),
+        [
+            ("https://egeland.amocrm.ru/api/v4/leads/123", "amocrm_lead_get"),
+            ("https://egeland.amocrm.ru/api/v4/contacts/456", "amocrm_contact_get"),
+            ("https://egeland.amocrm.ru/api/v4/leads", "amocrm_get"),
+            ("https://egeland.amocrm.ru/api/v4/account", "amocrm_get"),
+        ],
+    )
+    def test_endpoint_name(self, url: str, expected: str) -> None:
+        """Тест определения endpoint по URL запроса."""
+        assert AmoCRMClient()._endpoint_name(url) == expected
@@ -0,0 +1,68 @@
+"""Тесты для ограничения нагрузки на обработку webhook."""
+
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejectedError
+
+
+class TestAdmissionController:
+    """Тесты для AdmissionController."""
+
+    async def test_slot_tracks_in_flight(self) -> None:
+        """Тест что занятый слот учитывается в in_flight и освобождается."""
+        controller = AdmissionController(max_in_flight=2, max_queue=0, queue_timeout=0.1, retry_after=5)
+
+        async with controller.slot():
+            assert controller.in_flight == 1
+
+        assert controller.in_flight == 0
+
+    async def test_rejects_when_queue_full(self) -> None:
+        """Тест что при занятых слотах и полной очереди запрос отклоняется сразу."""
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1.0, retry_after=7)
+
+        async with controller.slot():
+            with pytest.raises(AdmissionRejectedError) as exc_info:
+                async with controller.slot():
+                    pass
+
+        assert exc_info.value.reason == "queue_full"
+        assert exc_info.value.retry_after == 7
+
+    async def test_rejects_on_queue_timeout(self) -> None:
+        """Тест что запрос, не дождавшийся слота, отклоняется по таймауту."""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01, retry_after=5)
+
+        async with controller.slot():
+            with pytest.raises(AdmissionRejectedError) as exc_info:
+                async with controller.slot():
+                    pass
+
+        assert exc_info.value.reason == "queue_timeout"
+        assert controller.waiting == 0
+
+    async def test_waiting_request_gets_released_slot(self) -> None:
+        """Тест что ожидающий запрос получает слот после освобождения."""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1.0, retry_after=5)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with controller.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        async def wait_for_slot() -> int:
+            async with controller.slot():
+                return controller.in_flight
+
+        waiter = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+
+        release.set()
+        assert await waiter == 1
+        await holder
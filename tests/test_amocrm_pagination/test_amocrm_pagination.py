@@ -0,0 +1,85 @@
+"""Тесты для постраничного обхода списков API amoCRM."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.services.amocrm_client import AmoCRMClient
+
+
+def make_pages(count: int) -> dict[str, dict[str, Any]]:
+    """Страницы списка сделок, связанные через _links.next."""
+    pages = {}
+    for page in range(1, count + 1):
+        endpoint = "/api/v4/leads" if page == 1 else f"/api/v4/leads?page={page}&limit=2"
+        links = {"next": {"href": f"https://egeland.amocrm.ru/api/v4/leads?page={page + 1}&limit=2"}} if page < count else {}
+        pages[endpoint] = {"_embedded": {"leads": [{"id": page * 10 + 1}, {"id": page * 10 + 2}]}, "_links": links}
+    return pages
+
+
+class TestIteratePages:
+    """Тесты для AmoCRMClient.iterate_pages и iterate."""
+
+    @pytest.fixture
+    def requests_log(self, monkeypatch: pytest.MonkeyPatch) -> list[str]:
+        """Подменить запросы к amoCRM тремя страницами сделок."""
+        pages = make_pages(3)
+        log: list[str] = []
+
+        async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+            log.append(endpoint)
+            await asyncio.sleep(0)
+            return pages[endpoint]
+
+        monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+        return log
+
+    async def test_follows_next_links(self, requests_log: list[str]) -> None:
+        """Тест что обход проходит все страницы по _links.next."""
+        ids = [lead["id"] async for lead in AmoCRMClient().iterate("/api/v4/leads", "leads", params={"limit": 2})]
+
+        assert ids == [11, 12, 21, 22, 31, 32]
+        assert requests_log == ["/api/v4/leads", "/api/v4/leads?page=2&limit=2", "/api/v4/leads?page=3&limit=2"]
+
+    async def test_next_page_is_prefetched(self, requests_log: list[str]) -> None:
+        """Тест что следующая страница запрашивается до того, как вызывающий код закончит текущую."""
+        pages = AmoCRMClient().iterate_pages("/api/v4/leads", "leads")
+
+        await anext(pages)
+        await asyncio.sleep(0.01)
+
+        assert len(requests_log) == 2
+        await pages.aclose()
+
+    async def test_early_exit_stops_prefetch(self, requests_log: list[str]) -> None:
+        """Тест что досрочный выход не запрашивает лишние страницы."""
+        pages = AmoCRMClient().iterate_pages("/api/v4/leads", "leads")
+        await anext(pages)
+        await pages.aclose()
+        await asyncio.sleep(0.01)
+
+        assert len(requests_log) <= 2
+
+    async def test_prefetch_is_finished_on_early_exit(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при досрочном выходе запрос следующей страницы завершается до возврата из aclose."""
+        pages = make_pages(2)
+        finished: list[str] = []
+
+        async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+            if endpoint == "/api/v4/leads":
+                return pages[endpoint]
+            try:
+                await asyncio.sleep(10)
+                return pages[endpoint]
+            finally:
+                finished.append(endpoint)
+
+        monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+        iterator = AmoCRMClient().iterate_pages("/api/v4/leads", "leads")
+        await anext(iterator)
+        await asyncio.sleep(0)
+
+        await iterator.aclose()
+
+        assert finished == ["/api/v4/leads?page=2&limit=2"]
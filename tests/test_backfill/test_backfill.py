@@ -0,0 +1,201 @@
+"""Тесты для догрузки оплаченных счетов из каталога amoCRM."""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.cli import backfill
+from app.models.payment import PaymentEvent
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import DeliveryLog
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+SINCE = datetime(2025, 9, 1)
+UNTIL = datetime(2025, 10, 1)
+
+
+class Interrupted(BaseException):
+    """Имитация прерывания процесса посреди догрузки."""
+
+
+def make_element(element_id: int, paid: bool = True, updated_at: int | None = None) -> dict[str, Any]:
+    """Создать элемент каталога 'Счета/покупки' в формате API amoCRM."""
+    status_enum = settings.AMO_BILL_STATUS_PAID_ENUM if paid else settings.AMO_BILL_STATUS_PAID_ENUM + 1
+    return {
+        "id": element_id,
+        "updated_at": updated_at if updated_at is not None else int(datetime(2025, 9, 15).timestamp()),
+        "custom_fields_values": [
+            {"field_code": "BILL_STATUS", "values": [{"value": "Оплачен", "enum_id": status_enum}]},
+            {"field_code": "LINK_TO_LEAD", "values": [{"value": f"https://egeland.amocrm.ru/leads/detail/{element_id}0"}]},
+            {"field_code": "BILL_PRICE", "values": [{"value": 12000}]},
+            {
+                "field_code": "ITEMS",
+                "values": [{"value": {"description": "Курс ЕГЭ", "unit_price": 6000, "quantity": 2}}],
+            },
+        ],
+    }
+
+
+class TestExtractPaymentEventFromElement:
+    """Тесты для CatalogWebhookProcessor.extract_payment_event_from_element."""
+
+    def test_paid_element(self) -> None:
+        """Тест извлечения оплаченного счета."""
+        event = CatalogWebhookProcessor().extract_payment_event_from_element(make_element(7))
+
+        assert event is not None
+        assert event.catalog_element_id == 7
+        assert event.lead_id == 70
+        assert event.amount == 12000
+        assert event.items == [{"description": "Курс ЕГЭ", "unit_price": 6000, "quantity": 2}]
+
+    def test_unpaid_element_is_skipped(self) -> None:
+        """Тест что неоплаченный счет пропускается."""
+        assert CatalogWebhookProcessor().extract_payment_event_from_element(make_element(7, paid=False)) is None
+
+
+class TestRunBackfill:
+    """Тесты для run_backfill."""
+
+    @pytest.fixture(autouse=True)
+    def catalog_id(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Задать ID каталога счетов."""
+        monkeypatch.setattr(settings, "AMO_INVOICES_CATALOG_ID", 12345)
+
+    @pytest.fixture(autouse=True)
+    def log(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DeliveryLog:
+        """Пустой журнал доставок во временном каталоге."""
+        log = DeliveryLog(tmp_path / "payments.sqlite3")
+        monkeypatch.setattr(backfill, "delivery_log", log)
+        return log
+
+    @pytest.fixture
+    def pages(self, monkeypatch: pytest.MonkeyPatch) -> list[dict[str, Any]]:
+        """Две страницы каталога вместо запросов к amoCRM."""
+        pages: list[dict[str, Any]] = [
+            {
+                "_embedded": {"elements": [make_element(1), make_element(2, paid=False), make_element(3, updated_at=0)]},
+                "_links": {"next": {"href": "https://egeland.amocrm.ru/api/v4/catalogs/12345/elements?page=2&limit=250"}},
+            },
+            {"_embedded": {"elements": [make_element(4)]}, "_links": {}},
+        ]
+
+        async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+            page = params["page"] if params else int(parse_qs(urlsplit(endpoint).query)["page"][0])
+            # Страница после последней - пустой ответ (204)
+            return pages[page - 1] if page <= len(pages) else {}
+
+        monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+        return pages
+
+    async def test_delivers_paid_elements_in_range(
+        self, tmp_path: Path, pages: list[dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что отправляются только оплаченные счета из интервала."""
+        delivered: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            delivered.append(event.catalog_element_id)
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+
+        stats = await backfill.run_backfill(SINCE, UNTIL, 2, tmp_path / "checkpoint.json")
+
+        assert sorted(delivered) == [1, 4]
+        assert stats["delivered"] == 2
+        assert stats["scanned"] == 4
+
+    async def test_resumes_from_checkpoint(
+        self, tmp_path: Path, pages: list[dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что повторный запуск не отправляет уже обработанные счета."""
+        delivered: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            if event.catalog_element_id == 4 and not delivered.count(4):
+                delivered.append(4)
+                raise Interrupted
+            delivered.append(event.catalog_element_id)
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        checkpoint_path = tmp_path / "checkpoint.json"
+
+        with pytest.raises(Interrupted):
+            await backfill.run_backfill(SINCE, UNTIL, 1, checkpoint_path)
+
+        await backfill.run_backfill(SINCE, UNTIL, 1, checkpoint_path)
+
+        assert delivered == [1, 4, 4]
+
+    async def test_resumes_without_until(
+        self, tmp_path: Path, pages: list[dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что без --until повторный запуск продолжает чекпоинт с интервалом первого запуска."""
+        delivered: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            delivered.append(event.catalog_element_id)
+            if event.catalog_element_id == 4 and delivered.count(4) == 1:
+                raise Interrupted
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        checkpoint_path = tmp_path / "checkpoint.json"
+
+        with pytest.raises(Interrupted):
+            await backfill.run_backfill(SINCE, None, 1, checkpoint_path)
+        until = json.loads(checkpoint_path.read_text(encoding="utf-8"))["params"]["until"]
+
+        await backfill.run_backfill(SINCE, None, 1, checkpoint_path)
+
+        assert delivered == [1, 4, 4]
+        assert json.loads(checkpoint_path.read_text(encoding="utf-8"))["params"]["until"] == until
+
+    async def test_skips_already_delivered(
+        self, tmp_path: Path, pages: list[dict[str, Any]], log: DeliveryLog, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что счета, доставка которых записана в журнал, не отправляются повторно."""
+        delivered: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            delivered.append(event.catalog_element_id)
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        log.record(PaymentEvent(event_type="update", catalog_element_id=1, lead_id=10, items=[], amount=12000), {})
+
+        stats = await backfill.run_backfill(SINCE, UNTIL, 2, tmp_path / "checkpoint.json")
+
+        assert delivered == [4]
+        assert stats["already_delivered"] == 1
+
+    async def test_failed_elements_are_retried_on_next_run(
+        self, tmp_path: Path, pages: list[dict[str, Any]], monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что счет, который не удалось отправить, повторяется при следующем запуске."""
+        attempts: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            attempts.append(event.catalog_element_id)
+            if event.catalog_element_id == 1 and attempts.count(1) == 1:
+                raise ConnectionError("platform unavailable")
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        checkpoint_path = tmp_path / "checkpoint.json"
+
+        first = await backfill.run_backfill(SINCE, UNTIL, 1, checkpoint_path)
+        second = await backfill.run_backfill(SINCE, UNTIL, 1, checkpoint_path)
+
+        assert first["failed"] == 1
+        assert attempts == [1, 4, 1]
+        assert second["delivered"] == 2
+        assert backfill.BackfillCheckpoint.load(checkpoint_path, {}).failed == {}
+
@@ -0,0 +1,124 @@
+"""Тесты для снимка кэша предзагруженных сделок."""
+
+import gzip
+import stat
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services import lead_cache as lead_cache_module
+from app.services.cache_snapshot import CacheSnapshot, snapshot_path
+from app.services.lead_cache import LeadCache
+from app.services.metrics import Metrics
+
+LEAD = {"lead": {"id": 42}, "contact": {"id": 7}}
+
+
+class TestLeadCacheSnapshot:
+    """Тесты для LeadCache.export и LeadCache.restore."""
+
+    def test_restore_skips_expired_and_reloaded_entries(self) -> None:
+        """Тест что устаревшие записи и записи, загруженные после запуска, не заменяются снимком."""
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(2, {"fresh": True})
+        now = time.time()
+
+        restored = cache.restore([(1, now + 30, LEAD), (2, now + 30, {"fresh": False}), (3, now - 1, LEAD)])
+
+        assert restored == 1
+        assert 1 in cache
+        assert 3 not in cache
+        assert cache.pop(2) == {"fresh": True}
+
+    def test_export_keeps_remaining_ttl(self) -> None:
+        """Тест что в снимок попадает оставшийся срок жизни записи в unix time."""
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(("acme", 42), LEAD)
+
+        [(key, expires_at, data)] = cache.export()
+
+        assert key == ("acme", 42)
+        assert data == LEAD
+        assert time.time() + 59 < expires_at <= time.time() + 60
+
+    def test_hits_counted_by_source(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что попадания в восстановленные записи считаются отдельно."""
+        registry = Metrics()
+        monkeypatch.setattr(lead_cache_module, "metrics", registry)
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(1, LEAD)
+        cache.restore([(2, time.time() + 30, LEAD)])
+
+        cache.pop(1)
+        cache.pop(2)
+        cache.pop(3)
+
+        assert registry.counter("lead_cache_lookups_total", result="hit", source="prefetch") == 1
+        assert registry.counter("lead_cache_lookups_total", result="hit", source="snapshot") == 1
+        assert registry.counter("lead_cache_lookups_total", result="miss") == 1
+
+
+class TestCacheSnapshot:
+    """Тесты для CacheSnapshot."""
+
+    async def test_save_and_load(self, tmp_path: Path) -> None:
+        """Тест что кэш переживает перезапуск, включая ключи дополнительных аккаунтов."""
+        path = tmp_path / "cache.json.gz"
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(42, LEAD)
+        cache.put(("acme", 42), {"lead": {"id": 42}, "contact": {"id": 8}})
+
+        assert await CacheSnapshot(path, cache, interval=60).save() == 2
+
+        restarted = LeadCache(ttl=60, max_size=10)
+
+        assert await CacheSnapshot(path, restarted, interval=60).load() == 2
+        assert restarted.pop(42) == LEAD
+        assert restarted.pop(("acme", 42)) == {"lead": {"id": 42}, "contact": {"id": 8}}
+
+    async def test_missing_or_broken_snapshot(self, tmp_path: Path) -> None:
+        """Тест что без снимка или с поврежденным снимком сервис запускается с пустым кэшем."""
+        path = tmp_path / "cache.json.gz"
+        cache = LeadCache(ttl=60, max_size=10)
+
+        assert await CacheSnapshot(path, cache, interval=60).load() == 0
+
+        path.write_bytes(gzip.compress(b"{not json"))
+
+        assert await CacheSnapshot(path, cache, interval=60).load() == 0
+        assert len(cache) == 0
+
+    async def test_stop_saves_snapshot(self, tmp_path: Path) -> None:
+        """Тест что при остановке снимок сохраняется."""
+        path = tmp_path / "cache.json.gz"
+        cache = LeadCache(ttl=60, max_size=10)
+        snapshot = CacheSnapshot(path, cache, interval=60)
+        snapshot.start()
+        cache.put(42, LEAD)
+
+        await snapshot.stop()
+
+        assert path.exists()
+        assert not list(tmp_path.glob("*.tmp"))
+
+    async def test_snapshot_readable_only_by_owner(self, tmp_path: Path) -> None:
+        """Тест что снимок с данными контактов доступен только владельцу процесса."""
+        path = tmp_path / "cache.json.gz"
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(42, LEAD)
+
+        await CacheSnapshot(path, cache, interval=60).save()
+        await CacheSnapshot(path, cache, interval=60).save()
+
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+        assert [file.name for file in tmp_path.iterdir()] == ["cache.json.gz"]
+
+    def test_snapshot_path_per_node(self, tmp_path: Path) -> None:
+        """Тест что у узлов с общим DATA_DIR разные файлы снимка, а у перезапущенного узла - тот же."""
+        first = snapshot_path(tmp_path, "http://10.0.0.1:8000")
+        second = snapshot_path(tmp_path, "http://10.0.0.2:8000")
+
+        assert first == tmp_path / "cache_snapshot.http_10.0.0.1_8000.json.gz"
+        assert second != first
+        assert snapshot_path(tmp_path, "http://10.0.0.1:8000") == first
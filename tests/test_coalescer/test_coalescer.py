@@ -0,0 +1,162 @@
+"""Тесты для склейки серий событий по элементу каталога."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import amo_webhook
+from app.models.payment import PaymentEvent
+from app.services.coalescer import EventCoalescer
+from tests.test_fast_filter.test_fast_filter import build_catalog_body
+
+
+def make_event(catalog_element_id: int | None = 812345, amount: int = 12000) -> PaymentEvent:
+    """Создать оплаченный счет для тестов."""
+    return PaymentEvent(
+        event_type="update",
+        catalog_element_id=catalog_element_id,
+        lead_id=38743359,
+        items=[{"description": "Курс", "unit_price": amount, "quantity": 1}],
+        amount=amount,
+    )
+
+
+class TestEventCoalescer:
+    """Тесты для EventCoalescer."""
+
+    async def test_disabled_when_window_is_zero(self) -> None:
+        """Тест что при нулевом окне событие обрабатывается сразу."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        coalescer = EventCoalescer(window=0, max_delay=1.0, max_pending=10, handler=handler)
+
+        assert coalescer.submit(make_event()) is False
+        assert coalescer.pending_count == 0
+
+    async def test_only_last_event_is_processed(self) -> None:
+        """Тест что из серии событий обрабатывается только последнее."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        coalescer = EventCoalescer(window=0.05, max_delay=1.0, max_pending=10, handler=handler)
+
+        for amount in (1000, 2000, 3000):
+            assert coalescer.submit(make_event(amount=amount)) is True
+
+        assert coalescer.pending_count == 1
+
+        await asyncio.sleep(0.1)
+
+        assert [event.amount for event in processed] == [3000]
+        assert coalescer.pending_count == 0
+
+    async def test_max_delay_caps_extension(self) -> None:
+        """Тест что постоянный поток событий не откладывает обработку дольше max_delay."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        processed_at: list[float] = []
+
+        async def record(event: PaymentEvent) -> None:
+            processed_at.append(time.monotonic())
+            await handler(event)
+
+        coalescer = EventCoalescer(window=0.05, max_delay=0.1, max_pending=10, handler=record)
+        started = time.monotonic()
+
+        for amount in range(8):
+            coalescer.submit(make_event(amount=amount))
+            await asyncio.sleep(0.02)
+
+        await asyncio.sleep(0.1)
+
+        # Первая серия закрыта по max_delay, остаток - по окну после последнего события
+        assert len(processed) == 2
+        assert 0.1 <= processed_at[0] - started < 0.1 + 0.05
+        assert processed[-1].amount == 7
+
+    async def test_different_elements_are_independent(self) -> None:
+        """Тест что разные элементы каталога склеиваются независимо."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        coalescer = EventCoalescer(window=10.0, max_delay=10.0, max_pending=10, handler=handler)
+        coalescer.submit(make_event(catalog_element_id=1))
+        coalescer.submit(make_event(catalog_element_id=2))
+
+        assert coalescer.pending_count == 2
+
+        await coalescer.flush()
+
+        assert sorted(event.catalog_element_id or 0 for event in processed) == [1, 2]
+
+    async def test_overflow_processes_immediately(self) -> None:
+        """Тест что при переполнении окна новое событие обрабатывается сразу."""
+
+        async def handler(event: PaymentEvent) -> None:
+            return None
+
+        coalescer = EventCoalescer(window=10.0, max_delay=10.0, max_pending=1, handler=handler)
+
+        assert coalescer.submit(make_event(catalog_element_id=1)) is True
+        assert coalescer.submit(make_event(catalog_element_id=2)) is False
+
+        await coalescer.flush()
+
+    async def test_cancel_drops_pending_event(self) -> None:
+        """Тест что новое необрабатываемое состояние счета отменяет ожидающую оплату."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        coalescer = EventCoalescer(window=0.05, max_delay=1.0, max_pending=10, handler=handler)
+        coalescer.submit(make_event(catalog_element_id=1))
+        coalescer.submit(make_event(catalog_element_id=2))
+
+        assert coalescer.cancel(1) is True
+        assert coalescer.cancel(1) is False
+
+        await asyncio.sleep(0.1)
+
+        assert [event.catalog_element_id for event in processed] == [2]
+
+
+class TestUnpaidUpdateCancelsPending:
+    """Тесты для отмены ожидающей оплаты неоплаченным состоянием счета в webhook."""
+
+    async def test_unpaid_webhook_cancels_pending_payment(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что счет, снова ставший неоплаченным в окне склейки, не обрабатывается."""
+        processed: list[PaymentEvent] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event)
+
+        coalescer = EventCoalescer(window=0.05, max_delay=1.0, max_pending=10, handler=handler)
+        monkeypatch.setattr(amo_webhook, "event_coalescer", coalescer)
+        coalescer.submit(make_event(catalog_element_id=812345))
+
+        app = FastAPI()
+        app.include_router(amo_webhook.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/amo/webhook/handle", content=build_catalog_body())
+
+        assert response.json() == {"status": "ignored", "reason": "not_paid"}
+        assert coalescer.pending_count == 0
+
+        await asyncio.sleep(0.1)
+
+        assert processed == []
+
@@ -0,0 +1,119 @@
+"""Тесты для адаптивного лимита одновременных запросов к внешним API."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.concurrency_limiter import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitReachedError,
+    get_concurrency_limiter,
+    is_overload,
+)
+from app.services.metrics import metrics
+
+
+def make_limiter(initial: int = 4) -> AdaptiveConcurrencyLimiter:
+    """Создать лимит для тестов."""
+    return AdaptiveConcurrencyLimiter("test", initial=initial, min_limit=1, max_limit=10, latency_tolerance=2.0, backoff=0.5)
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    """Создать ошибку HTTP-статуса."""
+    request = httpx.Request("GET", "https://example.amocrm.ru/api/v4/leads/1")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+
+class TestIsOverload:
+    """Тесты для is_overload."""
+
+    def test_overload_errors(self) -> None:
+        """Тест что 429, 5xx и таймаут считаются перегрузкой, а 404 и прочие ошибки - нет."""
+        assert is_overload(status_error(429))
+        assert is_overload(status_error(503))
+        assert is_overload(httpx.ReadTimeout("timeout"))
+        assert not is_overload(status_error(404))
+        assert not is_overload(ValueError("bad data"))
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """Тесты для AdaptiveConcurrencyLimiter."""
+
+    async def test_limit_grows_on_success(self) -> None:
+        """Тест что лимит медленно растет при успешных ответах."""
+        limiter = make_limiter(initial=2)
+
+        for _ in range(10):
+            async with limiter.permit():
+                pass
+
+        assert limiter.limit > 2
+
+    async def test_limit_cut_on_overload(self) -> None:
+        """Тест что при 429 лимит сразу уменьшается вдвое, но не ниже минимума."""
+        limiter = make_limiter(initial=8)
+
+        for expected in (4, 2, 1, 1):
+            with pytest.raises(httpx.HTTPStatusError):
+                async with limiter.permit():
+                    raise status_error(429)
+            assert limiter.limit == expected
+
+    async def test_concurrent_overloads_cut_limit_once(self) -> None:
+        """Тест что ошибки запросов, отправленных до снижения лимита, не снижают его повторно."""
+        limiter = make_limiter(initial=8)
+
+        async def request() -> None:
+            async with limiter.permit():
+                await asyncio.sleep(0.01)
+                raise status_error(503)
+
+        await asyncio.gather(*(request() for _ in range(4)), return_exceptions=True)
+
+        assert limiter.limit == 4
+
+    async def test_no_wait_permit_is_refused_when_full(self) -> None:
+        """Тест что запрос без ожидания сразу получает отказ, если мест в лимите нет."""
+        limiter = make_limiter(initial=1)
+
+        async with limiter.permit():
+            assert not limiter.has_capacity
+            with pytest.raises(ConcurrencyLimitReachedError):
+                async with limiter.permit(wait=False):
+                    pass
+
+        assert limiter.in_flight == 0
+
+    async def test_other_errors_do_not_change_limit(self) -> None:
+        """Тест что ошибки, не связанные с перегрузкой, не меняют лимит."""
+        limiter = make_limiter(initial=4)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            async with limiter.permit():
+                raise status_error(404)
+
+        assert limiter.limit == 4
+
+    async def test_in_flight_never_exceeds_limit(self) -> None:
+        """Тест что одновременно выполняется не больше limit запросов."""
+        limiter = make_limiter(initial=2)
+        limiter.max_limit = 2
+        max_in_flight = 0
+
+        async def request() -> None:
+            nonlocal max_in_flight
+            async with limiter.permit():
+                max_in_flight = max(max_in_flight, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+        assert max_in_flight == 2
+        assert limiter.in_flight == 0
+
+    def test_limit_in_metrics(self) -> None:
+        """Тест что текущий лимит виден в метриках."""
+        limiter = get_concurrency_limiter("amocrm")
+
+        assert f'upstream_concurrency_limit{{upstream="amocrm"}} {limiter.limit}' in metrics.render()
@@ -0,0 +1,122 @@
+"""Тесты для индекса lead_id → contact_id и параллельной загрузки сделки с контактом."""
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services import amocrm_client
+from app.services.amocrm_client import AmoCRMClient
+from app.services.contact_index import ContactIndex
+
+
+def make_lead(lead_id: int, contact_id: int) -> dict[str, Any]:
+    """Создать сделку с основным контактом в формате API amoCRM."""
+    return {"id": lead_id, "_embedded": {"contacts": [{"id": contact_id, "is_main": True}]}}
+
+
+@pytest.fixture
+def index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ContactIndex:
+    """Индекс во временной директории вместо общего."""
+    contact_index = ContactIndex(tmp_path / "contact_index.sqlite3")
+    monkeypatch.setattr(amocrm_client, "contact_index", contact_index)
+    yield contact_index
+    contact_index.close()
+
+
+class AmoStub:
+    """Ответы amoCRM со счетчиком одновременных запросов."""
+
+    def __init__(self, contact_of_lead: dict[int, int]) -> None:
+        self.contact_of_lead = contact_of_lead
+        self.requests: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def make_request(self, endpoint: str) -> dict[str, Any]:
+        self.requests.append(endpoint)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+
+        entity, entity_id = endpoint.rsplit("/", 2)[1:]
+        if entity == "leads":
+            return make_lead(int(entity_id), self.contact_of_lead[int(entity_id)])
+        return {"id": int(entity_id)}
+
+
+@pytest.fixture
+def amo(monkeypatch: pytest.MonkeyPatch) -> AmoStub:
+    """Подменить запросы к amoCRM."""
+    stub = AmoStub({1: 10})
+
+    async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None, **kwargs: Any) -> dict[str, Any]:
+        return await stub.make_request(endpoint)
+
+    monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+    return stub
+
+
+class TestContactIndex:
+    """Тесты для ContactIndex."""
+
+    def test_index_leads(self, index: ContactIndex) -> None:
+        """Тест индексации сделок из списка; сделки без контакта пропускаются."""
+        indexed = index.index_leads([make_lead(1, 10), make_lead(2, 20), {"id": 3, "_embedded": {"contacts": []}}])
+
+        assert indexed == 2
+        assert index.get(2) == 20
+        assert index.get(3) is None
+
+
+class TestGetLeadWithContact:
+    """Тесты для get_lead_with_contact с индексом контактов."""
+
+    async def test_sequential_without_index(self, index: ContactIndex, amo: AmoStub) -> None:
+        """Тест что без индекса запросы идут последовательно, а контакт попадает в индекс."""
+        result = await AmoCRMClient().get_lead_with_contact(1)
+
+        assert result["contact"] == {"id": 10}
+        assert amo.max_in_flight == 1
+        assert index.get(1) == 10
+
+    async def test_parallel_with_index(self, index: ContactIndex, amo: AmoStub) -> None:
+        """Тест что при известном контакте сделка и контакт запрашиваются одновременно."""
+        index.put(1, 10)
+
+        result = await AmoCRMClient().get_lead_with_contact(1)
+
+        assert result["contact"] == {"id": 10}
+        assert amo.max_in_flight == 2
+        assert len(amo.requests) == 2
+
+    async def test_stale_index_is_corrected(self, index: ContactIndex, amo: AmoStub) -> None:
+        """Тест что при смене контакта сделки загружается актуальный контакт и индекс обновляется."""
+        index.put(1, 99)
+
+        result = await AmoCRMClient().get_lead_with_contact(1)
+
+        assert result["contact"] == {"id": 10}
+        assert amo.requests[-1] == "/api/v4/contacts/10"
+        assert index.get(1) == 10
+
+    async def test_lead_request_is_cancelled_on_index_error(
+        self, index: ContactIndex, amo: AmoStub, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что сделка запрашивается во время поиска в индексе, а при его ошибке запрос отменяется и дожидается."""
+
+        async def indexed_contact_id(self: AmoCRMClient, lead_id: int) -> int | None:
+            await asyncio.sleep(0.005)
+            raise RuntimeError("index broken")
+
+        monkeypatch.setattr(AmoCRMClient, "_indexed_contact_id", indexed_contact_id)
+
+        with pytest.raises(RuntimeError):
+            await AmoCRMClient().get_lead_with_contact(1)
+
+        assert amo.requests == ["/api/v4/leads/1"]
+        assert amo.in_flight == 0
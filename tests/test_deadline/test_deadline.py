@@ -0,0 +1,128 @@
+"""Тесты для бюджета времени на обработку webhook."""
+
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.models.platform import Course, PlatformPayload
+from app.services import amocrm_client, platform_client
+from app.services.amocrm_client import AmoCRMClient
+from app.services.contact_index import ContactIndex
+from app.services.deadline import Deadline, DeadlineExceededError
+from app.services.platform_client import PlatformClient
+
+
+class TestDeadline:
+    """Тесты для Deadline."""
+
+    def test_timeout_is_capped_by_remaining(self) -> None:
+        """Тест что таймаут попытки не превышает оставшееся время."""
+        deadline = Deadline(2.0)
+
+        assert deadline.timeout(30.0) <= 2.0
+        assert deadline.timeout(0.5) == 0.5
+
+    def test_stage_gets_share_of_total(self) -> None:
+        """Тест что этап получает свою долю бюджета."""
+        deadline = Deadline(10.0)
+        stage = deadline.stage(0.4)
+
+        assert stage.total == pytest.approx(4.0)
+        assert stage.remaining() <= 4.0
+
+    def test_stage_never_outlives_parent(self) -> None:
+        """Тест что этап не может закончиться позже общего deadline."""
+        deadline = Deadline(1.0)
+
+        assert deadline.stage(5.0).expires_at == deadline.expires_at
+
+    def test_expired_deadline_raises(self) -> None:
+        """Тест что истекший deadline не дает начать попытку."""
+        deadline = Deadline(0.0)
+
+        assert deadline.expired
+        with pytest.raises(DeadlineExceededError):
+            deadline.timeout(30.0)
+
+
+class TestAmoCRMClientDeadline:
+    """Тесты учета deadline в AmoCRMClient."""
+
+    @pytest.fixture(autouse=True)
+    def index(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ContactIndex:
+        """Индекс контактов во временной директории вместо общего."""
+        contact_index = ContactIndex(tmp_path / "contact_index.sqlite3")
+        monkeypatch.setattr(amocrm_client, "contact_index", contact_index)
+        yield contact_index
+        contact_index.close()
+
+    async def test_slow_amo_raises_deadline_exceeded(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что зависший ответ amoCRM обрывается по deadline, а не через 30 с."""
+
+        async def slow_handler(request: httpx.Request) -> httpx.Response:
+            timeout = request.extensions["timeout"]["read"]
+            await asyncio.sleep(timeout)
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow_handler))
+        monkeypatch.setattr(amocrm_client, "get_http_client", lambda base_url: client)
+
+        with pytest.raises(DeadlineExceededError):
+            await AmoCRMClient().get_lead_with_contact(38743359, deadline=Deadline(0.2))
+
+        await client.aclose()
+
+
+def make_payload() -> PlatformPayload:
+    """Создать payload платформы."""
+    return PlatformPayload(
+        courses=[Course(name="Курс ЕГЭ", subject_designation="maths", cost=6000, months=1)],
+        first_name="Иван",
+        email="ivan@example.com",
+        phone="+79990000000",
+        class_=11,
+        amount=6000,
+    )
+
+
+class TestPlatformClientDeadline:
+    """Тесты учета deadline в PlatformClient."""
+
+    async def test_started_post_is_not_cut_by_deadline(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что начатая отправка на платформу не обрывается по deadline и не повторяется."""
+        calls = 0
+
+        async def slow_handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={"status": "success", "order_id": "1"})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow_handler))
+        monkeypatch.setattr(platform_client, "get_http_client", lambda base_url: client)
+
+        response = await PlatformClient().send_payment(make_payload(), deadline=Deadline(0.05))
+
+        assert response["order_id"] == "1"
+        assert calls == 1
+        await client.aclose()
+
+    async def test_expired_deadline_does_not_send(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что после истечения deadline отправка не начинается."""
+        calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json={"status": "success"})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(platform_client, "get_http_client", lambda base_url: client)
+
+        with pytest.raises(DeadlineExceededError):
+            await PlatformClient().send_payment(make_payload(), deadline=Deadline(0.0))
+
+        assert calls == 0
+        await client.aclose()
@@ -0,0 +1,240 @@
+"""Тесты для опроса событий amoCRM."""
+
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.models.payment import PaymentEvent
+from app.services import events_poller
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import DeliveryLog
+from app.services.events_poller import EventsCursor, EventsPoller
+from app.services.retry_queue import RetryQueue
+from app.services.retry_store import RetryStore
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+
+def make_element(element_id: int, paid: bool = True) -> dict[str, Any]:
+    """Создать элемент каталога 'Счета/покупки' в формате API amoCRM."""
+    status_enum = settings.AMO_BILL_STATUS_PAID_ENUM if paid else settings.AMO_BILL_STATUS_PAID_ENUM + 1
+    return {
+        "id": element_id,
+        "custom_fields_values": [
+            {"field_code": "BILL_STATUS", "values": [{"value": "Оплачен", "enum_id": status_enum}]},
+            {"field_code": "LINK_TO_LEAD", "values": [{"value": f"https://egeland.amocrm.ru/leads/detail/{element_id}0"}]},
+            {"field_code": "BILL_PRICE", "values": [{"value": 12000}]},
+            {
+                "field_code": "ITEMS",
+                "values": [{"value": {"description": "Курс ЕГЭ", "unit_price": 12000, "quantity": 1}}],
+            },
+        ],
+    }
+
+
+def make_event(event_id: str, element_id: int, created_at: int, entity_type: str = "catalog_element") -> dict[str, Any]:
+    """Создать событие в формате /api/v4/events."""
+    return {
+        "id": event_id,
+        "type": "custom_field_value_changed",
+        "entity_id": element_id,
+        "entity_type": entity_type,
+        "created_at": created_at,
+    }
+
+
+class AmoStub:
+    """Ответы amoCRM: события и элементы каталога."""
+
+    def __init__(self) -> None:
+        self.events: list[dict[str, Any]] = []
+        self.elements: dict[int, dict[str, Any]] = {}
+        self.windows: list[tuple[int, int]] = []
+
+    async def make_request(self, client: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+        if endpoint == "/api/v4/events":
+            since, until = params["filter[created_at][from]"], params["filter[created_at][to]"]
+            self.windows.append((since, until))
+            return {"_embedded": {"events": [event for event in self.events if since <= event["created_at"] <= until]}}
+
+        ids = params["filter[id][]"]
+        return {"_embedded": {"elements": [self.elements[element_id] for element_id in ids if element_id in self.elements]}}
+
+
+@pytest.fixture
+def amo(monkeypatch: pytest.MonkeyPatch) -> AmoStub:
+    """Подменить запросы к amoCRM."""
+    stub = AmoStub()
+
+    async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+        return await stub.make_request(self, method, endpoint, params)
+
+    monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+    monkeypatch.setattr(settings, "AMO_INVOICES_CATALOG_ID", 12345)
+    return stub
+
+
+@pytest.fixture
+def delivered(monkeypatch: pytest.MonkeyPatch) -> list[int | None]:
+    """Доставка на платформу вместо реальной отправки."""
+    delivered: list[int | None] = []
+
+    async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+        delivered.append(event.catalog_element_id)
+        return {"status": "success"}
+
+    monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+    return delivered
+
+
+@pytest.fixture
+def deliveries(tmp_path: Path) -> DeliveryLog:
+    """Журнал доставок во временной директории."""
+    log = DeliveryLog(tmp_path / "payments.sqlite3")
+    yield log
+    log.close()
+
+
+# Курсор опроса в тестах: события создаются через секунды после него
+START = int(time.time()) - 1000
+
+
+def make_poller(tmp_path: Path, deliveries: DeliveryLog, batch_size: int = 10, window: int = 3600) -> EventsPoller:
+    """Создать опрос событий с курсором во временной директории."""
+    cursor = EventsCursor(tmp_path / "cursor.json")
+    cursor.created_at = START
+    cursor.save()
+    return EventsPoller(tmp_path / "cursor.json", deliveries, 1.0, 8.0, batch_size, 2, window)
+
+
+class TestEventsCursor:
+    """Тесты для EventsCursor."""
+
+    def test_same_second_events_are_not_repeated(self, tmp_path: Path) -> None:
+        """Тест что событие с тем же created_at, но другим ID считается новым."""
+        cursor = EventsCursor(tmp_path / "cursor.json")
+        cursor.advance([make_event("a", 1, 100), make_event("b", 2, 105)])
+
+        restored = EventsCursor.load(tmp_path / "cursor.json")
+
+        assert restored.created_at == 105
+        assert not restored.is_new(make_event("b", 2, 105))
+        assert restored.is_new(make_event("c", 3, 105))
+        assert not restored.is_new(make_event("a", 1, 100))
+
+
+class TestPollOnce:
+    """Тесты для EventsPoller.poll_once."""
+
+    async def test_delivers_paid_catalog_elements(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что доставляются только оплаченные элементы каталога из событий."""
+        amo.events = [
+            make_event("a", 1, START + 1),
+            make_event("b", 2, START + 2),
+            make_event("c", 3, START + 3, entity_type="lead"),
+        ]
+        amo.elements = {1: make_element(1), 2: make_element(2, paid=False), 3: make_element(3)}
+
+        stats = await make_poller(tmp_path, deliveries).poll_once()
+
+        assert delivered == [1]
+        assert stats["events"] == 2
+
+    async def test_events_not_processed_twice_after_restart(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что после перезапуска те же события не обрабатываются повторно."""
+        amo.events = [make_event("a", 1, START + 1), make_event("b", 4, START + 1)]
+        amo.elements = {1: make_element(1), 4: make_element(4)}
+
+        poller = make_poller(tmp_path, deliveries)
+        await poller.poll_once()
+
+        restarted = EventsPoller(tmp_path / "cursor.json", deliveries, 1.0, 8.0, 10, 2, 3600)
+        stats = await restarted.poll_once()
+
+        assert sorted(delivered) == [1, 4]
+        assert stats["events"] == 0
+
+    async def test_skips_already_delivered(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что уже доставленный счет не отправляется повторно."""
+        deliveries.record(PaymentEvent(event_type="api", catalog_element_id=1, lead_id=10, items=[], amount=1), {})
+        amo.events = [make_event("a", 1, START + 1)]
+        amo.elements = {1: make_element(1)}
+
+        await make_poller(tmp_path, deliveries).poll_once()
+
+        assert not delivered
+
+    async def test_reads_events_window_by_window(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что события читаются окнами, а курсор сдвигается за каждое прочитанное окно."""
+        amo.events = [make_event("a", 1, START + 10), make_event("b", 2, START + 750)]
+        amo.elements = {1: make_element(1), 2: make_element(2)}
+
+        stats = await make_poller(tmp_path, deliveries, window=300).poll_once()
+
+        assert delivered == [1, 2]
+        assert stats["events"] == 2
+        assert all(until - since <= 300 for since, until in amo.windows)
+        assert EventsCursor.load(tmp_path / "cursor.json").created_at == START + 900
+
+    async def test_failed_delivery_survives_restart(
+        self, tmp_path: Path, amo: AmoStub, deliveries: DeliveryLog, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что недоставленный счет сохраняется в хранилище повторов, хотя курсор уходит дальше."""
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            raise RuntimeError("platform down")
+
+        store = RetryStore(tmp_path / "retry.sqlite3")
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        monkeypatch.setattr(events_poller, "retry_store", store)
+        queue = RetryQueue(
+            delay=1, max_attempts=3, concurrency=1, handler=CatalogWebhookProcessor().process_payment_event, store=store
+        )
+        monkeypatch.setattr(events_poller, "retry_queue", queue)
+        amo.events = [make_event("a", 1, START + 1)]
+        amo.elements = {1: make_element(1)}
+
+        stats = await make_poller(tmp_path, deliveries).poll_once()
+
+        assert stats["failed"] == 1
+        assert EventsCursor.load(tmp_path / "cursor.json").created_at == START + 1
+        assert [event.catalog_element_id for event, _ in store.pending()] == [1]
+        assert queue.size == 1
+        store.close()
+
+
+class TestAdaptiveInterval:
+    """Тесты для адаптивного интервала опроса."""
+
+    async def test_interval_backs_off_without_events(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что без событий интервал удваивается до максимума."""
+        poller = make_poller(tmp_path, deliveries)
+
+        for _ in range(5):
+            await poller.poll_once()
+
+        assert poller.interval == 8.0
+
+    async def test_full_batch_resets_interval(
+        self, tmp_path: Path, amo: AmoStub, delivered: list[int | None], deliveries: DeliveryLog
+    ) -> None:
+        """Тест что при полной пачке событий опрос ускоряется до минимума."""
+        poller = make_poller(tmp_path, deliveries, batch_size=2)
+        poller.interval = 8.0
+        amo.events = [make_event(str(i), i, START + 1 + i) for i in range(3)]
+
+        await poller.poll_once()
+
+        assert poller.interval == 1.0
@@ -0,0 +1,117 @@
+"""Тесты для быстрого отсева неоплаченных webhook по сырому телу."""
+
+from urllib.parse import parse_qs, unquote_plus, urlencode
+
+import pytest
+
+from app.services.fast_filter import extract_catalog_element_id, extract_lead_id, fast_reject_reason
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+
+def build_catalog_body(event_type: str = "update", status_enum: int | None = None, safe: str = "") -> bytes:
+    """Собрать тело webhook каталога 'Счета/покупки' в формате amoCRM."""
+    prefix = f"catalogs[{event_type}][0]"
+    fields: list[tuple[str, str]] = [
+        ("account[subdomain]", "egeland"),
+        ("account[id]", "29000000"),
+        (f"{prefix}[id]", "812345"),
+        (f"{prefix}[catalog_id]", "12345"),
+        (f"{prefix}[name]", "Счет №1024"),
+        (f"{prefix}[custom_fields][0][id]", "1001"),
+        (f"{prefix}[custom_fields][0][name]", "Сделка"),
+        (f"{prefix}[custom_fields][0][code]", "LINK_TO_LEAD"),
+        (f"{prefix}[custom_fields][0][values][0][value]", "https://egeland.amocrm.ru/leads/detail/38743359"),
+        (f"{prefix}[custom_fields][1][id]", "1002"),
+        (f"{prefix}[custom_fields][1][name]", "Статус"),
+        (f"{prefix}[custom_fields][1][code]", "BILL_STATUS"),
+        (f"{prefix}[custom_fields][1][values][0][value]", "Оплачен" if status_enum else "Создан"),
+        (f"{prefix}[custom_fields][1][values][0][enum]", str(status_enum or settings.AMO_BILL_STATUS_PAID_ENUM + 1)),
+        (f"{prefix}[custom_fields][2][code]", "BILL_PRICE"),
+        (f"{prefix}[custom_fields][2][values][0][value]", "12000"),
+        (f"{prefix}[custom_fields][3][code]", "ITEMS"),
+        (f"{prefix}[custom_fields][3][values][0][value][description]", "Курс ЕГЭ, математика"),
+        (f"{prefix}[custom_fields][3][values][0][value][unit_price]", "6000"),
+        (f"{prefix}[custom_fields][3][values][0][value][quantity]", "2"),
+    ]
+    return urlencode(fields, safe=safe).encode("ascii")
+
+
+def full_parser_reason(raw_body: bytes) -> str | None:
+    """Результат полного пути обработки: причина игнорирования или None."""
+    parsed_data = parse_qs(unquote_plus(raw_body.decode("utf-8", errors="ignore")))
+    _, ignored = CatalogWebhookProcessor().classify(parsed_data)
+    return ignored["reason"] if ignored else None
+
+
+class TestFastRejectReason:
+    """Тесты для функции fast_reject_reason."""
+
+    @pytest.mark.parametrize("event_type", ["add", "update"])
+    @pytest.mark.parametrize("safe", ["", "[]"])
+    def test_rejects_not_paid(self, event_type: str, safe: str) -> None:
+        """Тест что неоплаченный счет отсекается в любой кодировке скобок."""
+        body = build_catalog_body(event_type, safe=safe)
+
+        assert fast_reject_reason(body) == "not_paid"
+        assert full_parser_reason(body) == "not_paid"
+
+    @pytest.mark.parametrize("safe", ["", "[]"])
+    def test_paid_goes_to_full_parser(self, safe: str) -> None:
+        """Тест что оплаченный счет не отсекается."""
+        body = build_catalog_body(status_enum=settings.AMO_BILL_STATUS_PAID_ENUM, safe=safe)
+
+        assert fast_reject_reason(body) is None
+        assert full_parser_reason(body) is None
+
+    def test_rejects_non_catalog_event(self) -> None:
+        """Тест что webhook без каталога отсекается."""
+        body = urlencode({"leads[status][0][id]": "38743359", "account[id]": "29000000"}).encode("ascii")
+
+        assert fast_reject_reason(body) == "not_catalog_event"
+        assert full_parser_reason(body) == "not_catalog_event"
+
+    def test_unsure_without_bill_status(self) -> None:
+        """Тест что при отсутствии BILL_STATUS решение остается за полным парсером."""
+        body = urlencode({"catalogs[update][0][id]": "812345"}).encode("ascii")
+
+        assert fast_reject_reason(body) is None
+
+    def test_unsure_with_duplicate_bill_status(self) -> None:
+        """Тест что неоднозначное тело уходит в полный парсер."""
+        body = build_catalog_body() + b"&note=BILL_STATUS"
+
+        assert fast_reject_reason(body) is None
+
+    def test_unsure_with_mixed_bracket_encoding(self) -> None:
+        """Тест что ключ enum в нестандартной кодировке не приводит к ложному отсеву."""
+        body = build_catalog_body().replace(b"%5B0%5D%5Benum%5D", b"[0]%5Benum]")
+
+        assert fast_reject_reason(body) is None
+
+
+class TestExtractLeadId:
+    """Тесты для функции extract_lead_id."""
+
+    @pytest.mark.parametrize("safe", ["", "[]/:"])
+    def test_extracts_lead_id(self, safe: str) -> None:
+        """Тест извлечения ID сделки из ссылки LINK_TO_LEAD в любой кодировке."""
+        assert extract_lead_id(build_catalog_body(safe=safe)) == 38743359
+
+    def test_no_link(self) -> None:
+        """Тест что без ссылки на сделку возвращается None."""
+        assert extract_lead_id(urlencode({"catalogs[update][0][id]": "812345"}).encode("ascii")) is None
+
+
+class TestExtractCatalogElementId:
+    """Тесты для функции extract_catalog_element_id."""
+
+    @pytest.mark.parametrize("event_type", ["add", "update"])
+    @pytest.mark.parametrize("safe", ["", "[]/:"])
+    def test_extracts_element_id(self, event_type: str, safe: str) -> None:
+        """Тест извлечения ID элемента каталога в любой кодировке скобок."""
+        assert extract_catalog_element_id(build_catalog_body(event_type=event_type, safe=safe)) == 812345
+
+    def test_no_element(self) -> None:
+        """Тест что без ID элемента возвращается None."""
+        assert extract_catalog_element_id(urlencode({"leads[update][0][id]": "1"}).encode("ascii")) is None
@@ -0,0 +1,174 @@
+"""Тесты для дублирования медленных GET-запросов к amoCRM и метрик."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.services import amocrm_client
+from app.services.amocrm_client import AmoCRMClient
+from app.services.concurrency_limiter import AdaptiveConcurrencyLimiter
+from app.services.hedging import HedgeBudget
+from app.services.metrics import LatencyHistogram, Metrics, metrics
+from app.settings import settings
+
+
+class TestLatencyHistogram:
+    """Тесты для LatencyHistogram."""
+
+    def test_quantile(self) -> None:
+        """Тест расчета p95 по окну последних значений."""
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.observe(i / 100)
+
+        assert histogram.quantile(0.95) == pytest.approx(0.96)
+        assert LatencyHistogram().quantile(0.95) is None
+
+
+class TestMetrics:
+    """Тесты для Metrics."""
+
+    def test_render_prometheus(self) -> None:
+        """Тест выдачи счетчиков, гистограмм и показателей в формате Prometheus."""
+        registry = Metrics()
+        registry.inc("requests_total", status="ok")
+        registry.observe("request_seconds", 0.2)
+        registry.gauge("ratio", lambda: 0.5)
+
+        text = registry.render()
+
+        assert 'requests_total{status="ok"} 1' in text
+        assert 'request_seconds_bucket{le="0.25"} 1' in text
+        assert "request_seconds_count 1" in text
+        assert "ratio 0.5" in text
+
+
+class TestHedgeBudget:
+    """Тесты для HedgeBudget."""
+
+    def test_ratio_is_capped(self) -> None:
+        """Тест что после исчерпания запаса дублей не больше ratio от запросов."""
+        budget = HedgeBudget(ratio=0.1, max_tokens=1)
+        hedges = 0
+        for _ in range(100):
+            budget.record_request()
+            hedges += budget.try_spend()
+
+        assert hedges <= 11
+
+
+class TestHedgedRequest:
+    """Тесты для AmoCRMClient._hedged_request."""
+
+    @pytest.fixture(autouse=True)
+    def hedging(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Включить дублирование с малой задержкой и свежим бюджетом."""
+        monkeypatch.setattr(settings, "AMO_HEDGE_ENABLED", True)
+        monkeypatch.setattr(settings, "AMO_HEDGE_DELAY_SECONDS", 0.02)
+        budget = HedgeBudget(ratio=0.1, max_tokens=1)
+        monkeypatch.setattr(amocrm_client, "get_hedge_budget", lambda: budget)
+        metrics.reset()
+
+    @staticmethod
+    def stub_requests(monkeypatch: pytest.MonkeyPatch, delays: list[float]) -> list[bool]:
+        """Подменить запросы: i-й запрос отвечает через delays[i] секунд."""
+        calls: list[bool] = []
+
+        async def request_with_retry(
+            self: AmoCRMClient,
+            method: str,
+            url: str,
+            params: Any,
+            deadline: Any,
+            low_priority: bool = False,
+            hedge: bool = False,
+        ) -> dict[str, Any]:
+            number = len(calls)
+            calls.append(low_priority)
+            await asyncio.sleep(delays[number])
+            return {"answered_by": number}
+
+        monkeypatch.setattr(AmoCRMClient, "_request_with_retry", request_with_retry)
+        return calls
+
+    async def test_fast_response_is_not_hedged(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что быстрый ответ не дублируется."""
+        calls = self.stub_requests(monkeypatch, [0.0])
+
+        assert await AmoCRMClient()._make_request("GET", "/api/v4/leads/1") == {"answered_by": 0}
+        assert len(calls) == 1
+
+    async def test_slow_response_is_hedged(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при медленном ответе побеждает дубль с низким приоритетом."""
+        calls = self.stub_requests(monkeypatch, [1.0, 0.0])
+
+        assert await AmoCRMClient()._make_request("GET", "/api/v4/leads/1") == {"answered_by": 1}
+        assert calls == [False, True]
+        assert metrics.counter("amocrm_hedge_wins_total") == 1
+        assert "amocrm_hedge_win_rate 1" in metrics.render()
+
+    async def test_hedge_budget_exhausted(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что без бюджета дубль не отправляется."""
+        calls = self.stub_requests(monkeypatch, [1.0, 0.0, 0.05])
+
+        await AmoCRMClient()._make_request("GET", "/api/v4/leads/1")
+        assert await AmoCRMClient()._make_request("GET", "/api/v4/leads/1") == {"answered_by": 2}
+        assert len(calls) == 3
+
+    async def test_no_hedge_when_concurrency_limit_is_full(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что дубль не отправляется, если в лимите одновременных запросов нет места."""
+        calls = self.stub_requests(monkeypatch, [0.05, 0.0])
+        limiter = AdaptiveConcurrencyLimiter("test", initial=1, min_limit=1, max_limit=1, latency_tolerance=2.0, backoff=0.5)
+        monkeypatch.setattr(amocrm_client, "get_concurrency_limiter", lambda name: limiter)
+
+        async with limiter.permit():
+            assert await AmoCRMClient()._make_request("GET", "/api/v4/leads/1") == {"answered_by": 0}
+
+        assert len(calls) == 1
+
+    async def test_losing_request_is_finished_before_return(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что проигравший запрос отменен и завершен к моменту ответа, а не продолжает висеть в фоне."""
+        finished: list[str] = []
+
+        async def request_with_retry(
+            self: AmoCRMClient, *args: Any, low_priority: bool = False, **kwargs: Any
+        ) -> dict[str, Any]:
+            try:
+                await asyncio.sleep(0.0 if low_priority else 1.0)
+                return {"answered_by": "hedge" if low_priority else "primary"}
+            except asyncio.CancelledError:
+                finished.append("cancelled")
+                raise
+
+        monkeypatch.setattr(AmoCRMClient, "_request_with_retry", request_with_retry)
+
+        assert await AmoCRMClient()._make_request("GET", "/api/v4/leads/1") == {"answered_by": "hedge"}
+        assert finished == ["cancelled"]
+
+    async def test_caller_cancellation_cancels_both_requests(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при отмене вызывающего отменяются и дожидаются основной запрос и дубль."""
+        started: list[bool] = []
+        cancelled: list[bool] = []
+
+        async def request_with_retry(
+            self: AmoCRMClient, *args: Any, low_priority: bool = False, **kwargs: Any
+        ) -> dict[str, Any]:
+            started.append(low_priority)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(low_priority)
+                raise
+            return {}
+
+        monkeypatch.setattr(AmoCRMClient, "_request_with_retry", request_with_retry)
+        caller = asyncio.create_task(AmoCRMClient()._make_request("GET", "/api/v4/leads/1"))
+        await asyncio.sleep(0.05)
+
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+        assert started == [False, True]
+        assert sorted(cancelled) == [False, True]
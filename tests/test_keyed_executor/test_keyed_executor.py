@@ -0,0 +1,87 @@
+"""Тесты для упорядоченной по ключу обработки платежей."""
+
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionRejectedError
+from app.services.keyed_executor import KeyedExecutor
+
+
+class TestKeyedExecutor:
+    """Тесты для KeyedExecutor."""
+
+    async def test_same_key_runs_in_order(self) -> None:
+        """Тест что задачи одного ключа выполняются по очереди в порядке поступления."""
+        executor = KeyedExecutor(workers=4, max_queue_per_key=10, retry_after=5)
+        log: list[str] = []
+
+        async def task(name: str, delay: float) -> None:
+            log.append(f"start {name}")
+            await asyncio.sleep(delay)
+            log.append(f"end {name}")
+
+        await asyncio.gather(executor.run(1, lambda: task("add", 0.02)), executor.run(1, lambda: task("update", 0)))
+
+        assert log == ["start add", "end add", "start update", "end update"]
+        assert executor.active_keys == 0
+
+    async def test_different_keys_run_in_parallel(self) -> None:
+        """Тест что задачи разных ключей выполняются параллельно до лимита workers."""
+        executor = KeyedExecutor(workers=2, max_queue_per_key=10, retry_after=5)
+        running = 0
+        max_running = 0
+
+        async def task() -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(*(executor.run(key, task) for key in range(5)))
+
+        assert max_running == 2
+
+    async def test_hot_key_does_not_block_others(self) -> None:
+        """Тест что очередь одного ключа занимает не больше одного worker."""
+        executor = KeyedExecutor(workers=2, max_queue_per_key=10, retry_after=5)
+        finished: list[str] = []
+
+        async def task(name: str, delay: float) -> None:
+            await asyncio.sleep(delay)
+            finished.append(name)
+
+        hot = [executor.run("hot", lambda: task("hot", 0.02)) for _ in range(3)]
+        await asyncio.gather(*hot, executor.run("cold", lambda: task("cold", 0)))
+
+        assert finished[0] == "cold"
+
+    async def test_queue_per_key_is_bounded(self) -> None:
+        """Тест что переполнение очереди ключа отклоняется с Retry-After."""
+        executor = KeyedExecutor(workers=2, max_queue_per_key=2, retry_after=7)
+        release = asyncio.Event()
+
+        running = [asyncio.create_task(executor.run(1, release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await executor.run(1, release.wait)
+
+        assert exc_info.value.retry_after == 7
+        release.set()
+        await asyncio.gather(*running)
+
+    async def test_queue_wait_timeout(self) -> None:
+        """Тест что ожидание очереди ключа ограничено timeout и не ломает очередь."""
+        executor = KeyedExecutor(workers=2, max_queue_per_key=10, retry_after=5)
+        release = asyncio.Event()
+        first = asyncio.create_task(executor.run(1, release.wait))
+        await asyncio.sleep(0)
+
+        with pytest.raises(TimeoutError):
+            await executor.run(1, release.wait, timeout=0.01)
+
+        release.set()
+        await first
+        assert await executor.run(1, lambda: asyncio.sleep(0, result="ok")) == "ok"
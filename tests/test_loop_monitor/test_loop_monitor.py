@@ -0,0 +1,53 @@
+"""Тесты для наблюдения за задержкой event loop."""
+
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.services.loop_monitor import LoopLagMonitor
+from app.services.metrics import metrics
+
+
+def blocking_call(seconds: float) -> None:
+    """Синхронный код, который держит event loop."""
+    time.sleep(seconds)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics() -> None:
+    """Чистые метрики для каждого теста."""
+    metrics.reset()
+
+
+class TestLoopLagMonitor:
+    """Тесты для LoopLagMonitor."""
+
+    async def test_idle_loop_has_small_lag(self) -> None:
+        """Тест что свободный loop дает малую задержку и измерения попадают в гистограмму."""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.2)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        assert metrics.histogram("event_loop_lag_seconds").samples >= 3
+        assert monitor.last_lag < 0.2
+        assert metrics.counter("event_loop_stalls_total") == 0
+
+    async def test_blocking_code_stack_is_logged(self, caplog: pytest.LogCaptureFixture) -> None:
+        """Тест что при блокировке loop в лог попадает стек блокирующей функции, один раз на блокировку."""
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.03)
+
+        with caplog.at_level(logging.WARNING, logger="app.services.loop_monitor"):
+            blocking_call(0.2)
+            await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        stacks = [record.getMessage() for record in caplog.records if "не отвечает" in record.getMessage()]
+        assert len(stacks) == 1
+        assert "blocking_call" in stacks[0]
+        assert metrics.counter("event_loop_stalls_total") == 1
+        assert metrics.histogram("event_loop_lag_seconds").quantile(1.0) >= 0.15
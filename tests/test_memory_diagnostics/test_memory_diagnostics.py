@@ -0,0 +1,120 @@
+"""Тесты для диагностики роста памяти."""
+
+import tracemalloc
+from collections.abc import Iterator
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import debug
+from app.services.memory_diagnostics import MemoryDiagnostics, format_differences
+from app.services.metrics import Metrics
+from app.settings import settings
+
+leaked: list[bytes] = []
+
+
+def leak(blocks: int) -> None:
+    """Выделить память, которая не освобождается."""
+    leaked.extend(bytes(1024) for _ in range(blocks))
+
+
+@pytest.fixture
+def diagnostics(monkeypatch: pytest.MonkeyPatch) -> Iterator[MemoryDiagnostics]:
+    """Диагностика, которая выключает трассировку после теста."""
+    memory_diagnostics = MemoryDiagnostics(frames=1, max_snapshots=2)
+    monkeypatch.setattr(debug, "memory_diagnostics", memory_diagnostics)
+    yield memory_diagnostics
+    memory_diagnostics.stop()
+    leaked.clear()
+
+
+class TestMemoryDiagnostics:
+    """Тесты для MemoryDiagnostics."""
+
+    def test_off_by_default(self, diagnostics: MemoryDiagnostics) -> None:
+        """Тест что без start трассировка выключена, а снимок снять нельзя."""
+        assert not diagnostics.tracing
+        assert diagnostics.status()["traced_bytes"] == 0
+        with pytest.raises(RuntimeError):
+            diagnostics.take_snapshot("before")
+
+    def test_diff_points_to_allocating_line(self, diagnostics: MemoryDiagnostics) -> None:
+        """Тест что наибольший прирост памяти указывает на строку, которая ее выделила."""
+        diagnostics.start()
+        diagnostics.take_snapshot("before")
+        leak(2000)
+        diagnostics.take_snapshot("after")
+
+        [top] = diagnostics.compare("before", "after", limit=1)
+
+        assert "test_memory_diagnostics.py" in top["location"]
+        assert top["size_diff_bytes"] >= 2000 * 1024
+        assert top["count_diff"] >= 2000
+
+        [by_module] = diagnostics.compare("before", "after", group_by="filename", limit=1)
+        assert by_module["location"].split(":")[0].endswith("test_memory_diagnostics.py")
+
+    def test_old_snapshots_are_dropped(self, diagnostics: MemoryDiagnostics) -> None:
+        """Тест что хранится не больше max_snapshots снимков."""
+        diagnostics.start()
+        for name in ("a", "b", "c"):
+            diagnostics.take_snapshot(name)
+
+        assert diagnostics.status()["snapshots"] == ["b", "c"]
+        with pytest.raises(KeyError):
+            diagnostics.compare("a")
+
+    def test_text_report_includes_sizes(self) -> None:
+        """Тест текстового отчета с размерами кэшей и очередей."""
+        differences = [{"location": "app/x.py:10", "size_diff_bytes": 2048, "size_bytes": 4096, "count_diff": 3, "count": 5}]
+
+        report = format_differences(differences, {"lead_cache": 7})
+
+        assert "+2.0 KiB" in report
+        assert "app/x.py:10" in report
+        assert "lead_cache: 7" in report
+
+
+class TestSizes:
+    """Тесты для размеров внутренних структур в метриках."""
+
+    def test_sizes_are_reported_and_rendered(self) -> None:
+        """Тест что размер выдается в sizes() и как показатель internal_size."""
+        registry = Metrics()
+        cache: dict[int, int] = {1: 1, 2: 2}
+        registry.size("lead_cache", lambda: len(cache))
+
+        assert registry.sizes() == {"lead_cache": 2}
+        assert 'internal_size{component="lead_cache"} 2' in registry.render()
+
+
+class TestMemoryEndpoints:
+    """Тесты для endpoint /debug/memory."""
+
+    async def test_snapshot_and_diff(self, diagnostics: MemoryDiagnostics, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест снимков и разницы через API в JSON и тексте."""
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+        app = FastAPI()
+        app.include_router(debug.router)
+        headers = {"X-Admin-Token": "secret"}
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", headers=headers) as client:
+            assert (await client.post("/debug/memory/snapshots/before")).status_code == 409
+
+            assert (await client.post("/debug/memory/start")).json()["tracing"] is True
+            assert (await client.post("/debug/memory/snapshots/before")).status_code == 200
+            leak(500)
+
+            as_json = await client.get("/debug/memory/diff", params={"base": "before"})
+            as_text = await client.get("/debug/memory/diff", params={"base": "before", "output": "text"})
+            missing = await client.get("/debug/memory/diff", params={"base": "missing"})
+
+            assert (await client.post("/debug/memory/stop")).json()["tracing"] is False
+
+        assert as_json.json()["differences"]
+        assert "lead_cache" in as_json.json()["sizes"]
+        assert "KiB" in as_text.text
+        assert missing.status_code == 404
+        assert not tracemalloc.is_tracing()
@@ -0,0 +1,309 @@
+"""Тесты для распределения webhook по узлам кластера."""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import httpx
+import pytest
+
+from app.services import partition
+from app.services.admission import AdmissionRejectedError
+from app.services.hash_ring import HashRing
+from app.services.partition import FORWARDED_HEADER, SIGNATURE_HEADER, PartitionRouter
+
+NODES = ["http://node-a:8000", "http://node-b:8000", "http://node-c:8000"]
+
+
+def make_router(self_url: str = NODES[0]) -> PartitionRouter:
+    """Создать маршрутизатор узла кластера из трех узлов."""
+    return PartitionRouter(self_url, NODES, vnodes=64, heartbeat=0.1, forward_timeout=1.0, secret="cluster-secret")
+
+
+class TestHashRing:
+    """Тесты для HashRing."""
+
+    def test_keys_spread_over_nodes(self) -> None:
+        """Тест что ключи распределяются по всем узлам примерно поровну."""
+        ring = HashRing(NODES)
+        owners = Counter(ring.owner(lead_id) for lead_id in range(3000))
+
+        assert set(owners) == set(NODES)
+        assert min(owners.values()) > 600
+
+    def test_removing_node_moves_only_its_keys(self) -> None:
+        """Тест что при удалении узла меняют владельца только его ключи."""
+        ring = HashRing(NODES)
+        before = {lead_id: ring.owner(lead_id) for lead_id in range(1000)}
+
+        assert ring.set_nodes(NODES[:2])
+        after = {lead_id: ring.owner(lead_id) for lead_id in range(1000)}
+
+        moved = [lead_id for lead_id in before if before[lead_id] != after[lead_id]]
+        assert all(before[lead_id] == NODES[2] for lead_id in moved)
+
+    def test_owner_is_stable_across_instances(self) -> None:
+        """Тест что владелец не зависит от порядка узлов и экземпляра кольца."""
+        assert HashRing(NODES).owner(38743359) == HashRing(reversed(NODES)).owner(38743359)
+
+    def test_empty_ring(self) -> None:
+        """Тест что у пустого кольца нет владельцев."""
+        assert HashRing().owner(1) is None
+
+
+class TestPartitionRouter:
+    """Тесты для PartitionRouter."""
+
+    @staticmethod
+    def remote_lead(router: PartitionRouter) -> int:
+        """Найти сделку, принадлежащую другому узлу."""
+        return next(lead_id for lead_id in range(1000) if not router.is_local(lead_id))
+
+    @staticmethod
+    def mock_peers(monkeypatch: pytest.MonkeyPatch, handler: Any) -> None:
+        """Подменить HTTP-клиент узлов."""
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(partition, "get_http_client", lambda base_url: client)
+
+    def test_disabled_without_peers(self) -> None:
+        """Тест что без других узлов все сделки обрабатываются локально."""
+        router = PartitionRouter(
+            "http://node-a:8000", ["http://node-a:8000"], vnodes=8, heartbeat=1, forward_timeout=1, secret="cluster-secret"
+        )
+
+        assert not router.enabled
+        assert router.is_local(1)
+
+    def test_disabled_without_secret(self) -> None:
+        """Тест что без секрета кластера распределение выключено: пересылки нечем подписать."""
+        router = PartitionRouter("http://node-a:8000", NODES, vnodes=8, heartbeat=1, forward_timeout=1, secret="")
+
+        assert not router.enabled
+
+    def test_forwarded_header_requires_signature(self) -> None:
+        """Тест что заголовку пересылки верят только с подписью узла с тем же секретом."""
+        sender, receiver = make_router(NODES[1]), make_router()
+        headers = {FORWARDED_HEADER: NODES[1], SIGNATURE_HEADER: sender._signature(NODES[1], b"catalogs=1")}
+
+        assert receiver.is_forwarded(headers, b"catalogs=1")
+        assert not receiver.is_forwarded({FORWARDED_HEADER: NODES[1]}, b"catalogs=1")
+        assert not receiver.is_forwarded(headers, b"catalogs=2")
+        assert not receiver.is_forwarded({}, b"catalogs=1")
+
+    async def test_forward_to_owner(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что webhook чужой сделки пересылается владельцу с пометкой."""
+        router = make_router()
+        lead_id = self.remote_lead(router)
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={"status": "success", "lead_id": str(lead_id)})
+
+        self.mock_peers(monkeypatch, handler)
+
+        result = await router.forward(b"catalogs=1", lead_id)
+
+        assert result == {"status": "success", "lead_id": str(lead_id)}
+        assert str(seen[0].url).startswith(router.owner(lead_id))
+        assert seen[0].headers[FORWARDED_HEADER] == NODES[0]
+        assert seen[0].content == b"catalogs=1"
+        assert make_router(router.owner(lead_id)).is_forwarded(seen[0].headers, seen[0].content)
+
+    async def test_local_lead_is_not_forwarded(self) -> None:
+        """Тест что своя сделка не пересылается."""
+        router = make_router()
+        lead_id = next(lead_id for lead_id in range(1000) if router.is_local(lead_id))
+
+        assert await router.forward(b"", lead_id) is None
+
+    async def test_unreachable_owner_falls_back_to_local(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при недоступном владельце webhook обрабатывается локально."""
+        router = make_router()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ConnectError("connection refused", request=request)
+
+        self.mock_peers(monkeypatch, handler)
+
+        assert await router.forward(b"", self.remote_lead(router)) is None
+
+    async def test_owner_timeout_is_not_processed_here(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при таймауте ответа владельца (он мог начать обработку) webhook отклоняется с 503, а не обрабатывается здесь."""
+        router = make_router()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        self.mock_peers(monkeypatch, handler)
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await router.forward(b"", self.remote_lead(router))
+
+        assert exc_info.value.reason == "owner_unavailable"
+
+    async def test_owner_error_is_not_processed_here(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что ошибка владельца передается amoCRM как 503 для повтора, а не обрабатывается здесь второй раз."""
+        router = make_router()
+        self.mock_peers(monkeypatch, lambda request: httpx.Response(500))
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await router.forward(b"", self.remote_lead(router))
+
+        assert exc_info.value.reason == "owner_failed"
+
+    async def test_overloaded_owner(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что перегрузка владельца передается amoCRM как 503 с Retry-After."""
+        router = make_router()
+        self.mock_peers(monkeypatch, lambda request: httpx.Response(503, headers={"Retry-After": "9"}))
+
+        with pytest.raises(AdmissionRejectedError) as exc_info:
+            await router.forward(b"", self.remote_lead(router))
+
+        assert exc_info.value.retry_after == 9
+
+    async def test_draining_node_leaves_ring(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что узел, который останавливается (/health 200, /ready 503), убирается из кольца."""
+        router = make_router()
+        draining = NODES[2]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if str(request.url).startswith(draining) and request.url.path == "/ready":
+                return httpx.Response(503)
+            return httpx.Response(200)
+
+        self.mock_peers(monkeypatch, handler)
+
+        await router.check_members()
+
+        assert router.ring.nodes == NODES[:2]
+
+    async def test_dead_node_leaves_ring(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что недоступный узел убирается из кольца, а его сделки переходят живым."""
+        router = make_router()
+        dead = NODES[2]
+        self.mock_peers(monkeypatch, lambda request: httpx.Response(503 if str(request.url).startswith(dead) else 200))
+
+        await router.check_members()
+
+        assert router.ring.nodes == NODES[:2]
+        assert all(router.owner(lead_id) != dead for lead_id in range(1000))
+
+
+def free_port() -> int:
+    """Найти свободный локальный порт."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def wait_for(condition: Any, timeout: float = 15.0) -> None:
+    """Дождаться выполнения условия."""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            if condition():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+
+    raise AssertionError("Условие не выполнилось за отведенное время")
+
+
+class UpstreamStub(BaseHTTPRequestHandler):
+    """amoCRM и платформа для проверки готовности узлов: на любой запрос - данные аккаунта."""
+
+    def do_GET(self) -> None:  # noqa: N802
+        body = b'{"id": 1}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+
+class TestLocalCluster:
+    """Кластер из нескольких локальных процессов сервиса."""
+
+    @pytest.fixture
+    def upstream(self) -> Iterator[str]:
+        """Запустить заглушку amoCRM и платформы, чтобы узлы прошли проверку готовности."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamStub)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_address[1]}"
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @pytest.fixture
+    def nodes(self, tmp_path: Any, upstream: str) -> Iterator[tuple[list[str], list[subprocess.Popen[bytes]]]]:
+        """Запустить три узла сервиса на свободных портах."""
+        pytest.importorskip("uvicorn")
+        ports = [free_port() for _ in range(3)]
+        urls = [f"http://127.0.0.1:{port}" for port in ports]
+        processes = []
+        for port, url in zip(ports, urls):
+            env = {
+                **os.environ,
+                "CLUSTER_SELF_URL": url,
+                "CLUSTER_NODES": ",".join(urls),
+                "CLUSTER_HEARTBEAT_SECONDS": "0.2",
+                "CLUSTER_SECRET": "cluster-secret",
+                "AMO_BASE_URL": upstream,
+                "PLATFORM_URL": upstream,
+                "DATA_DIR": str(tmp_path / str(port)),
+            }
+            processes.append(
+                subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            )
+
+        try:
+            yield urls, processes
+        finally:
+            for process in processes:
+                process.kill()
+                process.wait()
+
+    def test_nodes_agree_on_owner_and_rebalance(self, nodes: tuple[list[str], list[subprocess.Popen[bytes]]]) -> None:
+        """Тест что узлы одинаково выбирают владельца и перестраивают кольцо при падении узла."""
+        urls, processes = nodes
+
+        with httpx.Client(timeout=1) as client:
+
+            def members(url: str) -> list[str]:
+                return list(client.get(f"{url}/cluster").json()["members"])
+
+            def owners(url: str, leads: range) -> list[str]:
+                return [client.get(f"{url}/cluster", params={"lead_id": lead_id}).json()["owner"] for lead_id in leads]
+
+            wait_for(lambda: all(members(url) == sorted(urls) for url in urls))
+            assert owners(urls[0], range(20)) == owners(urls[1], range(20)) == owners(urls[2], range(20))
+
+            processes[2].kill()
+            processes[2].wait()
+
+            wait_for(lambda: all(members(url) == sorted(urls[:2]) for url in urls[:2]))
+            assert urls[2] not in owners(urls[0], range(50))
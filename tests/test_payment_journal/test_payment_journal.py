@@ -0,0 +1,252 @@
+"""Тесты для журнала исходов webhook и поиска платежей."""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import amo_webhook, payments
+from app.models.payment import PaymentEvent
+from app.services import payment_journal as payment_journal_module
+from app.services import webhook_processor
+from app.services.delivery_log import DeliveryLog
+from app.services.payment_journal import PaymentJournal
+from app.services.tenants import TenantRegistry
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import base_settings, settings
+from tests.test_fast_filter.test_fast_filter import build_catalog_body
+
+
+def make_event(catalog_element_id: int = 501, lead_id: int = 42) -> PaymentEvent:
+    """Создать оплаченный счет."""
+    return PaymentEvent(catalog_element_id=catalog_element_id, lead_id=lead_id, amount=5000, items=[], event_type="update")
+
+
+@pytest.fixture
+async def journal(tmp_path: Path) -> PaymentJournal:
+    """Журнал во временной директории."""
+    payment_journal = PaymentJournal(tmp_path / "journal.sqlite3", batch_size=2, flush_interval=0.05, max_buffer=100)
+    yield payment_journal
+    await payment_journal.stop()
+
+
+class TestPaymentJournal:
+    """Тесты для PaymentJournal."""
+
+    async def test_record_does_not_write_synchronously(self, journal: PaymentJournal) -> None:
+        """Тест что запись только попадает в буфер, а на диск пишется фоновой задачей."""
+        journal.start()
+        journal.record("success", event=make_event(), email="a@example.com", order_id="order-1")
+
+        assert journal.buffered == 1
+
+        await asyncio.sleep(0.15)
+
+        assert journal.buffered == 0
+        history = await journal.by_catalog_element(501)
+        assert [(row["outcome"], row["order_id"], row["email"]) for row in history] == [("success", "order-1", "a@example.com")]
+
+    async def test_full_batch_is_written_without_waiting_interval(self, tmp_path: Path) -> None:
+        """Тест что заполненная пачка пишется сразу, не дожидаясь flush_interval."""
+        journal = PaymentJournal(tmp_path / "journal.sqlite3", batch_size=2, flush_interval=60, max_buffer=100)
+        journal.start()
+        journal.record("ignored", reason="not_paid", lead_id=1)
+        journal.record("ignored", reason="not_paid", lead_id=2)
+
+        await asyncio.sleep(0.05)
+
+        assert journal.buffered == 0
+        await journal.stop()
+
+    async def test_history_is_newest_first(self, journal: PaymentJournal) -> None:
+        """Тест что история счета возвращается от новых записей к старым."""
+        event = make_event()
+        journal.record("failed", reason="HTTPStatusError", event=event, error="503")
+        journal.record("success", event=event, order_id="order-1")
+        journal.record("success", event=make_event(catalog_element_id=502), order_id="order-2")
+
+        history = await journal.by_catalog_element(501)
+
+        assert [row["outcome"] for row in history] == ["success", "failed"]
+
+    async def test_search_filters(self, journal: PaymentJournal) -> None:
+        """Тест поиска по интервалу времени, сделке, email и исходу."""
+        journal.record("success", event=make_event(lead_id=1), email="a@example.com", order_id="o1")
+        journal.record("success", event=make_event(catalog_element_id=502, lead_id=2), email="b@example.com")
+        journal.record("ignored", reason="not_paid", lead_id=1)
+
+        now = time.time()
+        assert len(await journal.search(now - 60, now + 1)) == 3
+        assert len(await journal.search(now - 60, now + 1, lead_id=1)) == 2
+        assert len(await journal.search(now - 60, now + 1, lead_id=1, outcome="success")) == 1
+        assert [row["lead_id"] for row in await journal.search(now - 60, now + 1, email="b@example.com")] == [2]
+        assert await journal.search(now + 1, now + 60) == []
+        assert len(await journal.search(now - 60, now + 1, limit=1)) == 1
+
+    async def test_buffer_is_bounded(self, tmp_path: Path) -> None:
+        """Тест что без записи на диск буфер не растет больше max_buffer."""
+        journal = PaymentJournal(tmp_path / "journal.sqlite3", batch_size=100, flush_interval=60, max_buffer=3)
+        for lead_id in range(5):
+            journal.record("ignored", reason="not_paid", lead_id=lead_id)
+
+        assert journal.buffered == 3
+        await journal.stop()
+
+    async def test_history_is_per_tenant(self, journal: PaymentJournal, tmp_path: Path) -> None:
+        """Тест что история счета ищется только в текущем аккаунте: ID элементов разных аккаунтов совпадают."""
+        (tmp_path / "acme.env").write_text("AMO_BASE_URL=https://acme.amocrm.ru\n", encoding="utf-8")
+        registry = TenantRegistry(tmp_path, base=base_settings)
+        journal.record("success", event=make_event(), order_id="main-order")
+        with registry.activate("acme"):
+            journal.record("failed", event=make_event(), error="acme error")
+
+        assert [row["order_id"] for row in await journal.by_catalog_element(501)] == ["main-order"]
+        with registry.activate("acme"):
+            assert [row["error"] for row in await journal.by_catalog_element(501)] == ["acme error"]
+
+    async def test_old_records_are_pruned(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что при записи удаляются записи старше срока хранения."""
+        monkeypatch.setattr(payment_journal_module, "_PRUNE_INTERVAL", 0)
+        journal = PaymentJournal(tmp_path / "journal.sqlite3", batch_size=100, flush_interval=60, max_buffer=100, retention=60)
+        journal.record("ignored", reason="not_paid", lead_id=1)
+        journal._buffer[0] = (time.time() - 120, *journal._buffer[0][1:])
+        journal.record("ignored", reason="not_paid", lead_id=2)
+        await journal.flush()
+
+        journal.record("ignored", reason="not_paid", lead_id=3)
+        now = time.time()
+
+        assert [row["lead_id"] for row in await journal.search(now - 3600, now + 1)] == [3, 2]
+        await journal.stop()
+
+
+class TestProcessorJournal:
+    """Тесты записи исходов обработки платежа."""
+
+    @pytest.fixture(autouse=True)
+    def isolate(self, journal: PaymentJournal, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Журналы во временной директории."""
+        monkeypatch.setattr(webhook_processor, "payment_journal", journal)
+        monkeypatch.setattr(webhook_processor, "delivery_log", DeliveryLog(tmp_path / "payments.sqlite3"))
+
+    async def test_success_records_email_and_order_id(self, journal: PaymentJournal, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что успешная доставка записывается с email клиента и order_id платформы."""
+
+        async def process(self: CatalogWebhookProcessor, **kwargs: Any) -> tuple[dict[str, str], dict[str, Any]]:
+            return {"order_id": "order-7"}, {"contact_email": "client@example.com"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "_process_payment", process)
+
+        await CatalogWebhookProcessor().process_payment_event(make_event())
+
+        [row] = await journal.by_catalog_element(501)
+        assert (row["outcome"], row["lead_id"], row["email"], row["order_id"], row["amount"]) == (
+            "success",
+            42,
+            "client@example.com",
+            "order-7",
+            5000,
+        )
+
+    async def test_failure_is_recorded(self, journal: PaymentJournal, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что ошибка обработки записывается и пробрасывается дальше."""
+
+        async def process(self: CatalogWebhookProcessor, **kwargs: Any) -> tuple[dict[str, str], dict[str, Any]]:
+            raise RuntimeError("platform down")
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "_process_payment", process)
+
+        with pytest.raises(RuntimeError):
+            await CatalogWebhookProcessor().process_payment_event(make_event())
+
+        [row] = await journal.by_catalog_element(501)
+        assert (row["outcome"], row["reason"], row["error"]) == ("failed", "RuntimeError", "platform down")
+
+    async def test_already_delivered_is_not_sent_again(self, journal: PaymentJournal, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что счет, уже записанный в журнале доставок, не отправляется на платформу повторно."""
+        calls: list[int] = []
+
+        async def process(self: CatalogWebhookProcessor, **kwargs: Any) -> tuple[dict[str, str], dict[str, Any]]:
+            calls.append(kwargs["lead_id"])
+            await asyncio.sleep(0.01)
+            return {"order_id": "order-7"}, {}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "_process_payment", process)
+        processor = CatalogWebhookProcessor()
+
+        results = await asyncio.gather(
+            processor.process_payment_event(make_event()), processor.process_payment_event(make_event())
+        )
+
+        assert calls == [42]
+        assert [result["status"] for result in results] == ["success", "ignored"]
+        assert results[1]["reason"] == "already_delivered"
+
+
+class TestPaymentsApi:
+    """Тесты для endpoint поиска платежей."""
+
+    @pytest.fixture
+    async def client(self, journal: PaymentJournal, monkeypatch: pytest.MonkeyPatch) -> httpx.AsyncClient:
+        """Клиент приложения с журналом во временной директории."""
+        monkeypatch.setattr(payments, "payment_journal", journal)
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+        app = FastAPI()
+        app.include_router(payments.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+    async def test_requires_admin_token(self, client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что без верного токена поиск недоступен, а без ADMIN_TOKEN endpoint выключен."""
+        assert (await client.get("/amo/payments/501")).status_code == 403
+        assert (await client.get("/amo/payments/501", headers={"X-Admin-Token": "wrong"})).status_code == 403
+
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+        assert (await client.get("/amo/payments/501", headers={"X-Admin-Token": ""})).status_code == 404
+
+    async def test_payment_status(self, client: httpx.AsyncClient, journal: PaymentJournal) -> None:
+        """Тест статуса платежа по ID элемента каталога."""
+        journal.record("success", event=make_event(), order_id="order-1")
+
+        response = await client.get("/amo/payments/501", headers={"X-Admin-Token": "secret"})
+        unknown = await client.get("/amo/payments/999", headers={"X-Admin-Token": "secret"})
+
+        assert response.json()["status"] == "success"
+        assert response.json()["history"][0]["order_id"] == "order-1"
+        assert unknown.json() == {"catalog_element_id": 999, "status": "unknown", "history": []}
+
+    async def test_payment_status_of_unknown_tenant(self, client: httpx.AsyncClient) -> None:
+        """Тест что статус платежа в не настроенном аккаунте - 404."""
+        response = await client.get("/amo/payments/501", params={"tenant": "unknown"}, headers={"X-Admin-Token": "secret"})
+
+        assert response.status_code == 404
+
+    async def test_ignored_webhook_is_found_by_catalog_element(
+        self, client: httpx.AsyncClient, journal: PaymentJournal, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Тест что отсеянный без парсинга неоплаченный счет виден в истории счета."""
+        monkeypatch.setattr(amo_webhook, "payment_journal", journal)
+        monkeypatch.setattr(amo_webhook, "_prefetch_lead", lambda raw_body: None)
+        webhook_app = FastAPI()
+        webhook_app.include_router(amo_webhook.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=webhook_app), base_url="http://test") as webhook:
+            await webhook.post("/amo/webhook/handle", content=build_catalog_body())
+
+        response = await client.get("/amo/payments/812345", headers={"X-Admin-Token": "secret"})
+
+        assert response.json()["status"] == "ignored"
+        assert response.json()["history"][0]["reason"] == "not_paid"
+
+    async def test_search_by_email(self, client: httpx.AsyncClient, journal: PaymentJournal) -> None:
+        """Тест поиска платежей клиента за последние сутки."""
+        journal.record("success", event=make_event(), email="a@example.com")
+        journal.record("success", event=make_event(catalog_element_id=502), email="b@example.com")
+
+        response = await client.get("/amo/payments", params={"email": "a@example.com"}, headers={"X-Admin-Token": "secret"})
+
+        assert response.json()["count"] == 1
+        assert response.json()["records"][0]["catalog_element_id"] == 501
@@ -0,0 +1,110 @@
+"""Тесты для предзагрузки сделок при создании неоплаченного счета."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app.services.amocrm_client import AmoCRMClient
+from app.services.lead_cache import LeadCache
+from app.services.prefetcher import LeadPrefetcher
+
+LEAD_AND_CONTACT = {"lead": {"id": 1}, "contact": {"id": 2}}
+
+
+class TestLeadCache:
+    """Тесты для LeadCache."""
+
+    def test_pop_returns_entry_once(self) -> None:
+        """Тест что запись забирается из кэша один раз."""
+        cache = LeadCache(ttl=60, max_size=10)
+        cache.put(1, LEAD_AND_CONTACT)
+
+        assert cache.pop(1) == LEAD_AND_CONTACT
+        assert cache.pop(1) is None
+
+    def test_expired_entry_is_ignored(self) -> None:
+        """Тест что устаревшая запись не используется."""
+        cache = LeadCache(ttl=-1, max_size=10)
+        cache.put(1, LEAD_AND_CONTACT)
+
+        assert 1 not in cache
+        assert cache.pop(1) is None
+
+    def test_oldest_entry_is_evicted(self) -> None:
+        """Тест что при переполнении вытесняется самая старая запись."""
+        cache = LeadCache(ttl=60, max_size=2)
+        for lead_id in (1, 2, 3):
+            cache.put(lead_id, LEAD_AND_CONTACT)
+
+        assert len(cache) == 2
+        assert 1 not in cache
+
+
+class TestLeadPrefetcher:
+    """Тесты для LeadPrefetcher."""
+
+    @pytest.fixture
+    def fetched(self, monkeypatch: pytest.MonkeyPatch) -> list[tuple[int, bool]]:
+        """Подменить загрузку сделки из amoCRM."""
+        fetched: list[tuple[int, bool]] = []
+
+        async def get_lead_with_contact(
+            self: AmoCRMClient, lead_id: int, deadline: Any = None, low_priority: bool = False
+        ) -> dict[str, Any]:
+            fetched.append((lead_id, low_priority))
+            await asyncio.sleep(0)
+            return LEAD_AND_CONTACT
+
+        monkeypatch.setattr(AmoCRMClient, "get_lead_with_contact", get_lead_with_contact)
+        return fetched
+
+    async def test_prefetch_fills_cache_with_low_priority(self, fetched: list[tuple[int, bool]]) -> None:
+        """Тест что предзагрузка кладет сделку в кэш и идет с низким приоритетом."""
+        cache = LeadCache(ttl=60, max_size=10)
+        prefetcher = LeadPrefetcher(cache, concurrency=1, max_pending=10)
+
+        assert prefetcher.schedule(1)
+        assert not prefetcher.schedule(1)
+        await asyncio.sleep(0.01)
+
+        assert fetched == [(1, True)]
+        assert cache.pop(1) == LEAD_AND_CONTACT
+        assert prefetcher.pending_count == 0
+
+    async def test_update_refreshes_cached_lead(self, fetched: list[tuple[int, bool]]) -> None:
+        """Тест что новое изменение счета сбрасывает сделку в кэше и загружает ее заново."""
+        cache = LeadCache(ttl=60, max_size=10)
+        prefetcher = LeadPrefetcher(cache, concurrency=1, max_pending=10)
+        prefetcher.schedule(1)
+        await asyncio.sleep(0.01)
+
+        assert prefetcher.schedule(1)
+        assert 1 not in cache
+        await asyncio.sleep(0.01)
+
+        assert fetched == [(1, True), (1, True)]
+        assert 1 in cache
+
+    async def test_update_during_prefetch_fetches_again(self, fetched: list[tuple[int, bool]]) -> None:
+        """Тест что изменение во время загрузки не оставляет в кэше данные, прочитанные до него."""
+        cache = LeadCache(ttl=60, max_size=10)
+        prefetcher = LeadPrefetcher(cache, concurrency=1, max_pending=10)
+        prefetcher.schedule(1)
+        await asyncio.sleep(0)
+
+        assert not prefetcher.schedule(1)
+        await asyncio.sleep(0.01)
+
+        assert fetched == [(1, True), (1, True)]
+        assert 1 in cache
+        assert prefetcher.pending_count == 0
+
+    async def test_pending_limit(self, fetched: list[tuple[int, bool]]) -> None:
+        """Тест что сверх max_pending предзагрузки отбрасываются."""
+        prefetcher = LeadPrefetcher(LeadCache(ttl=60, max_size=10), concurrency=1, max_pending=1)
+
+        assert prefetcher.schedule(1)
+        assert not prefetcher.schedule(2)
+
+        await prefetcher.stop()
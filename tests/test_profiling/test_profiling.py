@@ -0,0 +1,85 @@
+"""Тесты для профилирования выбранных webhook."""
+
+import asyncio
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import debug
+from app.services import profiling
+from app.services.profiling import PROFILE_HEADER, RequestProfiler
+from app.settings import settings
+
+
+def busy_loop(seconds: float) -> None:
+    """Занять поток event loop синхронной работой."""
+    until = time.monotonic() + seconds
+    while time.monotonic() < until:
+        pass
+
+
+class TestRequestProfiler:
+    """Тесты для RequestProfiler."""
+
+    def test_armed_requests_are_selected(self, tmp_path: Path) -> None:
+        """Тест что взведенный профилировщик выбирает ровно N следующих запросов."""
+        profiler = RequestProfiler(tmp_path, interval=0.001)
+        profiler.arm(2)
+
+        assert [profiler.should_profile({}) for _ in range(3)] == [True, True, False]
+        assert profiler.armed == 0
+
+    def test_header_requires_admin_token(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что заголовок выбирает запрос только при совпадении с ADMIN_TOKEN."""
+        profiler = RequestProfiler(tmp_path, interval=0.001)
+
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+        assert not profiler.should_profile({PROFILE_HEADER: ""})
+
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+        assert profiler.should_profile({PROFILE_HEADER: "secret"})
+        assert not profiler.should_profile({PROFILE_HEADER: "wrong"})
+        assert not profiler.should_profile({})
+
+    async def test_report_has_running_and_waiting_stacks(self, tmp_path: Path) -> None:
+        """Тест что отчет содержит и синхронную работу, и ожидание в await."""
+        profiler = RequestProfiler(tmp_path, interval=0.001)
+
+        async def handle() -> None:
+            busy_loop(0.05)
+            await asyncio.sleep(0.05)
+
+        async with profiler.profile("webhook"):
+            await handle()
+
+        [report] = tmp_path.glob("webhook-*.folded")
+        lines = report.read_text(encoding="utf-8").splitlines()
+        stacks = [line.rsplit(" ", 1)[0] for line in lines]
+
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert any(stack.split(";")[-1].startswith("busy_loop ") for stack in stacks)
+        assert any("handle" in stack and "[await" in stack for stack in stacks)
+
+
+class TestProfileEndpoint:
+    """Тесты для POST /debug/profile."""
+
+    async def test_arm_requires_admin_token(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что взвести профилировщик можно только с токеном администратора."""
+        profiler = RequestProfiler(tmp_path, interval=0.001)
+        monkeypatch.setattr(debug, "request_profiler", profiler)
+        monkeypatch.setattr(profiling, "request_profiler", profiler)
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+        app = FastAPI()
+        app.include_router(debug.router)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            denied = await client.post("/debug/profile", params={"count": 3})
+            allowed = await client.post("/debug/profile", params={"count": 3}, headers={"X-Admin-Token": "secret"})
+
+        assert denied.status_code == 403
+        assert allowed.json()["armed"] == 3
+        assert profiler.armed == 3
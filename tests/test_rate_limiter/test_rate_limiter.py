@@ -0,0 +1,65 @@
+"""Тесты для ограничения частоты запросов к amoCRM."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limiter import RateLimiter, get_rate_limiter
+
+
+class TestRateLimiter:
+    """Тесты для RateLimiter."""
+
+    async def test_burst_is_not_delayed(self) -> None:
+        """Тест что запросы в пределах всплеска проходят сразу."""
+        limiter = RateLimiter(rate=10.0, burst=3)
+        started = time.monotonic()
+
+        for _ in range(3):
+            await limiter.acquire()
+
+        assert time.monotonic() - started < 0.05
+
+    async def test_requests_over_burst_wait_for_tokens(self) -> None:
+        """Тест что запросы сверх всплеска ждут по 1/rate секунды."""
+        limiter = RateLimiter(rate=20.0, burst=1)
+        started = time.monotonic()
+
+        for _ in range(3):
+            await limiter.acquire()
+
+        assert time.monotonic() - started >= 0.09
+
+    async def test_low_priority_keeps_reserve(self) -> None:
+        """Тест что фоновый запрос не забирает зарезервированные токены."""
+        limiter = RateLimiter(rate=1.0, burst=3, low_priority_reserve=2)
+
+        await limiter.acquire(low_priority=True)
+
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(limiter.acquire(low_priority=True), timeout=0.05)
+
+        await limiter.acquire()
+        await limiter.acquire()
+
+    async def test_low_priority_yields_to_regular(self) -> None:
+        """Тест что ожидающий обычный запрос получает токен раньше фонового."""
+        limiter = RateLimiter(rate=50.0, burst=1)
+        await limiter.acquire()
+        order: list[str] = []
+
+        async def acquire(name: str, low_priority: bool) -> None:
+            await limiter.acquire(low_priority=low_priority)
+            order.append(name)
+
+        background = asyncio.create_task(acquire("low", True))
+        await asyncio.sleep(0)
+        await asyncio.gather(acquire("regular", False), background)
+
+        assert order == ["regular", "low"]
+
+    def test_limiter_is_shared_per_account(self) -> None:
+        """Тест что у одного аккаунта amoCRM общий ограничитель."""
+        assert get_rate_limiter("https://a.amocrm.ru") is get_rate_limiter("https://a.amocrm.ru")
+        assert get_rate_limiter("https://a.amocrm.ru") is not get_rate_limiter("https://b.amocrm.ru")
@@ -0,0 +1,81 @@
+"""Тесты для проверки готовности сервиса."""
+
+from typing import Any
+
+import pytest
+
+from app.config.subject_mapping import get_subject_mapping
+from app.services.readiness import ReadinessProbe
+
+
+async def _ok() -> dict[str, Any]:
+    return {}
+
+
+async def _fail() -> dict[str, Any]:
+    raise ConnectionError("connection refused")
+
+
+class TestReadinessProbe:
+    """Тесты для ReadinessProbe."""
+
+    def test_not_ready_before_first_check(self) -> None:
+        """Тест что до первой проверки сервис не готов."""
+        probe = ReadinessProbe()
+
+        assert probe.is_ready is False
+        assert probe.snapshot()["status"] == "not_ready"
+
+    async def test_ready_when_all_checks_pass(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что сервис готов, когда все проверки прошли."""
+        probe = ReadinessProbe()
+        for name in ("_resolve_dns", "_load_mappings", "_warm_platform", "_validate_amo_token"):
+            monkeypatch.setattr(probe, name, _ok)
+
+        assert await probe.check() is True
+        assert probe.snapshot()["status"] == "ready"
+
+    async def test_not_ready_when_amo_check_fails(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что падение одной проверки делает сервис неготовым."""
+        probe = ReadinessProbe()
+        for name in ("_resolve_dns", "_load_mappings", "_warm_platform"):
+            monkeypatch.setattr(probe, name, _ok)
+        monkeypatch.setattr(probe, "_validate_amo_token", _fail)
+
+        assert await probe.check() is False
+
+        snapshot = probe.snapshot()
+        assert snapshot["status"] == "not_ready"
+        assert snapshot["checks"]["amocrm"] == {"ok": False, "error": "connection refused"}
+
+    async def test_stays_ready_when_upstream_fails_after_start(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что после успешного запуска сбой amoCRM меняет только состояние внешних сервисов."""
+        probe = ReadinessProbe()
+        for name in ("_resolve_dns", "_load_mappings", "_warm_platform", "_validate_amo_token"):
+            monkeypatch.setattr(probe, name, _ok)
+        assert await probe.check() is True
+
+        monkeypatch.setattr(probe, "_validate_amo_token", _fail)
+
+        assert await probe.check() is False
+        assert probe.is_ready is True
+        assert probe.snapshot()["status"] == "ready"
+        assert probe.upstream_status() == "degraded"
+
+    async def test_withdrawn_stays_not_ready(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что после снятия с балансировки (SIGTERM) успешная проверка не возвращает готовность."""
+        probe = ReadinessProbe()
+        for name in ("_resolve_dns", "_load_mappings", "_warm_platform", "_validate_amo_token"):
+            monkeypatch.setattr(probe, name, _ok)
+        assert await probe.check() is True
+
+        probe.withdraw()
+
+        assert await probe.check() is True
+        assert probe.is_ready is False
+
+    async def test_mappings_check_reports_sizes(self) -> None:
+        """Тест что проверка таблиц маппинга возвращает их размеры."""
+        result = await ReadinessProbe()._load_mappings()
+
+        assert result["sizes"]["subjects"] == len(get_subject_mapping())
@@ -0,0 +1,254 @@
+"""Тесты для сверки оплаченных счетов с журналом доставок."""
+
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.models.payment import PaymentEvent
+from app.services.amocrm_client import AmoCRMClient
+from app.services.delivery_log import DeliveryLog
+from app.services.partition import PartitionRouter
+from app.services import reconciler as reconciler_module
+from app.services.reconciler import Reconciler
+from app.services.retry_queue import RetryQueue
+from app.services.retry_store import RetryStore
+from app.services.webhook_processor import CatalogWebhookProcessor
+from app.settings import settings
+
+
+def make_element(element_id: int, paid: bool = True, updated_at: int | None = None) -> dict[str, Any]:
+    """Создать элемент каталога 'Счета/покупки' в формате API amoCRM."""
+    status_enum = settings.AMO_BILL_STATUS_PAID_ENUM if paid else settings.AMO_BILL_STATUS_PAID_ENUM + 1
+    return {
+        "id": element_id,
+        "updated_at": updated_at if updated_at is not None else int(time.time()) - 86400,
+        "custom_fields_values": [
+            {"field_code": "BILL_STATUS", "values": [{"value": "Оплачен", "enum_id": status_enum}]},
+            {"field_code": "LINK_TO_LEAD", "values": [{"value": f"https://egeland.amocrm.ru/leads/detail/{element_id}0"}]},
+            {"field_code": "BILL_PRICE", "values": [{"value": 12000}]},
+            {
+                "field_code": "ITEMS",
+                "values": [{"value": {"description": "Курс ЕГЭ", "unit_price": 12000, "quantity": 1}}],
+            },
+        ],
+    }
+
+
+@pytest.fixture
+def deliveries(tmp_path: Path) -> DeliveryLog:
+    """Журнал доставок во временной директории."""
+    log = DeliveryLog(tmp_path / "payments.sqlite3")
+    yield log
+    log.close()
+
+
+@pytest.fixture
+def reconciler(tmp_path: Path, deliveries: DeliveryLog) -> Reconciler:
+    """Сверка с состоянием во временной директории."""
+    return Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+
+
+class TestDeliveryLog:
+    """Тесты для DeliveryLog."""
+
+    def test_undelivered(self, deliveries: DeliveryLog) -> None:
+        """Тест что записанные доставки исключаются из недоставленных."""
+        deliveries.record(
+            PaymentEvent(event_type="api", catalog_element_id=1, lead_id=10, items=[], amount=100), {"order_id": "1"}
+        )
+
+        assert deliveries.undelivered([1, 2, 3]) == {2, 3}
+        assert deliveries.undelivered([]) == set()
+
+
+class TestLock:
+    """Тесты для аренды сверки."""
+
+    def test_lock_is_exclusive(self, tmp_path: Path, deliveries: DeliveryLog) -> None:
+        """Тест что вторая сверка не получает аренду, пока ее держит первая."""
+        first = Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+        second = Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+        second.owner = "other:1"
+
+        assert first.acquire_lock(60)
+        assert not second.acquire_lock(60)
+
+        first.release_lock()
+        assert second.acquire_lock(60)
+
+    def test_expired_lock_is_taken_over(self, tmp_path: Path, deliveries: DeliveryLog) -> None:
+        """Тест что истекшую аренду можно перехватить."""
+        first = Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+        second = Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+        second.owner = "other:1"
+
+        assert first.acquire_lock(-1)
+        assert second.acquire_lock(60)
+
+
+class TestRunOnce:
+    """Тесты для Reconciler.run_once."""
+
+    @pytest.fixture(autouse=True)
+    def catalog_id(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Задать ID каталога счетов."""
+        monkeypatch.setattr(settings, "AMO_INVOICES_CATALOG_ID", 12345)
+
+    @pytest.fixture(autouse=True)
+    def cursor(self, reconciler: Reconciler) -> None:
+        """Курсор предыдущей сверки трое суток назад."""
+        reconciler._save_state({"cursor_updated_at": int(time.time()) - 3 * 86400})
+
+    @pytest.fixture
+    def catalog(self, monkeypatch: pytest.MonkeyPatch) -> dict[int, dict[str, Any]]:
+        """Элементы каталога и события их изменения вместо запросов к amoCRM."""
+        catalog = {
+            element["id"]: element
+            for element in (
+                make_element(1),
+                make_element(2, paid=False),
+                make_element(3, updated_at=0),
+                make_element(4),
+                make_element(5),
+            )
+        }
+
+        async def make_request(self: AmoCRMClient, method: str, endpoint: str, params: Any = None) -> dict[str, Any]:
+            if endpoint == "/api/v4/events":
+                since, until = params["filter[created_at][from]"], params["filter[created_at][to]"]
+                events = [
+                    {
+                        "id": f"e{element_id}",
+                        "entity_id": element_id,
+                        "entity_type": "catalog_element",
+                        "created_at": element["updated_at"],
+                    }
+                    for element_id, element in catalog.items()
+                    if since <= element["updated_at"] <= until
+                ]
+                return {"_embedded": {"events": events}}
+
+            assert "filter[id][]" in params, "каталог не должен просматриваться целиком"
+            return {"_embedded": {"elements": [catalog[element_id] for element_id in params["filter[id][]"]]}}
+
+        monkeypatch.setattr(AmoCRMClient, "_make_request", make_request)
+        return catalog
+
+    @pytest.fixture
+    def delivered(self, deliveries: DeliveryLog, monkeypatch: pytest.MonkeyPatch) -> list[int | None]:
+        """Доставка на платформу, записывающая платеж в журнал."""
+        delivered: list[int | None] = []
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            delivered.append(event.catalog_element_id)
+            deliveries.record(event, {})
+            return {"status": "success"}
+
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        return delivered
+
+    async def test_delivers_only_missed_payments(
+        self,
+        reconciler: Reconciler,
+        deliveries: DeliveryLog,
+        catalog: dict[int, dict[str, Any]],
+        delivered: list[int | None],
+    ) -> None:
+        """Тест что доставляются только оплаченные недавние счета без записи в журнале."""
+        deliveries.record(PaymentEvent(event_type="api", catalog_element_id=5, lead_id=50, items=[], amount=12000), {})
+
+        stats = await reconciler.run_once()
+
+        assert stats is not None
+        assert sorted(delivered) == [1, 4]
+        assert stats["candidates"] == 2
+        assert stats["scanned"] == 4
+
+    async def test_second_run_finds_nothing(
+        self, reconciler: Reconciler, catalog: dict[int, dict[str, Any]], delivered: list[int | None]
+    ) -> None:
+        """Тест что повторная сверка не доставляет платежи второй раз."""
+        await reconciler.run_once()
+        stats = await reconciler.run_once()
+
+        assert stats is not None
+        assert stats["candidates"] == 0
+        assert sorted(delivered) == [1, 4, 5]
+
+    async def test_failed_delivery_goes_to_retry_store(
+        self,
+        reconciler: Reconciler,
+        tmp_path: Path,
+        catalog: dict[int, dict[str, Any]],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Тест что недоставленный счет сохраняется для повтора, а курсор не останавливается на нем."""
+
+        async def process(self: CatalogWebhookProcessor, event: PaymentEvent, deadline: Any = None) -> dict[str, Any]:
+            raise RuntimeError("Платформа недоступна")
+
+        store = RetryStore(tmp_path / "retry.sqlite3")
+        queue = RetryQueue(
+            delay=1, max_attempts=3, concurrency=1, handler=CatalogWebhookProcessor().process_payment_event, store=store
+        )
+        monkeypatch.setattr(CatalogWebhookProcessor, "process_payment_event", process)
+        monkeypatch.setattr(reconciler_module, "retry_store", store)
+        monkeypatch.setattr(reconciler_module, "retry_queue", queue)
+
+        stats = await reconciler.run_once()
+
+        assert stats is not None
+        assert stats["failed"] == 3
+        assert sorted(event.catalog_element_id for event, _ in store.pending()) == [1, 4, 5]
+        assert queue.size == 3
+        assert reconciler._load_state()["cursor_updated_at"] >= int(time.time()) - Reconciler._settle_seconds() - 1
+        store.close()
+
+    async def test_first_run_starts_at_deploy_time(
+        self, tmp_path: Path, deliveries: DeliveryLog, catalog: dict[int, dict[str, Any]], delivered: list[int | None]
+    ) -> None:
+        """Тест что первая сверка только запоминает курсор и не доставляет прошлые оплаты."""
+        fresh = Reconciler(tmp_path / "fresh.sqlite3", deliveries)
+
+        stats = await fresh.run_once()
+
+        assert stats is not None
+        assert delivered == []
+        assert fresh._load_state()["cursor_updated_at"] >= int(time.time()) - 1
+
+    async def test_recent_payments_are_left_to_main_path(
+        self, reconciler: Reconciler, catalog: dict[int, dict[str, Any]], delivered: list[int | None]
+    ) -> None:
+        """Тест что счета моложе окна повторов не сверяются и курсор не переходит через них."""
+        catalog[4]["updated_at"] = int(time.time()) - 60
+
+        await reconciler.run_once()
+
+        assert sorted(delivered) == [1, 5]
+        assert reconciler._load_state()["cursor_updated_at"] <= int(time.time()) - Reconciler._settle_seconds()
+
+    async def test_only_owned_leads_in_cluster(
+        self,
+        reconciler: Reconciler,
+        catalog: dict[int, dict[str, Any]],
+        delivered: list[int | None],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Тест что в кластере узел сверяет только свои сделки, в том числе сразу после перезапуска узла."""
+        monkeypatch.setattr(PartitionRouter, "enabled", True)
+        monkeypatch.setattr(PartitionRouter, "is_local", lambda self, lead_id: lead_id != 40)
+
+        stats = await reconciler.run_once()
+
+        assert stats is not None
+        assert sorted(delivered) == [1, 5]
+
+    async def test_skipped_when_locked(self, reconciler: Reconciler, tmp_path: Path, deliveries: DeliveryLog) -> None:
+        """Тест что сверка пропускается, если аренду держит другой процесс."""
+        other = Reconciler(tmp_path / "reconcile.sqlite3", deliveries)
+        other.owner = "other:1"
+        other.acquire_lock(60)
+
+        assert await reconciler.run_once() is None
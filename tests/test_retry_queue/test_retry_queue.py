@@ -0,0 +1,72 @@
+"""Тесты для фоновой очереди повторной обработки платежей."""
+
+import asyncio
+
+import httpx
+
+from app.models.payment import PaymentEvent
+from app.services.retry_queue import RetryQueue
+
+
+def make_event(lead_id: int = 38743359) -> PaymentEvent:
+    """Создать оплаченный счет для тестов."""
+    return PaymentEvent(
+        event_type="update",
+        catalog_element_id=812345,
+        lead_id=lead_id,
+        items=[{"description": "Курс", "unit_price": 6000, "quantity": 2}],
+        amount=12000,
+    )
+
+
+class TestRetryQueue:
+    """Тесты для RetryQueue."""
+
+    async def test_enqueued_event_is_processed(self) -> None:
+        """Тест что поставленный в очередь платеж обрабатывается фоновым обработчиком."""
+        processed: list[int] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            processed.append(event.lead_id)
+
+        queue = RetryQueue(delay=0.0, max_attempts=3, concurrency=2, handler=handler)
+        queue.start()
+        queue.enqueue(make_event())
+
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+        assert processed == [38743359]
+        assert queue.size == 0
+
+    async def test_transient_error_is_retried(self) -> None:
+        """Тест что сетевая ошибка приводит к повтору, пока не исчерпаны попытки."""
+        attempts: list[int] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            attempts.append(event.lead_id)
+            raise httpx.ConnectError("connection refused")
+
+        queue = RetryQueue(delay=0.0, max_attempts=3, concurrency=1, handler=handler)
+        queue.start()
+        queue.enqueue(make_event())
+
+        await asyncio.sleep(0.1)
+        await queue.stop()
+
+        assert len(attempts) == 3
+        assert queue.size == 0
+
+    async def test_validation_error_is_not_retried(self) -> None:
+        """Тест что ошибка валидации не повторяется."""
+        attempts: list[int] = []
+
+        async def handler(event: PaymentEvent) -> None:
+            attempts.append(event.lead_id)
+            raise ValueError("Отсутствует email контакта")
+
+        queue = RetryQueue(delay=0.0, max_attempts=3, concurrency=1, handler=handler)
+        await queue.process(make_event())
+
+        assert attempts == [38743359]
+        assert queue.size == 0
@@ -0,0 +1,133 @@
+"""Тесты для снимка внутреннего состояния процесса (/debug/runtime)."""
+
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import debug
+from app.models.payment import PaymentEvent
+from app.services import metrics as metrics_module
+from app.services.http_pool import close_http_clients, get_http_client, pool_stats
+from app.services.metrics import RecentEvents
+from app.services.retry_queue import RetryQueue
+from app.services.runtime import RuntimeStats
+from app.services.tenants import TenantRegistry
+from app.settings import base_settings, settings
+
+
+def make_event() -> PaymentEvent:
+    """Создать оплаченный счет."""
+    return PaymentEvent(event_type="update", catalog_element_id=501, lead_id=42, items=[], amount=5000)
+
+
+class TestRecentEvents:
+    """Тесты для RecentEvents."""
+
+    def test_counts_by_window(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест подсчета событий за разные окна и удаления событий старше horizon."""
+        now = 1000.0
+        monkeypatch.setattr(metrics_module.time, "monotonic", lambda: now)
+        events = RecentEvents(horizon=600)
+
+        events.add()
+        now = 1500.0
+        events.add()
+        events.add()
+
+        assert events.count(60) == 2
+        assert events.count(600) == 3
+
+        now = 1700.0
+        events.add()
+
+        assert events.count(3600) == 3
+
+
+class TestRetryCounts:
+    """Тесты для счетчиков повторов за последние окна."""
+
+    async def test_outcomes_are_counted(self) -> None:
+        """Тест что постановки в очередь, успехи и окончательные ошибки считаются раздельно."""
+        attempts = 0
+
+        async def handler(event: PaymentEvent) -> None:
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise httpx.ConnectError("down")
+
+        queue = RetryQueue(delay=0.0, max_attempts=3, concurrency=1, handler=handler)
+        queue.start()
+        queue.enqueue(make_event())
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+        counts = queue.recent_counts(windows=(60,))
+
+        assert counts == {"enqueued": {"60s": 2}, "succeeded": {"60s": 1}, "failed": {"60s": 0}}
+
+
+class TestRuntimeStats:
+    """Тесты для RuntimeStats."""
+
+    async def test_pool_stats_for_created_clients(self) -> None:
+        """Тест что для каждого созданного пула выдается использование соединений."""
+        get_http_client("http://upstream.invalid")
+        try:
+            stats = pool_stats()
+        finally:
+            await close_http_clients()
+
+        assert stats["http://upstream.invalid"] == {"connections": 0, "active": 0, "idle": 0, "requests": 0}
+
+    async def test_snapshot(self) -> None:
+        """Тест что снимок содержит webhook в обработке, задачи, маппинг и RSS."""
+        stats = RuntimeStats()
+
+        with stats.track_webhook():
+            snapshot = stats.snapshot()
+
+        assert snapshot["webhooks"]["in_flight"] == 1
+        assert stats.webhooks_in_flight == 0
+        assert snapshot["rss_bytes"] > 0
+        assert snapshot["uptime_seconds"] >= 0
+        assert sum(snapshot["tasks"].values()) >= 1
+        assert snapshot["mappings"]["sizes"]["subjects"] == 15
+        assert len(snapshot["mappings"]["version"]) == 12
+        assert set(snapshot["background_retries"]) == {"enqueued", "succeeded", "failed"}
+
+    async def test_mapping_of_current_tenant(self, tmp_path: Path) -> None:
+        """Тест что версия маппинга считается по настройкам текущего аккаунта, а не первого запрошенного."""
+        (tmp_path / "acme.env").write_text("AMO_SUBJECT_ENGLISH=1\n", encoding="utf-8")
+        registry = TenantRegistry(tmp_path, base=base_settings)
+        stats = RuntimeStats()
+
+        main_version = stats.snapshot()["mappings"]["version"]
+        with registry.activate("acme"):
+            tenant_version = stats.snapshot()["mappings"]["version"]
+
+        assert tenant_version != main_version
+        assert stats.snapshot()["mappings"]["version"] == main_version
+
+
+class TestRuntimeEndpoint:
+    """Тесты для GET /debug/runtime."""
+
+    async def test_disabled_without_admin_token(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что без ADMIN_TOKEN endpoint выключен, а с токеном отдает снимок."""
+        app = FastAPI()
+        app.include_router(debug.router)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+            disabled = await client.get("/debug/runtime")
+
+            monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+            enabled = await client.get("/debug/runtime", headers={"X-Admin-Token": "secret"})
+
+        assert disabled.status_code == 404
+        assert enabled.status_code == 200
+        assert {"uptime_seconds", "rss_bytes", "http_pools", "background_retries", "mappings", "sizes"} <= set(enabled.json())
@@ -0,0 +1,174 @@
+"""Тесты для остановки сервиса без потери платежей."""
+
+import asyncio
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api import amo_webhook
+from app.models.payment import PaymentEvent
+from app.services.retry_queue import RetryQueue
+from app.services.retry_store import RetryStore
+from app.services.shutdown import ShutdownCoordinator
+
+
+def make_event(lead_id: int = 42, tenant: str | None = None) -> PaymentEvent:
+    """Создать оплаченный счет."""
+    return PaymentEvent(
+        event_type="update", catalog_element_id=500 + lead_id, lead_id=lead_id, items=[], amount=5000, tenant=tenant
+    )
+
+
+class TestRetryStore:
+    """Тесты для RetryStore."""
+
+    def test_pending_kept_until_discarded(self, tmp_path: Path) -> None:
+        """Тест что сохраненные платежи читаются в порядке сохранения и остаются до discard."""
+        store = RetryStore(tmp_path / "retry.sqlite3")
+
+        assert store.save([(make_event(1), 0), (make_event(2, tenant="acme"), 2)]) == 2
+
+        pending = store.pending()
+
+        assert [(event.lead_id, event.tenant, attempt) for event, attempt in pending] == [(1, None, 0), (2, "acme", 2)]
+        assert len(store.pending()) == 2
+
+        store.discard(make_event(1))
+        assert [event.lead_id for event, _ in store.pending()] == [2]
+        store.close()
+
+    def test_same_event_is_stored_once(self, tmp_path: Path) -> None:
+        """Тест что повторное сохранение платежа обновляет номер попытки, а не дублирует его."""
+        store = RetryStore(tmp_path / "retry.sqlite3")
+
+        store.save([(make_event(1), 0)])
+        store.save([(make_event(1), 2)])
+
+        assert [(event.lead_id, attempt) for event, attempt in store.pending()] == [(1, 2)]
+        store.close()
+
+    async def test_queue_discards_finished_events(self, tmp_path: Path) -> None:
+        """Тест что восстановленный платеж удаляется из хранилища только после обработки."""
+        store = RetryStore(tmp_path / "retry.sqlite3")
+        store.save([(make_event(1), 0), (make_event(2), 0)])
+        failures = {2}
+
+        async def process(event: PaymentEvent) -> None:
+            if event.lead_id in failures:
+                raise RuntimeError("Платформа недоступна")
+
+        queue = RetryQueue(delay=60.0, max_attempts=3, concurrency=1, handler=process, store=store)
+
+        for event, attempt in store.pending():
+            await queue.process(event, attempt)
+
+        assert [event.lead_id for event, _ in store.pending()] == [2]
+        assert queue.size == 1
+        store.close()
+
+
+class TestShutdownCoordinator:
+    """Тесты для ShutdownCoordinator."""
+
+    async def test_waits_for_in_flight_payment(self, tmp_path: Path) -> None:
+        """Тест что платеж, завершившийся в пределах grace, дообрабатывается и не сохраняется."""
+        coordinator = ShutdownCoordinator(grace=1.0, store=RetryStore(tmp_path / "retry.sqlite3"))
+        processed = []
+
+        async def process(event: PaymentEvent) -> None:
+            with coordinator.track(event):
+                await asyncio.sleep(0.05)
+                processed.append(event.lead_id)
+
+        task = asyncio.create_task(process(make_event()))
+        await asyncio.sleep(0)
+        assert coordinator.in_flight == 1
+
+        assert await coordinator.drain() == 0
+        assert coordinator.save() == 0
+
+        assert processed == [42]
+        assert task.done()
+        assert coordinator.draining
+
+    async def test_interrupts_and_saves_after_grace(self, tmp_path: Path) -> None:
+        """Тест что платеж, не уложившийся в grace, прерывается и сохраняется вместе с очередью повтора."""
+        store = RetryStore(tmp_path / "retry.sqlite3")
+        coordinator = ShutdownCoordinator(grace=0.05, store=store)
+
+        async def process(event: PaymentEvent) -> None:
+            with coordinator.track(event):
+                await asyncio.sleep(10)
+
+        queue = RetryQueue(delay=0.0, max_attempts=3, concurrency=1, handler=process)
+        queue.start()
+        queue.enqueue(make_event(1))
+        await asyncio.sleep(0.01)
+        queue.enqueue(make_event(2), attempt=1, delay=60)
+
+        assert await coordinator.drain(queue.stop()) == 1
+        assert coordinator.save(queue.take_pending()) == 2
+
+        assert sorted((event.lead_id, attempt) for event, attempt in store.pending()) == [(1, 0), (2, 1)]
+        assert coordinator.in_flight == 0
+        store.close()
+
+    async def test_sending_payment_is_not_interrupted(self, tmp_path: Path) -> None:
+        """Тест что платеж, начавший отправку на платформу, дожидается и не сохраняется для повтора."""
+        store = RetryStore(tmp_path / "retry.sqlite3")
+        coordinator = ShutdownCoordinator(grace=0.05, store=store)
+        processed = []
+
+        async def process(event: PaymentEvent) -> None:
+            with coordinator.track(event):
+                coordinator.mark_sending()
+                await asyncio.sleep(0.2)
+                processed.append(event.lead_id)
+
+        task = asyncio.create_task(process(make_event()))
+        await asyncio.sleep(0)
+
+        assert await coordinator.drain() == 0
+        assert coordinator.save() == 0
+
+        assert processed == [42]
+        assert task.done() and not task.cancelled()
+        assert store.pending() == []
+        store.close()
+
+    async def test_budget_starts_at_begin(self, tmp_path: Path) -> None:
+        """Тест что время от begin (SIGTERM) до drain входит в бюджет остановки."""
+        coordinator = ShutdownCoordinator(grace=0.1, store=RetryStore(tmp_path / "retry.sqlite3"))
+
+        async def process(event: PaymentEvent) -> None:
+            with coordinator.track(event):
+                await asyncio.sleep(10)
+
+        asyncio.create_task(process(make_event()))
+        coordinator.begin()
+        await asyncio.sleep(0.1)
+
+        started = time.monotonic()
+        assert await coordinator.drain() == 1
+        assert time.monotonic() - started < 0.05
+
+
+class TestDrainingWebhook:
+    """Тесты для приема webhook во время остановки."""
+
+    async def test_rejected_while_draining(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что во время остановки webhook отклоняется с 503 и Retry-After."""
+        coordinator = ShutdownCoordinator(grace=1.0, store=RetryStore(tmp_path / "retry.sqlite3"))
+        coordinator.begin()
+        monkeypatch.setattr(amo_webhook, "shutdown_coordinator", coordinator)
+
+        app = FastAPI()
+        app.include_router(amo_webhook.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/amo/webhook/handle", content=b"")
+
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
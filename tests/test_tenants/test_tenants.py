@@ -0,0 +1,173 @@
+"""Тесты для дополнительных аккаунтов amoCRM (tenants)."""
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.api import amo_webhook
+from app.services.adaptive_timeout import adaptive_timeouts
+from app.services.admission import AdmissionController
+from app.services.concurrency_limiter import get_concurrency_limiter
+from app.services.hedging import get_hedge_budget
+from app.services.http_pool import close_http_clients, get_http_client
+from app.services.tenants import TenantNotFoundError, TenantRegistry, current_tenant, scoped
+from app.settings import base_settings, settings
+
+
+def make_registry(directory: Path) -> TenantRegistry:
+    """Создать реестр с аккаунтом acme."""
+    (directory / "acme.env").write_text(
+        "AMO_BASE_URL=https://acme.amocrm.ru\nPLATFORM_URL=https://platform.acme.test\n", encoding="utf-8"
+    )
+    return TenantRegistry(directory, base=base_settings)
+
+
+class TestTenantRegistry:
+    """Тесты для TenantRegistry."""
+
+    def test_loads_tenant_settings_lazily(self, tmp_path: Path) -> None:
+        """Тест что настройки аккаунта загружаются при первом обращении и дополняются основными."""
+        registry = make_registry(tmp_path)
+
+        assert registry.loaded == []
+
+        tenant_settings = registry.get("acme")
+
+        assert registry.loaded == ["acme"]
+        assert tenant_settings.AMO_BASE_URL == "https://acme.amocrm.ru"
+        assert tenant_settings.PLATFORM_URL == "https://platform.acme.test"
+        assert tenant_settings.API_SECRET_KEY == base_settings.API_SECRET_KEY
+        assert registry.get("acme") is tenant_settings
+
+    @pytest.mark.parametrize("tenant", ["unknown", "../acme", "Acme"])
+    def test_unknown_tenant(self, tmp_path: Path, tenant: str) -> None:
+        """Тест что аккаунт без файла настроек или с некорректным именем не найден."""
+        registry = make_registry(tmp_path)
+
+        with pytest.raises(TenantNotFoundError):
+            registry.get(tenant)
+
+    def test_activate_switches_settings(self, tmp_path: Path) -> None:
+        """Тест что внутри контекста аккаунта settings и ключи кэшей относятся к нему."""
+        registry = make_registry(tmp_path)
+
+        with registry.activate("acme"):
+            assert current_tenant() == "acme"
+            assert settings.AMO_BASE_URL == "https://acme.amocrm.ru"
+            assert scoped(42) == ("acme", 42)
+
+        assert current_tenant() is None
+        assert settings.AMO_BASE_URL == base_settings.AMO_BASE_URL
+        assert scoped(42) == 42
+
+    async def test_separate_http_pools(self, tmp_path: Path) -> None:
+        """Тест что у аккаунта свой пул соединений к тому же сервису."""
+        registry = make_registry(tmp_path)
+        try:
+            main_client = get_http_client("http://platform.invalid")
+            with registry.activate("acme"):
+                tenant_client = get_http_client("http://platform.invalid")
+                assert get_http_client("http://platform.invalid") is tenant_client
+        finally:
+            await close_http_clients()
+
+        assert tenant_client is not main_client
+
+    def test_separate_upstream_limits(self, tmp_path: Path) -> None:
+        """Тест что лимит запросов, бюджет дублей и статистика таймаутов у аккаунта свои."""
+        registry = make_registry(tmp_path)
+        main_limiter, main_budget = get_concurrency_limiter("amocrm"), get_hedge_budget()
+        adaptive_timeouts.observe("amocrm_lead_get", 0.1)
+
+        with registry.activate("acme"):
+            assert get_concurrency_limiter("amocrm") is not main_limiter
+            assert get_hedge_budget() is not main_budget
+            adaptive_timeouts.observe("amocrm_lead_get", 0.1)
+
+        assert {"amocrm_lead_get", "acme:amocrm_lead_get"} <= set(adaptive_timeouts.snapshot())
+
+
+class TestFairAdmission:
+    """Тесты для справедливой очереди AdmissionController."""
+
+    async def test_released_slots_alternate_between_keys(self) -> None:
+        """Тест что всплеск одного аккаунта не задерживает webhook другого."""
+        controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=1.0, retry_after=5)
+        release = asyncio.Event()
+        order: list[str] = []
+
+        async def hold() -> None:
+            async with controller.slot():
+                await release.wait()
+
+        async def process(key: str, name: str) -> None:
+            async with controller.slot(key):
+                order.append(name)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(process("a", f"a{index}")) for index in range(3)]
+        waiters.append(asyncio.create_task(process("b", "b0")))
+        await asyncio.sleep(0)
+        assert controller.waiting == 4
+
+        release.set()
+        await asyncio.gather(holder, *waiters)
+
+        assert order == ["a0", "b0", "a1", "a2"]
+        assert controller.in_flight == 0
+
+    async def test_queue_limit_per_key(self) -> None:
+        """Тест что лимит очереди считается отдельно для каждого аккаунта."""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1.0, retry_after=5)
+        release = asyncio.Event()
+
+        async def hold(key: str | None) -> None:
+            async with controller.slot(key):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold(key)) for key in (None, "a", "b")]
+        await asyncio.sleep(0)
+
+        assert controller.waiting == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert controller.in_flight == 0
+
+
+class TestTenantWebhook:
+    """Тесты для POST /amo/{tenant}/webhook/handle."""
+
+    async def post(self, path: str) -> httpx.Response:
+        app = FastAPI()
+        app.include_router(amo_webhook.router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(path, content=b"")
+
+    async def test_processed_with_tenant_settings(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что webhook аккаунта обрабатывается с его настройками."""
+
+        async def handle(request: Request) -> dict[str, Any]:
+            return {"tenant": current_tenant(), "amo_base_url": settings.AMO_BASE_URL}
+
+        monkeypatch.setattr(amo_webhook, "tenant_registry", make_registry(tmp_path))
+        monkeypatch.setattr(amo_webhook, "handle_amo_webhook", handle)
+
+        response = await self.post("/amo/acme/webhook/handle")
+
+        assert response.status_code == 200
+        assert response.json() == {"tenant": "acme", "amo_base_url": "https://acme.amocrm.ru"}
+
+    async def test_unknown_tenant(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Тест что webhook ненастроенного аккаунта отклоняется с 404."""
+        monkeypatch.setattr(amo_webhook, "tenant_registry", make_registry(tmp_path))
+
+        response = await self.post("/amo/other/webhook/handle")
+
+        assert response.status_code == 404
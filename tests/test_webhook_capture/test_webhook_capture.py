@@ -0,0 +1,179 @@
+"""Тесты для записи сырых webhook и их воспроизведения."""
+
+import asyncio
+import gzip
+from collections.abc import Iterator
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.cli.replay import run_replay
+from app.services.fast_filter import extract_lead_id
+from app.services.profiling import PROFILE_HEADER
+from app.services.webhook_capture import CapturedRequest, WebhookCapture, read_capture, redact
+
+BODY = (
+    b"catalogs%5Bupdate%5D%5B0%5D%5Bid%5D=501"
+    b"&catalogs%5Bupdate%5D%5B0%5D%5Bcustom_fields%5D%5B0%5D%5Bvalues%5D%5B0%5D%5Bvalue%5D="
+    b"https%3A%2F%2Fexample.amocrm.ru%2Fleads%2Fdetail%2F42"
+    b"&catalogs%5Bupdate%5D%5B0%5D%5Bcustom_fields%5D%5B1%5D%5Bvalues%5D%5B0%5D%5Bvalue%5D=ivan%40example.com"
+    b"&catalogs%5Bupdate%5D%5B0%5D%5Bcustom_fields%5D%5B2%5D%5Bvalues%5D%5B0%5D%5Bvalue%5D=%2B7+%28912%29+345-67-89"
+    b"&catalogs%5Bupdate%5D%5B0%5D%5Bcreated_at%5D=1700000000"
+)
+
+
+class TestRedact:
+    """Тесты для маскирования персональных данных."""
+
+    def test_email_and_phone_are_replaced(self) -> None:
+        """Тест что email и телефон заменены, остальные пары не изменены."""
+        redacted = redact(BODY)
+
+        assert b"ivan" not in redacted
+        assert b"912" not in redacted
+        assert b"%5Bemail%5D" in redacted
+        assert b"%5Bphone%5D" in redacted
+        assert b"created_at%5D=1700000000" in redacted
+        assert extract_lead_id(redacted) == 42
+
+    def test_body_without_pii_is_unchanged(self) -> None:
+        """Тест что тело без персональных данных остается байт в байт."""
+        body = b"catalogs[update][0][id]=501&catalogs[update][0][price]=89001234567890"
+
+        assert redact(body) == body
+
+
+class TestWebhookCapture:
+    """Тесты для WebhookCapture."""
+
+    async def test_roundtrip(self, tmp_path: Path) -> None:
+        """Тест что записанные webhook читаются обратно без секретных заголовков."""
+        capture = WebhookCapture(tmp_path, segment_bytes=1024 * 1024, max_bytes=10 * 1024 * 1024)
+        capture.capture(b"a=1", {"Content-Type": "application/x-www-form-urlencoded", "Authorization": "Bearer x"})
+        capture.capture(b"a=2", {"Content-Type": "application/x-www-form-urlencoded"})
+        await capture.stop()
+
+        requests = list(read_capture([tmp_path]))
+
+        assert [request.body for request in requests] == [b"a=1", b"a=2"]
+        assert requests[0].headers == {"Content-Type": "application/x-www-form-urlencoded"}
+        assert requests[0].path == "/amo/webhook/handle"
+
+    async def test_profile_token_is_not_recorded(self, tmp_path: Path) -> None:
+        """Тест что токен профилирования (это ADMIN_TOKEN) не попадает в запись на диске."""
+        capture = WebhookCapture(tmp_path, segment_bytes=1024 * 1024, max_bytes=10 * 1024 * 1024)
+        capture.capture(b"a=1", {"Content-Type": "application/x-www-form-urlencoded", PROFILE_HEADER: "admin-secret"})
+        await capture.stop()
+
+        [request] = read_capture([tmp_path])
+
+        assert request.headers == {"Content-Type": "application/x-www-form-urlencoded"}
+        assert not any(b"admin-secret" in gzip.decompress(segment.read_bytes()) for segment in tmp_path.iterdir())
+
+    async def test_tenant_path_is_recorded(self, tmp_path: Path) -> None:
+        """Тест что путь webhook дополнительного аккаунта записывается, чтобы воспроизвести его тому же аккаунту."""
+        capture = WebhookCapture(tmp_path, segment_bytes=1024 * 1024, max_bytes=10 * 1024 * 1024)
+        capture.capture(b"a=1", {}, path="/amo/acme/webhook/handle")
+        await capture.stop()
+
+        [request] = read_capture([tmp_path])
+
+        assert request.path == "/amo/acme/webhook/handle"
+
+    async def test_rotation_and_size_cap(self, tmp_path: Path) -> None:
+        """Тест что сегменты ротируются, а старые удаляются при превышении общего размера."""
+        capture = WebhookCapture(tmp_path, segment_bytes=1, max_bytes=400)
+        for index in range(10):
+            capture.capture(f"a={index}".encode(), {})
+            await capture.flush()
+
+        segments = sorted(tmp_path.glob("webhooks-*.jsonl.gz"))
+        bodies = [request.body for request in read_capture(segments)]
+
+        assert 1 < len(segments) < 10
+        assert sum(path.stat().st_size for path in segments) <= 400
+        assert bodies[-1] == b"a=9"
+
+
+class TestReplay:
+    """Тесты для воспроизведения записанных webhook."""
+
+    async def test_replay_reports_statuses_and_latency(self) -> None:
+        """Тест что все запросы отправлены с исходным телом и посчитаны задержки."""
+        received: list[bytes] = []
+        app = FastAPI()
+
+        @app.post("/amo/webhook/handle")
+        async def handle(request: Request) -> dict[str, str]:
+            received.append(await request.body())
+            await asyncio.sleep(0.01)
+            return {"status": "ignored"}
+
+        requests = [CapturedRequest(timestamp=1000.0 + index, headers={}, body=f"a={index}".encode()) for index in range(5)]
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            stats = await run_replay(requests, client, speed=0, concurrency=5)
+
+        assert sorted(received) == [f"a={index}".encode() for index in range(5)]
+        assert stats["sent"] == 5
+        assert stats["statuses"] == {"200": 5}
+        assert stats["latency"]["p50"] >= 0.01
+
+    async def test_replayed_to_recorded_path(self) -> None:
+        """Тест что webhook отправляется на записанный путь своего аккаунта."""
+        received: list[str] = []
+        app = FastAPI()
+
+        @app.post("/amo/webhook/handle")
+        @app.post("/amo/{tenant}/webhook/handle")
+        async def handle(request: Request) -> dict[str, str]:
+            received.append(request.url.path)
+            return {"status": "ignored"}
+
+        requests = [
+            CapturedRequest(timestamp=1000.0, headers={}, body=b"a=1"),
+            CapturedRequest(timestamp=1001.0, headers={}, body=b"a=2", path="/amo/acme/webhook/handle"),
+        ]
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            await run_replay(requests, client, speed=0, concurrency=1)
+
+        assert received == ["/amo/webhook/handle", "/amo/acme/webhook/handle"]
+
+    async def test_records_are_read_as_they_are_sent(self) -> None:
+        """Тест что записи берутся из источника по мере отправки, а не загружаются все сразу."""
+        produced = 0
+        ahead: list[int] = []
+        app = FastAPI()
+
+        @app.post("/amo/webhook/handle")
+        async def handle() -> dict[str, str]:
+            ahead.append(produced - len(ahead))
+            await asyncio.sleep(0.005)
+            return {"status": "ignored"}
+
+        def records() -> Iterator[CapturedRequest]:
+            nonlocal produced
+            for index in range(20):
+                produced += 1
+                yield CapturedRequest(timestamp=1000.0 + index, headers={}, body=b"a=1")
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            stats = await run_replay(records(), client, speed=0, concurrency=2)
+
+        assert stats["sent"] == 20
+        # В отправке не больше concurrency записей и еще одна ждет места
+        assert max(ahead) <= 3
+
+    async def test_speed_scales_original_intervals(self) -> None:
+        """Тест что при --speed 100 секунда между записями превращается в 10 мс."""
+        app = FastAPI()
+
+        @app.post("/amo/webhook/handle")
+        async def handle() -> dict[str, str]:
+            return {"status": "ignored"}
+
+        requests = [CapturedRequest(timestamp=1000.0 + index, headers={}, body=b"a=1") for index in range(4)]
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            stats = await run_replay(requests, client, speed=100, concurrency=4)
+
+        assert stats["seconds"] >= 0.03